@@ -1,2 +1,11 @@
-from pandas_bj.between_merge import merge
-from pandas_bj.between import Between, GT, GE, LT, LE
\ No newline at end of file
+from pandas_bj.between_merge import merge, count_matches, estimate_merge_size
+from pandas_bj.between import Between, GT, GE, LT, LE, RangeArray
+from pandas_bj.between_index import BetweenIndex
+from pandas_bj.custom_merge import LazyMerge
+from pandas_bj.chunked_merge import merge_iter
+from pandas_bj.range_aggregate import range_aggregate
+from pandas_bj.file_merge import merge_files
+from pandas_bj.materialized_merge import MaterializedMerge
+from pandas_bj.stats import MergeStats, last_merge_stats
+from pandas_bj.planner import explain
+from pandas_bj.cache import enable_cache, disable_cache, cache_info
@@ -1,5 +1,6 @@
 from typing import Any, Hashable, Callable, Union, List, Optional
 from abc import ABCMeta, abstractmethod
+import numpy
 import pandas
 from pandas import DataFrame
 
@@ -152,6 +153,128 @@ class Range():
         return not self == other
 
 
+def key_values(values: Union[numpy.ndarray, pandas.Series], copy: bool = False) -> numpy.ndarray:
+    '''
+    | Values of a key column as float64 for sorted search. Null becomes `NaN`.
+    | datetime64 and timedelta64, including tz-aware, are compared by their int64 views in microseconds,
+    | which float64 holds exactly between years 1685 and 2255. `NaT` becomes `NaN`.
+    :param values: key column.
+    :param copy: always return a new array.
+    :return: float64 array.
+    '''
+    if values.dtype.kind not in 'mM':
+        if isinstance(values, numpy.ndarray):
+            return values.astype(numpy.float64, copy=copy)
+        return values.to_numpy(dtype=numpy.float64, na_value=numpy.nan, copy=copy)
+    array = pandas.array(values) if isinstance(values, numpy.ndarray) else values.array
+    ints = numpy.asarray(array.asi8)
+    unit = getattr(array, 'unit', 'ns')
+    micros = ints.view(f'm8[{unit}]').astype('m8[us]').view(numpy.int64)
+    result = micros.astype(numpy.float64)
+    result[ints == numpy.iinfo(numpy.int64).min] = numpy.nan
+    return result
+
+
+def sort_rank(values: pandas.Series, null_first: bool = False) -> numpy.ndarray:
+    '''
+    | Ranks of values as int64 keeping order of values, to sort values with `numpy.lexsort`.
+    :param values: values to rank.
+    :param null_first: rank null before all values, or after all values.
+    :return: ranks. Same values get same rank.
+    '''
+    codes, uniques = pandas.factorize(values, sort=True)
+    codes = codes.astype(numpy.int64, copy=False)
+    codes[codes < 0] = -1 if null_first else len(uniques)
+    return codes
+
+
+class RangeArray():
+    '''
+    RangeArray is columnar representation of `Range`.
+    It holds lower bounds, higher bounds and open flags as numpy arrays, instead of `Range` per row.
+
+    `NaN` in lower bounds is stored as `-inf` and `NaN` in higher bounds is stored as `+inf`,
+    same as `None` of `Range`.
+    datetime64 and timedelta64 bounds are stored as microseconds by `key_values`, and `NaT` is same as `NaN`.
+    '''
+
+    def __init__(self, range_from: numpy.ndarray, range_to: numpy.ndarray,
+                 from_opened: numpy.ndarray, to_opened: numpy.ndarray):
+        self.range_from = range_from
+        self.range_to = range_to
+        self.from_opened = from_opened
+        self.to_opened = to_opened
+
+    @classmethod
+    def from_bounds(cls, range_from: Optional[pandas.Series], range_to: Optional[pandas.Series], n: int,
+                    from_opened: bool = False, to_opened: bool = False) -> 'RangeArray':
+        '''
+        | Build RangeArray from columns of lower and higher bounds.
+        :param range_from: lower bounds. None means no lower condition.
+        :param range_to: higher bounds. None means no higher condition.
+        :param n: length.
+        :param from_opened: lower bounds are not contained or not.
+        :param to_opened: higher bounds are not contained or not.
+        :return: RangeArray
+        '''
+        if range_from is None:
+            f = numpy.full(n, -numpy.inf)
+        else:
+            f = key_values(range_from, copy=True)
+            f[numpy.isnan(f)] = -numpy.inf
+        if range_to is None:
+            t = numpy.full(n, numpy.inf)
+        else:
+            t = key_values(range_to, copy=True)
+            t[numpy.isnan(t)] = numpy.inf
+        return cls(f, t, numpy.full(n, from_opened), numpy.full(n, to_opened))
+
+    def __len__(self):
+        return len(self.range_from)
+
+    def __getitem__(self, item):
+        if numpy.ndim(item) == 0 and not isinstance(item, slice):
+            f = self.range_from[item]
+            t = self.range_to[item]
+            return Range(None if numpy.isneginf(f) else f, None if numpy.isposinf(t) else t,
+                         bool(self.from_opened[item]), bool(self.to_opened[item]))
+        return RangeArray(self.range_from[item], self.range_to[item],
+                          self.from_opened[item], self.to_opened[item])
+
+    def __repr__(self):
+        return f'RangeArray({[self[i] for i in range(min(len(self), 10))]}, length={len(self)})'
+
+    def contains(self, values: numpy.ndarray) -> numpy.ndarray:
+        '''
+        | Elementwise version of `Range.__eq__`.
+        :param values: values aligned with ranges.
+        :return: boolean array.
+        '''
+        f = self.range_from
+        t = self.range_to
+        ok = numpy.where(self.from_opened, f < values, f <= values)
+        ok &= numpy.where(self.to_opened, t > values, t >= values)
+        # unbounded range contains anything, even null.
+        ok |= numpy.isneginf(f) & numpy.isposinf(t)
+        return ok
+
+    def overlaps(self, other: 'RangeArray') -> numpy.ndarray:
+        '''
+        | Check ranges share any value with ranges of other, elementwise.
+        :param other: ranges aligned with ranges.
+        :return: boolean array.
+        '''
+        lower = numpy.maximum(self.range_from, other.range_from)
+        lower_opened = numpy.where(self.range_from > other.range_from, self.from_opened,
+                                   numpy.where(self.range_from < other.range_from, other.from_opened,
+                                               self.from_opened | other.from_opened))
+        upper = numpy.minimum(self.range_to, other.range_to)
+        upper_opened = numpy.where(self.range_to < other.range_to, self.to_opened,
+                                   numpy.where(self.range_to > other.range_to, other.to_opened,
+                                               self.to_opened | other.to_opened))
+        return (lower < upper) | ((lower == upper) & ~lower_opened & ~upper_opened)
+
+
 class Between(CustomColumn):
     '''
     Between class provides comparison feature with ranges.
@@ -234,6 +357,52 @@ class Between(CustomColumn):
                                                  v[self.t] if self.t is not None else None,
                                                  self.f_open, self.t_open), axis=1)
 
+    def to_range_array(self, df: DataFrame) -> RangeArray:
+        '''
+        This function is used in `pandas_bj.merge` internally.
+        It create `RangeArray` from pandas.DataFrame without creating `Range` per row.
+
+        if `f` and `t` are not in it, then KeyError will raise.
+
+        :param df: pandas.DataFrame
+        :return: RangeArray
+        '''
+        if self.f is not None and self.f not in df.columns:
+            raise KeyError(self.f)
+        if self.t is not None and self.t not in df.columns:
+            raise KeyError(self.t)
+
+        return RangeArray.from_bounds(df[self.f] if self.f is not None else None,
+                                      df[self.t] if self.t is not None else None,
+                                      len(df.index), self.f_open, self.t_open)
+
+    def sort_keys(self, df: DataFrame) -> List[numpy.ndarray]:
+        '''
+        This function is used in `pandas_bj.merge` internally.
+        It create numeric keys to sort ranges in the same order as `Range.__lt__` without creating `Range` per row.
+
+        Keys are ranks of lower bounds, open flags of lower bounds, ranks of higher bounds
+        and closed flags of higher bounds. Rows are sorted by `numpy.lexsort` of them in reverse order.
+        Null bounds are ranked as infinite, and their flags are ignored.
+
+        :param df: pandas.DataFrame
+        :return: list of int64 arrays.
+        '''
+        n = len(df.index)
+        if self.f is None:
+            f = numpy.zeros(n, dtype=numpy.int64)
+            f_flag = numpy.zeros(n, dtype=numpy.int64)
+        else:
+            f = sort_rank(df[self.f], null_first=True)
+            f_flag = numpy.where(df[self.f].isnull().to_numpy(), 0, int(self.f_open))
+        if self.t is None:
+            t = numpy.zeros(n, dtype=numpy.int64)
+            t_flag = numpy.zeros(n, dtype=numpy.int64)
+        else:
+            t = sort_rank(df[self.t], null_first=False)
+            t_flag = numpy.where(df[self.t].isnull().to_numpy(), 0, int(not self.t_open))
+        return [f, f_flag, t, t_flag]
+
     def column_check(self, columns: List[Any]) -> bool:
         if self.f is not None and self.f not in columns:
             return False
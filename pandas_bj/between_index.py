@@ -0,0 +1,81 @@
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+
+import numpy
+import pandas
+
+from pandas_bj import sorted_search
+from pandas_bj.between_merge import validate, rename, merge as between_merge
+from pandas_bj.custom_merge import merge_positions, filter_rows, filter_types, LazyMerge
+
+
+class BetweenIndex():
+    '''
+    BetweenIndex holds sorted keys of a dataframe to merge it with many other dataframes.
+
+    Building keys, hash-partitioning and sorting of `right` are done once,
+    and each `merge` only probes them with keys of `left`.
+
+    ```
+    index = BetweenIndex(df2, on=['id3', 'id4', 'v'])
+    result = index.merge(df1, left_on=['id1', 'id2', Between('s', 'e')], how='inner')
+    ```
+
+    Whether a column of `on` is compared with equality or range depends on `left_on`,
+    so sorted keys are built for each layout of `left_on` at the first merge and kept for later merges.
+    '''
+
+    def __init__(self, right: pandas.DataFrame, on: Union[Hashable, List[Hashable]]):
+        if not isinstance(on, list):
+            on = [on]
+        _, on = validate(right, right, on, on, 'inner')
+        self.right = right
+        self.on = on
+        self.keys = sorted_search.build_keys(right, on)
+        self.sorted_keys: Dict[Tuple[Tuple[int, ...], Tuple[int, ...]], sorted_search.SortedKeys] = {}
+
+    def sorted(self, left_keys: List[sorted_search.Key]) -> sorted_search.SortedKeys:
+        '''
+        | Get sorted keys for the layout of left keys, build them if not yet.
+        '''
+        eq, ranges = sorted_search.layout(left_keys, self.keys)
+        key = (tuple(eq), tuple(ranges))
+        if key not in self.sorted_keys:
+            self.sorted_keys[key] = sorted_search.SortedKeys(self.keys, eq, ranges)
+        return self.sorted_keys[key]
+
+    def match(self, left: pandas.DataFrame, left_on: List[Hashable]) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        '''
+        | Find matched row pairs of left and indexed right.
+        :return: positional indexes of left and right.
+        '''
+        left_keys = sorted_search.build_keys(left, left_on)
+        return self.sorted(left_keys).probe(left_keys)
+
+    def count_matches(self, left: pandas.DataFrame, left_on: List[Hashable]) -> numpy.ndarray:
+        '''
+        | Count matched rows of indexed right for each row of left.
+        :return: number of matched rows per row of left.
+        '''
+        left_keys = sorted_search.build_keys(left, left_on)
+        return self.sorted(left_keys).count(left_keys)
+
+    def merge(self, left: pandas.DataFrame, left_on: Union[Hashable, List[Hashable]],
+              how: str = 'inner', suffixes=('_x', '_y'), keep_index: Optional[str] = None,
+              match: str = 'all', k: int = 1, lazy: bool = False) -> Union[pandas.DataFrame, LazyMerge]:
+        '''
+        | Merge left with indexed right. Options are same as `pandas_bj.merge`.
+        | Keys that numpy engine does not support are merged by `pandas_bj.merge` with python engine.
+        '''
+        left_on, right_on = validate(left, self.right, left_on, self.on, how, keep_index, match, k)
+        if not sorted_search.supports(left, self.right, left_on, right_on):
+            return between_merge(left, self.right, left_on, right_on, how, suffixes=suffixes, engine='python',
+                                 keep_index=keep_index, match=match, k=k, lazy=lazy)
+        if how in filter_types:
+            return filter_rows(left, self.count_matches(left, left_on), how, keep_index, suffixes[0], lazy)
+        if match != 'all':
+            left_keys = sorted_search.build_keys(left, left_on)
+            left_pos, right_pos = sorted_search.select(left_keys, self.keys, match, k, self.sorted(left_keys))
+        else:
+            left_pos, right_pos = self.match(left, left_on)
+        left, right = rename(left, self.right, suffixes)
+        return merge_positions(left, right, left_pos, right_pos, how, keep_index, suffixes, lazy)
@@ -1,27 +1,305 @@
-from typing import Union, Hashable, List
+from typing import Callable, Union, Hashable, List, NamedTuple, Optional, Tuple
 
+import numpy
 import pandas
-from pandas import RangeIndex
 
-from pandas_bj.between import CustomColumn
-from pandas_bj.custom_merge import merge as custom_merge
+from pandas_bj.between import Between, CustomColumn, sort_rank
+from pandas_bj.custom_merge import merge as custom_merge, merge_positions, keep_index_types, \
+    reindex, filter_rows, filter_types, LazyMerge
+from pandas_bj import cache, kernels, sorted_search, parallel, planner, stats as merge_stats
 
-how_types = {'inner', 'outer', 'left', 'right'}
+how_types = {'inner', 'outer', 'left', 'right', 'semi', 'anti'}
+engine_types = {'numpy', 'numba', 'python'}
+match_types = {'all', 'first', 'last', 'nearest'}
 
 
 def merge(left: pandas.DataFrame, right: pandas.DataFrame,
           left_on: Union[Hashable, List[Hashable]], right_on: Union[Hashable, List[Hashable]],
-          how: str = 'inner', sort: Union[bool, List[int]] = False, suffixes=('_x', '_y')):
-    assert isinstance(left.index, RangeIndex), "pandas_bj only supports RangeIndex-ed dataframe as input."
-    assert isinstance(right.index, RangeIndex), "pandas_bj only supports RangeIndex-ed dataframe as input."
+          how: str = 'inner', sort: Union[bool, str, List[int]] = False, suffixes=('_x', '_y'),
+          engine: str = 'numpy', n_jobs: int = 1, keep_index: Optional[str] = None,
+          match: str = 'all', k: int = 1, overlap: bool = False,
+          max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+          stats: Union[bool, Callable[[merge_stats.MergeStats], None], None] = None,
+          lazy: bool = False) -> Union[pandas.DataFrame, LazyMerge]:
+    if stats:
+        # collect stats of this merge, and merge without collecting again.
+        with merge_stats.collect(None if stats is True else stats) as collected:
+            result = merge(left, right, left_on, right_on, how, sort, suffixes, engine, n_jobs, keep_index,
+                           match, k, overlap, max_rows, max_bytes, lazy=lazy)
+            collected.add_count('left_rows', len(left.index))
+            collected.add_count('right_rows', len(right.index))
+            collected.add_count('output_rows', len(result))
+        return result
 
+    left_on, right_on = validate(left, right, left_on, right_on, how, keep_index, match, k)
+    engine, jit = validate_engine(engine)
+
+    n_jobs = parallel.normalize_n_jobs(n_jobs)
+    if n_jobs > 1 and engine == 'python':
+        raise ValueError('n_jobs is only supported by numpy and numba engines.')
+
+    limited = max_rows is not None or max_bytes is not None
+    # row pairs of overlap and match except all are checked after search, before building dataframe.
+    if limited and not overlap and match == 'all':
+        check_size(estimate_merge_size(left, right, left_on, right_on, how, engine), max_rows, max_bytes)
+
+    if overlap:
+        if engine != 'numpy' or not sorted_search.supports(left, right, left_on, right_on, overlap=True):
+            raise ValueError('overlap is only supported by numpy engine with numeric ranges.')
+        if match != 'all':
+            raise ValueError('match except all is not supported with overlap.')
+        left_keys = sorted_search.build_keys(left, left_on)
+        right_keys = sorted_search.build_keys(right, right_on)
+        left_pos, right_pos = sorted_search.overlap_match(left_keys, right_keys)
+        if limited:
+            check_size(positions_size(left, right, left_pos, right_pos, how), max_rows, max_bytes)
+        if how in filter_types:
+            return filter_rows(left, numpy.bincount(left_pos, minlength=len(left.index)), how, keep_index,
+                               suffixes[0], lazy)
+        left, right = rename(left, right, suffixes)
+        return merge_positions(left, right, left_pos, right_pos, how, keep_index, suffixes, lazy)
+
+    if how in filter_types:
+        counts = count_matches(left, right, left_on, right_on, engine)
+        return filter_rows(left, counts, how, keep_index, suffixes[0], lazy)
+
+    if engine == 'numpy' and sorted_search.supports(left, right, left_on, right_on):
+        left_keys = cached_keys(left, left_on)
+        right_keys = cached_keys(right, right_on)
+        if match != 'all':
+            left_pos, right_pos = sorted_search.select(left_keys, right_keys, match, k)
+            if limited:
+                check_size(positions_size(left, right, left_pos, right_pos, how), max_rows, max_bytes)
+        else:
+            ranges, build, grid, bins = None, None, None, 0
+            if sort == 'auto' or len(sorted_search.layout(left_keys, right_keys)[1]) > 1:
+                # order of range keys is planned by selectivity when there are many of them.
+                with merge_stats.phase('plan'):
+                    plan = planner.plan_keys(left_keys, right_keys)
+                ranges, build, grid, bins = plan.ranges, plan.build, plan.grid, plan.bins
+            if n_jobs > 1:
+                left_pos, right_pos = parallel.match(left_keys, right_keys, n_jobs, ranges, build, grid, bins, jit)
+            else:
+                left_pos, right_pos = sorted_search.match(left_keys, right_keys, ranges, build, grid, bins, jit)
+        left, right = rename(left, right, suffixes)
+        return merge_positions(left, right, left_pos, right_pos, how, keep_index, suffixes, lazy)
+
+    if match != 'all':
+        raise ValueError('match except all is only supported by numpy engine.')
+
+    key_length = len(left_on)
+
+    if sort == 'auto':
+        with merge_stats.phase('plan'):
+            sort = planner.plan_merge(left, right, left_on, right_on, 'python').sort
+    elif sort is True:
+        sort = list(range(key_length))
+    elif sort is False:
+        sort = []
+
+    left_key_df, right_key_df = key_frames(left, right, left_on, right_on)
+    orders = None
+    if len(sort) > 0:
+        orders = (sort_order(left, left_on, left_key_df, sort), sort_order(right, right_on, right_key_df, sort))
+    left, right = rename(left, right, suffixes)
+    return custom_merge(left, right, left_key_df, right_key_df, how, sort, keep_index, suffixes, orders, lazy)
+
+
+def count_matches(left: pandas.DataFrame, right: pandas.DataFrame,
+                  left_on: Union[Hashable, List[Hashable]], right_on: Union[Hashable, List[Hashable]],
+                  engine: str = 'numpy') -> numpy.ndarray:
+    '''
+    Count matched rows of right for each row of left, without building the merged dataframe.
+
+    With numpy engine, counts are taken from bounds of sorted search when possible,
+    so matched row pairs are not even listed.
+
+    :param left: left dataframe.
+    :param right: right dataframe.
+    :param left_on: same as `pandas_bj.merge`.
+    :param right_on: same as `pandas_bj.merge`.
+    :param engine: same as `pandas_bj.merge`.
+    :return: int64 array of number of matched rows per row of left, in order of left.
+    '''
+    left_on, right_on = validate(left, right, left_on, right_on, 'inner')
+    engine, _ = validate_engine(engine)
+
+    if engine == 'numpy' and sorted_search.supports(left, right, left_on, right_on):
+        left_keys = cached_keys(left, left_on)
+        right_keys = cached_keys(right, right_on)
+        return sorted_search.count_matches(left_keys, right_keys)
+
+    left_pos, _ = reindex(*key_frames(left, right, left_on, right_on), [])
+    return numpy.bincount(left_pos, minlength=len(left.index))
+
+
+def validate_engine(engine: str) -> Tuple[str, bool]:
+    '''
+    | Check engine. numba engine is numpy engine with candidates filtered by the compiled kernel,
+    | and it is same as numpy engine when numba is not installed.
+    :return: numpy or python, and whether to use the compiled kernel.
+    '''
+    if engine not in engine_types:
+        raise ValueError('engine must be numpy, numba or python.')
+    if engine == 'numba':
+        return 'numpy', kernels.available()
+    return engine, False
+
+
+class MergeSize(NamedTuple):
+    '''
+    Size of merged dataframe given by `estimate_merge_size`.
+    '''
+    rows: int
+    bytes: int
+
+
+def row_bytes(df: pandas.DataFrame) -> float:
+    '''
+    | Average bytes of a row of columns, or bytes of dtypes for empty dataframe.
+    '''
+    if len(df.index) > 0:
+        return float(df.memory_usage(index=False).sum()) / len(df.index)
+    return float(sum(getattr(dtype, 'itemsize', 8) for dtype in df.dtypes))
+
+
+def merge_size(left: pandas.DataFrame, right: pandas.DataFrame, rows: int, how: str) -> MergeSize:
+    width = row_bytes(left) if how in filter_types else row_bytes(left) + row_bytes(right)
+    return MergeSize(int(rows), int(rows * width))
+
+
+def positions_size(left: pandas.DataFrame, right: pandas.DataFrame,
+                   left_pos: numpy.ndarray, right_pos: numpy.ndarray, how: str) -> MergeSize:
+    '''
+    | Size of merged dataframe built from matched row pairs.
+    '''
+    n_left, n_right = len(left.index), len(right.index)
+    if how in filter_types:
+        n_matched = len(numpy.unique(left_pos))
+        return merge_size(left, right, n_matched if how == 'semi' else n_left - n_matched, how)
+    rows = len(left_pos)
+    if how in {'left', 'outer'}:
+        rows += n_left - len(numpy.unique(left_pos))
+    if how in {'right', 'outer'}:
+        rows += n_right - len(numpy.unique(right_pos))
+    return merge_size(left, right, rows, how)
+
+
+def check_size(size: MergeSize, max_rows: Optional[int], max_bytes: Optional[int]):
+    if max_rows is not None and size.rows > max_rows:
+        raise ValueError(f'Merged dataframe would have {size.rows} rows, more than max_rows={max_rows}.')
+    if max_bytes is not None and size.bytes > max_bytes:
+        raise ValueError(f'Merged dataframe would have {size.bytes} bytes, more than max_bytes={max_bytes}.')
+
+
+def estimate_merge_size(left: pandas.DataFrame, right: pandas.DataFrame,
+                        left_on: Union[Hashable, List[Hashable]], right_on: Union[Hashable, List[Hashable]],
+                        how: str = 'inner', engine: str = 'numpy') -> MergeSize:
+    '''
+    Compute size of merged dataframe without merging.
+
+    Number of rows is exact, and given by `count_matches` of left, and of right for right and outer merges.
+    With numpy engine and one range key, counts are given by bounds of sorted search,
+    so no row pairs are listed even when `merge` would fail with `max_rows` or `max_bytes`.
+    With several range keys, pairs found by the first range key are listed and filtered by the others.
+    Number of bytes is estimated from memory usage per row of columns of left and right.
+
+    :param left: left dataframe.
+    :param right: right dataframe.
+    :param left_on: same as `pandas_bj.merge`.
+    :param right_on: same as `pandas_bj.merge`.
+    :param how: same as `pandas_bj.merge`.
+    :param engine: same as `pandas_bj.merge`.
+    :return: `MergeSize` with `rows` and `bytes`.
+    '''
+    left_on, right_on = validate(left, right, left_on, right_on, how)
+
+    counts = count_matches(left, right, left_on, right_on, engine)
+    if how in filter_types:
+        n_matched = int(numpy.count_nonzero(counts))
+        return merge_size(left, right, n_matched if how == 'semi' else len(counts) - n_matched, how)
+    rows = int(counts.sum())
+    if how in {'left', 'outer'}:
+        rows += len(counts) - int(numpy.count_nonzero(counts))
+    if how in {'right', 'outer'}:
+        right_counts = count_matches(right, left, right_on, left_on, engine)
+        rows += len(right_counts) - int(numpy.count_nonzero(right_counts))
+    return merge_size(left, right, rows, how)
+
+
+def cached_keys(df: pandas.DataFrame, on: List[Hashable]) -> List[sorted_search.Key]:
+    '''
+    | Keys for sorted search, from the cache if enabled by `pandas_bj.enable_cache`.
+    '''
+    return cache.cached(df, on, 'keys', lambda: sorted_search.build_keys(df, on))
+
+
+@merge_stats.timed('build_keys')
+def key_frame(df: pandas.DataFrame, on: List[Hashable]) -> pandas.DataFrame:
+    # keys are aligned by positions, so any index can be used.
+    return pandas.DataFrame({i: key_series(df, k) for i, k in enumerate(on)})
+
+
+def key_frames(left: pandas.DataFrame, right: pandas.DataFrame,
+               left_on: List[Hashable], right_on: List[Hashable]) -> Tuple[pandas.DataFrame, pandas.DataFrame]:
+    '''
+    | Key frames of both sides for the python engine.
+    | Equality keys are encoded jointly into int64 codes, so that rows are compared as integers.
+    '''
+    # cached key frames are kept as they are, and encoded keys are set to copies.
+    left_key_df = cache.cached(left, left_on, 'key_frame', lambda: key_frame(left, left_on)).copy(deep=False)
+    right_key_df = cache.cached(right, right_on, 'key_frame', lambda: key_frame(right, right_on)).copy(deep=False)
+    with merge_stats.phase('build_keys'):
+        for i, (l_on_col, r_on_col) in enumerate(zip(left_on, right_on)):
+            if isinstance(l_on_col, CustomColumn) or isinstance(r_on_col, CustomColumn):
+                continue
+            left_key_df[i], right_key_df[i] = sorted_search.factorize_pair(left_key_df[i], right_key_df[i])
+    return left_key_df, right_key_df
+
+
+@merge_stats.timed('sort')
+def sort_order(df: pandas.DataFrame, on: List[Hashable], key_df: pandas.DataFrame, sort: List[int]) -> numpy.ndarray:
+    '''
+    | Positions of rows sorted by keys of `sort`, in the same order as `sort_values` of key frame.
+    | `Between` keys are sorted by numeric keys of `Between.sort_keys` instead of comparing `Range` objects,
+    | so all keys are sorted by one `numpy.lexsort`.
+    '''
+    keys = []
+    for i in sort:
+        if isinstance(on[i], Between):
+            keys.extend(on[i].sort_keys(df))
+        else:
+            keys.append(sort_rank(key_df[i]))
+    return numpy.lexsort(keys[::-1])
+
+
+def key_series(df: pandas.DataFrame, key: Hashable) -> pandas.Series:
+    return (df[key] if not isinstance(key, CustomColumn) else key(df)).reset_index(drop=True)
+
+
+def validate(left: pandas.DataFrame, right: pandas.DataFrame,
+             left_on: Union[Hashable, List[Hashable]], right_on: Union[Hashable, List[Hashable]],
+             how: str, keep_index: Optional[str] = None,
+             match: str = 'all', k: int = 1) -> Tuple[List[Hashable], List[Hashable]]:
+    '''
+    | Check merge options and normalize merge keys to lists.
+    '''
     if not isinstance(left_on, list):
         left_on = [left_on]
     if not isinstance(right_on, list):
         right_on = [right_on]
 
     if how not in how_types:
-        raise ValueError('how must be inner, outer, left or right.')
+        raise ValueError('how must be inner, outer, left, right, semi or anti.')
+
+    if keep_index not in keep_index_types:
+        raise ValueError('keep_index must be None, columns or multiindex.')
+
+    if match not in match_types:
+        raise ValueError('match must be all, first, last or nearest.')
+
+    if not isinstance(k, int) or k < 1:
+        raise ValueError('k must be positive integer.')
 
     if len(left_on) != len(right_on):
         raise ValueError('Length of left and right merge keys must be same.')
@@ -35,20 +313,7 @@ def merge(left: pandas.DataFrame, right: pandas.DataFrame,
             raise KeyError(r_on_col)
         if isinstance(r_on_col, CustomColumn) and (not r_on_col.column_check(right.columns)):
             raise KeyError(r_on_col)
-
-    key_length = len(left_on)
-
-    if sort is True:
-        sort = list(range(key_length))
-    elif sort is False:
-        sort = []
-
-    left_key_df = pandas.DataFrame({i: left[k] if not isinstance(k, CustomColumn) else k(left)
-                                    for i, k in enumerate(left_on)})
-    right_key_df = pandas.DataFrame({i: right[k] if not isinstance(k, CustomColumn) else k(right)
-                                    for i, k in enumerate(right_on)})
-    left, right = rename(left, right, suffixes)
-    return custom_merge(left, right, left_key_df, right_key_df, how, sort)
+    return left_on, right_on
 
 
 def rename(left, right, suffixes=('_x', '_y')):
@@ -0,0 +1,267 @@
+import sys
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+import numpy
+import pandas
+
+from pandas_bj import stats
+from pandas_bj.between import Between, CustomColumn
+
+# rows hashed for fingerprint of key columns.
+sample_size = 1000
+
+
+class CacheInfo(NamedTuple):
+    '''
+    Counters and size of `BuildCache` given by `cache_info`.
+    '''
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    nbytes: int
+    max_bytes: int
+
+
+class _Entry():
+    def __init__(self, value: Any, nbytes: int, ref: Optional[weakref.ref] = None):
+        self.value = value
+        self.nbytes = nbytes
+        # dataframe the value is built from. The entry is stale once it is collected.
+        self.ref = ref
+        self.finalizer: Optional[weakref.finalize] = None
+        # values built from this value, like sorted keys built from keys.
+        self.attached: Dict[Hashable, Any] = {}
+
+
+def _object_nbytes(value: Any) -> int:
+    # attributes of objects like `Range` are held in their dict.
+    size = sys.getsizeof(value)
+    if hasattr(value, '__dict__'):
+        size += sys.getsizeof(vars(value))
+    return size
+
+
+def nbytes(value: Any) -> int:
+    '''
+    | Approximate memory usage of built keys: arrays, pandas objects, and lists, dicts and objects holding them.
+    | Objects in object arrays and columns, like `Range` and strings, are counted by their own size.
+    '''
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return 0
+    if isinstance(value, numpy.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(_object_nbytes(v) for v in value.ravel())
+        return value.nbytes
+    if isinstance(value, pandas.DataFrame):
+        return sum(nbytes(value.iloc[:, i]) for i in range(len(value.columns)))
+    if isinstance(value, pandas.Series):
+        if value.dtype == object:
+            return nbytes(value.to_numpy())
+        return int(value.memory_usage(index=False, deep=True))
+    if isinstance(value, pandas.Index):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(nbytes(v) for v in value.values())
+    if hasattr(value, '__dict__'):
+        return nbytes(vars(value))
+    return 0
+
+
+class BuildCache():
+    '''
+    BuildCache keeps keys built for merges, so that the same dataframe merged again with the same keys
+    is not built, hash-partitioned and sorted again.
+
+    Values are keyed by `fingerprint` of dataframe and keys, and evicted in least recently used order
+    when total bytes exceed `max_bytes`. Values built from a cached value, like sorted keys of cached keys,
+    are attached to its entry and evicted together.
+    Entries hold a weak reference to the dataframe, and are evicted when it is collected,
+    so a dataframe reusing the id of a collected one never gets its keys.
+    '''
+
+    def __init__(self, max_bytes: int):
+        if max_bytes < 0:
+            raise ValueError('max_bytes must not be negative.')
+        self.max_bytes = max_bytes
+        self.entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+        # keys of entries by id of cached values.
+        self.owners: Dict[int, Hashable] = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _hit(self):
+        self.hits += 1
+        stats.count('cache_hits', 1)
+
+    def _miss(self):
+        self.misses += 1
+        stats.count('cache_misses', 1)
+
+    def get(self, key: Hashable, build: Callable[[], Any], df: Optional[pandas.DataFrame] = None) -> Any:
+        '''
+        | Get cached value of key, or build and cache it.
+        | If `df` is given, the value is cached only while `df` is alive, and only returned for `df` itself.
+        '''
+        entry = self.entries.get(key)
+        if entry is not None and (entry.ref is None or entry.ref() is df):
+            self.entries.move_to_end(key)
+            self._hit()
+            return entry.value
+        if entry is not None:
+            self._remove(key)
+        self._miss()
+        value = build()
+        entry = _Entry(value, nbytes(value), weakref.ref(df) if df is not None else None)
+        if df is not None:
+            entry.finalizer = weakref.finalize(df, self._collected, key, entry)
+        self.entries[key] = entry
+        self.owners[id(value)] = key
+        self.nbytes += entry.nbytes
+        self._evict()
+        return value
+
+    def attach(self, owner: Any, key: Hashable, build: Callable[[], Any]) -> Any:
+        '''
+        | Get value built from cached value `owner`, or build and attach it to the entry of owner.
+        | Value is just built if owner is not cached.
+        '''
+        owner_key = self.owners.get(id(owner))
+        entry = self.entries.get(owner_key) if owner_key is not None else None
+        if entry is None or entry.value is not owner:
+            return build()
+        self.entries.move_to_end(owner_key)
+        if key in entry.attached:
+            self._hit()
+            return entry.attached[key]
+        self._miss()
+        value = build()
+        size = nbytes(value)
+        entry.attached[key] = value
+        entry.nbytes += size
+        self.nbytes += size
+        self._evict()
+        return value
+
+    def _remove(self, key: Hashable):
+        entry = self.entries.pop(key)
+        del self.owners[id(entry.value)]
+        self.nbytes -= entry.nbytes
+        if entry.finalizer is not None:
+            entry.finalizer.detach()
+
+    def _collected(self, key: Hashable, entry: _Entry):
+        # the entry may be replaced or evicted already.
+        if self.entries.get(key) is entry:
+            self._remove(key)
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and len(self.entries) > 0:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def clear(self):
+        for key in list(self.entries):
+            self._remove(key)
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.evictions, len(self.entries), self.nbytes, self.max_bytes)
+
+
+_cache: Optional[BuildCache] = None
+
+
+def enable_cache(max_bytes: int = 512 * 1024 ** 2) -> BuildCache:
+    '''
+    Cache keys built by `pandas_bj.merge` in this process, up to `max_bytes`.
+
+    Keys of a dataframe are reused when the same dataframe is merged again with the same keys:
+    `RangeArray` and sorted keys for numpy engine, and key frames of `Between` for python engine.
+    Dataframes are identified by `fingerprint`, so modify cached dataframes only by making new ones.
+    Calling it again replaces the cache with an empty one.
+
+    :param max_bytes: byte budget. Least recently used keys are evicted beyond it.
+    :return: BuildCache.
+    '''
+    global _cache
+    if _cache is not None:
+        _cache.clear()
+    _cache = BuildCache(max_bytes)
+    return _cache
+
+
+def disable_cache():
+    '''
+    | Stop caching and drop cached keys.
+    '''
+    global _cache
+    if _cache is not None:
+        _cache.clear()
+    _cache = None
+
+
+def cache_info() -> Optional[CacheInfo]:
+    '''
+    | Hits, misses, evictions, entries and bytes of the cache. None if the cache is not enabled.
+    '''
+    return _cache.info() if _cache is not None else None
+
+
+def _spec(key: Hashable) -> Optional[Tuple[Any, List[Hashable]]]:
+    '''
+    | Hashable description of a merge key and columns it reads. None if columns are not known.
+    '''
+    if isinstance(key, Between):
+        return ('between', key.f, key.t, key.f_open, key.t_open), [c for c in (key.f, key.t) if c is not None]
+    if isinstance(key, CustomColumn):
+        return None
+    return key, [key]
+
+
+def fingerprint(df: pandas.DataFrame, on: List[Hashable]) -> Optional[Hashable]:
+    '''
+    Cheap fingerprint of key columns of a dataframe: id and shape of dataframe, keys, dtypes of key columns,
+    and hash of rows sampled at regular intervals.
+    Ids are reused after dataframes are collected, so `BuildCache` also checks the dataframe by weak reference.
+    None if keys can not be fingerprinted, like custom columns other than `Between`.
+    '''
+    specs = []
+    columns = []
+    for key in on:
+        spec = _spec(key)
+        if spec is None:
+            return None
+        specs.append(spec[0])
+        columns.extend(c for c in spec[1] if c not in columns)
+    n = len(df.index)
+    positions = numpy.unique(numpy.linspace(0, n - 1, min(n, sample_size)).astype(numpy.int64))
+    sampled = df[columns].iloc[positions]
+    digest = hash(pandas.util.hash_pandas_object(sampled, index=False).to_numpy().tobytes())
+    return id(df), df.shape, tuple(specs), tuple(str(df[c].dtype) for c in columns), digest
+
+
+def cached(df: pandas.DataFrame, on: List[Hashable], name: str, build: Callable[[], Any]) -> Any:
+    '''
+    | Get value built from keys of dataframe by `build`, named `name`, from the cache if enabled.
+    '''
+    if _cache is None:
+        return build()
+    key = fingerprint(df, on)
+    if key is None:
+        return build()
+    return _cache.get((name, key), build, df)
+
+
+def attached(owner: Any, key: Hashable, build: Callable[[], Any]) -> Any:
+    '''
+    | Get value built from cached value `owner` by `build`, from the cache if enabled.
+    '''
+    if _cache is None:
+        return build()
+    return _cache.attach(owner, key, build)
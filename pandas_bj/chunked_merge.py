@@ -0,0 +1,90 @@
+from typing import Hashable, Iterable, Iterator, List, Optional, Union
+
+import numpy
+import pandas
+
+from pandas_bj import sorted_search
+from pandas_bj.between import Between, CustomColumn
+from pandas_bj.between_index import BetweenIndex
+from pandas_bj.between_merge import validate, rename, how_types
+from pandas_bj.custom_merge import merge_positions, filter_rows, filter_types
+
+
+def _chunks(left_chunks: Union[pandas.DataFrame, Iterable[pandas.DataFrame]],
+            chunksize: Optional[int]) -> Iterator[pandas.DataFrame]:
+    if isinstance(left_chunks, pandas.DataFrame):
+        left_chunks = [left_chunks]
+    for chunk in left_chunks:
+        if chunksize is None:
+            yield chunk
+            continue
+        # empty chunk is yielded too, so that columns of left are known.
+        for start in range(0, max(len(chunk.index), 1), chunksize):
+            yield chunk.iloc[start:start + chunksize]
+
+
+def _empty_left(left_on: Union[Hashable, List[Hashable]]) -> pandas.DataFrame:
+    '''
+    | Empty left dataframe with key columns, for unmatched rows of right when left has no chunks at all.
+    '''
+    columns = []
+    for key in (left_on if isinstance(left_on, list) else [left_on]):
+        if isinstance(key, Between):
+            columns.extend(c for c in (key.f, key.t) if c is not None and c not in columns)
+        elif isinstance(key, CustomColumn):
+            raise ValueError('Columns of left are unknown without chunks, since left_on has custom columns.')
+        elif key not in columns:
+            columns.append(key)
+    return pandas.DataFrame({c: pandas.Series(dtype=numpy.float64) for c in columns})
+
+
+def merge_iter(left_chunks: Union[pandas.DataFrame, Iterable[pandas.DataFrame]], right: pandas.DataFrame,
+               left_on: Union[Hashable, List[Hashable]], right_on: Union[Hashable, List[Hashable]],
+               how: str = 'inner', chunksize: Optional[int] = None,
+               suffixes=('_x', '_y'), keep_index: Optional[str] = None) -> Iterator[pandas.DataFrame]:
+    '''
+    Merge chunks of left with right, and yield merged dataframe per chunk.
+
+    Keys of right are built only once, and memory usage is bounded by size of each chunk.
+    `left_chunks` can be dataframe, list of dataframes or iterator like `pandas.read_csv(chunksize=...)`.
+
+    For `right` and `outer`, rows of right that are not matched with any chunk are yielded at last,
+    even if no chunk is given.
+
+    :param left_chunks: dataframe or iterable of dataframes.
+    :param right: right dataframe.
+    :param left_on: same as `pandas_bj.merge`.
+    :param right_on: same as `pandas_bj.merge`.
+    :param how: same as `pandas_bj.merge`.
+    :param chunksize: split each chunk of left into smaller chunks of this number of rows.
+    :param suffixes: same as `pandas_bj.merge`.
+    :param keep_index: same as `pandas_bj.merge`. Use it to know rows of which chunk are merged.
+    :return: iterator of merged dataframes.
+    '''
+    if how not in how_types:
+        raise ValueError('how must be inner, outer, left, right, semi or anti.')
+    index = BetweenIndex(right, right_on)
+    # unmatched rows of right are yielded at last.
+    chunk_how = {'inner': 'inner', 'left': 'left', 'right': 'inner', 'outer': 'left',
+                 'semi': 'semi', 'anti': 'anti'}[how]
+    right_matched = numpy.zeros(len(right.index), dtype=bool)
+    last_chunk = None
+    for chunk in _chunks(left_chunks, chunksize):
+        chunk_on, right_on_ = validate(chunk, right, left_on, index.on, how, keep_index)
+        if not sorted_search.supports(chunk, right, chunk_on, right_on_):
+            raise ValueError('merge_iter only supports keys that numpy engine supports.')
+        if how in filter_types:
+            yield filter_rows(chunk, index.count_matches(chunk, chunk_on), how, keep_index, suffixes[0])
+            continue
+        left_pos, right_pos = index.match(chunk, chunk_on)
+        right_matched[right_pos] = True
+        last_chunk = chunk
+        chunk, right_ = rename(chunk, right, suffixes)
+        yield merge_positions(chunk, right_, left_pos, right_pos, chunk_how, keep_index, suffixes)
+
+    if how in {'right', 'outer'}:
+        if last_chunk is None:
+            last_chunk = _empty_left(left_on)
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        last_chunk, right_ = rename(last_chunk, right.iloc[numpy.flatnonzero(~right_matched)], suffixes)
+        yield merge_positions(last_chunk, right_, empty, empty, 'right', keep_index, suffixes)
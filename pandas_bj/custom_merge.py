@@ -1,31 +1,42 @@
-from typing import Tuple, List, Set
+from typing import Hashable, Tuple, List, Optional, Union
 
+import numpy
 import pandas
+from pandas.api.extensions import take
 
+from pandas_bj import stats
 
-def reindex(df_l: pandas.DataFrame, df_r: pandas.DataFrame, on_l: pandas.DataFrame, on_r: pandas.DataFrame,
-            sortable_columns: List[int], eq_null: bool = False) \
-        -> Tuple[pandas.DataFrame, pandas.DataFrame, Set[int], Set[int]]:
+
+@stats.timed('match')
+def reindex(on_l: pandas.DataFrame, on_r: pandas.DataFrame,
+            sortable_columns: List[int], eq_null: bool = False,
+            orders: Optional[Tuple[numpy.ndarray, numpy.ndarray]] = None) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    | Find matched row pairs by comparing keys row by row.
+    :param orders: positions of rows of left and right sorted by `sortable_columns`.
+                   Rows are sorted by `sort_values` of keys if not given.
+    :return: positional indexes of left and right.
+    '''
     left_data_idx = []
     right_data_idx = []
 
-    left_data_first_idx = df_l.index[0]
-    right_data_first_idx = df_r.index[0]
-
     def add_left_row(idx):
         left_data_idx.append(idx)
 
     def add_right_row(idx):
         right_data_idx.append(idx)
 
-    i = 0
-    llabels = set()
-    rlabels = set()
+    # labels are positions.
+    on_l = on_l.reset_index(drop=True)
+    on_r = on_r.reset_index(drop=True)
 
     num_keys = len(on_l.columns)
 
     # pandas use __gt__ for sorting, so we can use sorting.
-    if len(sortable_columns) > 0:
+    if len(sortable_columns) > 0 and orders is not None:
+        on_l = on_l.take(orders[0])
+        on_r = on_r.take(orders[1])
+    elif len(sortable_columns) > 0:
         on_l.sort_values(by=[on_l.columns[i] for i in sortable_columns], inplace=True)
         on_r.sort_values(by=[on_r.columns[i] for i in sortable_columns], inplace=True)
     # for lrow, rrow in product(df_l.iterrows(), df_r.iterrows()):
@@ -36,13 +47,14 @@ def reindex(df_l: pandas.DataFrame, df_r: pandas.DataFrame, on_l: pandas.DataFra
     skip_r_head = 0
     riter = list(_df_r.itertuples())
     r_len = len(riter)
+    comparisons = 0
     for lrow in _df_l.itertuples():
         li = lrow[0]
         fin_rnames = []
-        lname = li
         rnames = []
         current_r_iter = skip_r_head
         for r_idx in range(skip_r_head, r_len):
+            comparisons += 1
             rrow = riter[r_idx]
             ri = rrow[0]
             bad = False
@@ -100,61 +112,231 @@ def reindex(df_l: pandas.DataFrame, df_r: pandas.DataFrame, on_l: pandas.DataFra
             fin_rnames = rnames
             current_r_iter += 1
         for ri in fin_rnames:
-            llabels.add(lname)
-            rlabels.add(ri)
             add_left_row(li)
             add_right_row(ri)
-            i += 1
-    louter = set(range(i))
-    router = set(range(i))
-    lmiss_count = 0
-    rmiss_count = 0
-    for li in df_l.index:
-        if li not in llabels:
-            add_left_row(li)
-            add_right_row(right_data_first_idx)
-            louter.add(i)
-            i += 1
-            rmiss_count += 1
-    for ri in df_r.index:
-        if ri not in rlabels:
-            add_right_row(ri)
-            add_left_row(left_data_first_idx)
-            router.add(i)
-            i += 1
-            lmiss_count += 1
-
-    right_data_ = df_r.loc[right_data_idx].reset_index(drop=True)
-    lr = len(right_data_.index)
-    if lmiss_count > 0:
-        right_data_.iloc[[lr - 1 - j - lmiss_count for j in range(rmiss_count)]] = None
-
-    left_data_ = df_l.loc[left_data_idx].reset_index(drop=True)
-    ll = len(left_data_.index)
-    if rmiss_count > 0:
-        left_data_.iloc[[ll - 1 - j for j in range(lmiss_count)]] = None
-    return left_data_, right_data_, louter, router
-
-
-def drop_outer(merged: pandas.DataFrame, louter: Set[int], router: Set[int], method: str):
-    if method == 'left':
-        outer = louter
-    elif method == 'right':
-        outer = router
-    elif method == 'inner':
-        outer = router & louter
+    stats.count('comparisons', comparisons)
+    # rows of right not compared thanks to sort.
+    stats.count('skipped_rows', len(_df_l.index) * r_len - comparisons)
+    return numpy.array(left_data_idx, dtype=numpy.int64), numpy.array(right_data_idx, dtype=numpy.int64)
+
+
+def take_positions(left_pos: numpy.ndarray, right_pos: numpy.ndarray, n_left: int, n_right: int,
+                   how: str = 'inner') -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    | Build positional indexers of merged rows.
+    | Matched rows come first, then unmatched rows of left and unmatched rows of right by `how`.
+    | -1 means the row is missing in the side.
+    '''
+    left_idx = [left_pos]
+    right_idx = [right_pos]
+    if how in {'left', 'outer'}:
+        lmatched = numpy.zeros(n_left, dtype=bool)
+        lmatched[left_pos] = True
+        lmiss = numpy.flatnonzero(~lmatched)
+        left_idx.append(lmiss)
+        right_idx.append(numpy.full(len(lmiss), -1, dtype=numpy.int64))
+    if how in {'right', 'outer'}:
+        rmatched = numpy.zeros(n_right, dtype=bool)
+        rmatched[right_pos] = True
+        rmiss = numpy.flatnonzero(~rmatched)
+        left_idx.append(numpy.full(len(rmiss), -1, dtype=numpy.int64))
+        right_idx.append(rmiss)
+    return numpy.concatenate(left_idx).astype(numpy.int64), numpy.concatenate(right_idx).astype(numpy.int64)
+
+
+def take_rows(df: pandas.DataFrame, idx: numpy.ndarray) -> pandas.DataFrame:
+    '''
+    | Take rows by positions. -1 makes a row of nulls.
+    '''
+    if not (idx < 0).any():
+        return df.take(idx).reset_index(drop=True)
+    columns = [take(df.iloc[:, i].array, idx, allow_fill=True) for i in range(len(df.columns))]
+    result = pandas.DataFrame(dict(enumerate(columns)), index=pandas.RangeIndex(len(idx)))
+    result.columns = df.columns
+    return result
+
+
+keep_index_types = {None, 'columns', 'multiindex'}
+filter_types = {'semi', 'anti'}
+
+
+def index_frame(df: pandas.DataFrame, suffix: str) -> pandas.DataFrame:
+    '''
+    | Index labels of dataframe as columns, named with suffix.
+    '''
+    index = df.index
+    if index.nlevels == 1:
+        names = [index.name if index.name is not None else 'index']
     else:
-        return merged
-    merged = merged[merged.index.isin(outer)]
-    return merged
+        names = [name if name is not None else f'level_{i}' for i, name in enumerate(index.names)]
+    labels = index.to_frame(index=False)
+    labels.columns = [f'{name}{suffix}' for name in names]
+    return labels
+
+
+class LazyMerge():
+    '''
+    LazyMerge is a merged dataframe holding only positions of matched rows,
+    and columns are taken from left and right when they are accessed.
+    Memory and time to build columns scale with columns used, not with columns of inputs.
+
+    ```
+    result = pandas_bj.merge(df1, df2, ['id1', Between('s', 'e')], ['id3', 'v'], lazy=True)
+    v = result['v']
+    df = result[['s', 'v']]
+    df = result.to_pandas()
+    ```
+
+    Columns are same as the merged dataframe, and rows with -1 position get nulls for the side.
+    '''
+
+    def __init__(self, parts: List[Tuple[pandas.DataFrame, numpy.ndarray]],
+                 index_parts: Optional[List[Tuple[pandas.DataFrame, numpy.ndarray]]] = None):
+        '''
+        :param parts: dataframes and positions of their rows, in order of columns.
+        :param index_parts: same as `parts` for levels of MultiIndex. None for RangeIndex.
+        '''
+        self.parts = parts
+        self.index_parts = index_parts
+        self._index = None
+
+    @property
+    def columns(self) -> pandas.Index:
+        return pandas.Index([c for df, _ in self.parts for c in df.columns])
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self), len(self.columns)
+
+    def __len__(self):
+        return len(self.parts[0][1])
+
+    @property
+    def index(self) -> pandas.Index:
+        '''
+        | Index of merged dataframe. Index labels of `keep_index='multiindex'` are taken at the first access.
+        '''
+        if self._index is None:
+            if self.index_parts is None:
+                self._index = pandas.RangeIndex(len(self))
+            else:
+                labels = pandas.concat([take_rows(df, idx) for df, idx in self.index_parts], axis=1)
+                self._index = pandas.MultiIndex.from_frame(labels)
+        return self._index
+
+    def to_pandas(self, columns: Optional[List[Hashable]] = None) -> pandas.DataFrame:
+        '''
+        | Build merged dataframe of columns.
+        :param columns: columns to take. All columns if None.
+        :return: dataframe.
+        '''
+        if columns is None:
+            columns = list(self.columns)
+        missing = [c for c in columns if c not in self.columns]
+        if len(missing) > 0:
+            raise KeyError(missing)
+        taken = []
+        for df, idx in self.parts:
+            names = [c for c in df.columns if c in columns]
+            if len(names) > 0:
+                taken.append(take_rows(df[names], idx))
+        if len(taken) == 0:
+            result = pandas.DataFrame(index=pandas.RangeIndex(len(self)))
+        else:
+            result = pandas.concat(taken, axis=1)[columns]
+        result.index = self.index
+        return result
+
+    def __getitem__(self, key: Union[Hashable, List[Hashable]]) -> Union[pandas.Series, pandas.DataFrame]:
+        if isinstance(key, list):
+            return self.to_pandas(key)
+        for df, idx in self.parts:
+            if key in df.columns:
+                column = take_rows(df[[key]], idx)[key]
+                column.index = self.index
+                return column
+        raise KeyError(key)
+
+    def __repr__(self):
+        return f'LazyMerge(rows={len(self)}, columns={list(self.columns)})'
+
+
+@stats.timed('materialize')
+def merge_positions(left: pandas.DataFrame, right: pandas.DataFrame,
+                    left_pos: numpy.ndarray, right_pos: numpy.ndarray, how: str = 'inner',
+                    keep_index: Optional[str] = None, suffixes=('_x', '_y'),
+                    lazy: bool = False) -> Union[pandas.DataFrame, LazyMerge]:
+    '''
+    | Build merged dataframe from matched row pairs.
+    :param left: left dataframe.
+    :param right: right dataframe.
+    :param left_pos: positional indexes of matched left rows.
+    :param right_pos: positional indexes of matched right rows.
+    :param how: inner, left, right or outer.
+    :param keep_index: None for RangeIndex, 'columns' to add index labels of left and right as columns,
+                       'multiindex' to use them as MultiIndex.
+    :param suffixes: suffixes for names of index labels.
+    :param lazy: return `LazyMerge` instead of dataframe.
+    :return: merged dataframe.
+    '''
+    stats.count('matches', len(left_pos))
+    left_idx, right_idx = take_positions(left_pos, right_pos, len(left.index), len(right.index), how)
+    if lazy:
+        labels = [] if keep_index is None else [(index_frame(left, suffixes[0]), left_idx),
+                                                (index_frame(right, suffixes[1]), right_idx)]
+        return lazy_merge([(left, left_idx), (right, right_idx)], labels, keep_index)
+    result = pandas.concat([take_rows(left, left_idx), take_rows(right, right_idx)], axis=1)
+    if keep_index is None:
+        return result
+    labels = pandas.concat([take_rows(index_frame(left, suffixes[0]), left_idx),
+                            take_rows(index_frame(right, suffixes[1]), right_idx)], axis=1)
+    return with_labels(result, labels, keep_index)
+
+
+def lazy_merge(parts: List[Tuple[pandas.DataFrame, numpy.ndarray]],
+               labels: List[Tuple[pandas.DataFrame, numpy.ndarray]], keep_index: Optional[str]) -> LazyMerge:
+    if keep_index == 'columns':
+        return LazyMerge(labels + parts)
+    return LazyMerge(parts, labels if keep_index == 'multiindex' else None)
+
+
+def with_labels(result: pandas.DataFrame, labels: pandas.DataFrame, keep_index: str) -> pandas.DataFrame:
+    if keep_index == 'columns':
+        return pandas.concat([labels, result], axis=1)
+    result.index = pandas.MultiIndex.from_frame(labels)
+    return result
+
+
+@stats.timed('materialize')
+def filter_rows(left: pandas.DataFrame, counts: numpy.ndarray, how: str = 'semi',
+                keep_index: Optional[str] = None, suffix: str = '_x',
+                lazy: bool = False) -> Union[pandas.DataFrame, LazyMerge]:
+    '''
+    | Build result of semi or anti merge from number of matched rows per left row.
+    :param left: left dataframe.
+    :param counts: number of matched right rows per left row.
+    :param how: semi to keep left rows with any match, anti to keep left rows without match.
+    :param keep_index: same as `merge_positions`, only index labels of left are kept.
+    :param suffix: suffix for names of index labels.
+    :param lazy: same as `merge_positions`.
+    :return: rows of left in original order.
+    '''
+    stats.count('matches', counts.sum())
+    rows = numpy.flatnonzero(counts > 0 if how == 'semi' else counts == 0)
+    if lazy:
+        labels = [] if keep_index is None else [(index_frame(left, suffix), rows)]
+        return lazy_merge([(left, rows)], labels, keep_index)
+    result = take_rows(left, rows)
+    if keep_index is None:
+        return result
+    return with_labels(result, take_rows(index_frame(left, suffix), rows), keep_index)
 
 
 def merge(left: pandas.DataFrame, right: pandas.DataFrame,
           left_key_df: pandas.DataFrame, right_key_df: pandas.DataFrame,
-          how: str = 'inner', sortable_columns: List[int] = list()) -> pandas.DataFrame:
-    df_left_, df_right_, louter, router = reindex(left, right, left_key_df, right_key_df,
-                                                  sortable_columns)
-    result: pandas.DataFrame = pandas.merge(df_left_, df_right_, how,
-                                            left_index=True, right_index=True, copy=False)
-    result: pandas.DataFrame = drop_outer(result, louter, router, how)
-    return result
+          how: str = 'inner', sortable_columns: List[int] = list(),
+          keep_index: Optional[str] = None, suffixes=('_x', '_y'),
+          orders: Optional[Tuple[numpy.ndarray, numpy.ndarray]] = None,
+          lazy: bool = False) -> Union[pandas.DataFrame, LazyMerge]:
+    left_pos, right_pos = reindex(left_key_df, right_key_df, sortable_columns, orders=orders)
+    return merge_positions(left, right, left_pos, right_pos, how, keep_index, suffixes, lazy)
@@ -0,0 +1,140 @@
+import os
+from typing import Dict, Hashable, List, Union
+
+import numpy
+import pandas
+from pandas.api.extensions import take
+
+from pandas_bj import sorted_search
+from pandas_bj.between import Between, CustomColumn, RangeArray
+from pandas_bj.between_merge import rename, how_types
+from pandas_bj.custom_merge import take_positions, take_rows
+
+Column = Union[str, os.PathLike, numpy.ndarray]
+
+
+def open_columns(columns: Dict[Hashable, Column]) -> Dict[Hashable, numpy.ndarray]:
+    '''
+    | Open columns given as paths of `.npy` files as memory-mapped arrays. Arrays are kept as they are.
+    '''
+    opened = {}
+    for name, column in columns.items():
+        if isinstance(column, (str, os.PathLike)):
+            column = numpy.load(column, mmap_mode='r')
+        opened[name] = column
+    lengths = {len(column) for column in opened.values()}
+    if len(lengths) > 1:
+        raise ValueError('Columns of right must have the same length.')
+    return opened
+
+
+def key_columns(on: List[Hashable]) -> List[Hashable]:
+    '''
+    | Names of columns used by keys.
+    '''
+    names = []
+    for key in on:
+        if isinstance(key, Between):
+            names.extend(c for c in (key.f, key.t) if c is not None)
+        else:
+            names.append(key)
+    return names
+
+
+def take_columns(columns: Dict[Hashable, numpy.ndarray], idx: numpy.ndarray) -> pandas.DataFrame:
+    '''
+    | Take rows of columns by positions. -1 makes a row of nulls.
+    | Each row is read once and in order of positions, so that memory-mapped columns are read sequentially.
+    '''
+    valid = idx >= 0
+    unique, inverse = numpy.unique(idx[valid], return_inverse=True)
+    indexer = numpy.full(len(idx), -1, dtype=numpy.int64)
+    indexer[valid] = inverse
+    fill = not valid.all()
+    return pandas.DataFrame({name: take(numpy.asarray(column[unique]), indexer, allow_fill=fill)
+                             for name, column in columns.items()}, index=pandas.RangeIndex(len(idx)))
+
+
+def merge_files(left: pandas.DataFrame, right: Dict[Hashable, Column],
+                left_on: Union[Hashable, List[Hashable]], right_on: Union[Hashable, List[Hashable]],
+                how: str = 'inner', chunksize: int = 10000000, suffixes=('_x', '_y')) -> pandas.DataFrame:
+    '''
+    Merge left with right stored as column files larger than memory.
+
+    Right is given as columns of `.npy` files, which are memory-mapped, or any arrays like `numpy.memmap`.
+    Key columns of right are read by runs of `chunksize` rows. Each run is hash-partitioned and sorted in memory,
+    and probed by keys of left at once, so memory usage of keys is bounded by `chunksize`.
+    Other columns of right are read only at matched positions.
+
+    ```
+    result = merge_files(df1, {'id3': 'id3.npy', 'v': 'v.npy', 'w': 'w.npy'},
+                         ['id1', Between('s', 'e')], ['id3', 'v'], chunksize=50000000)
+    ```
+
+    :param left: left dataframe.
+    :param right: dict of column names and paths of `.npy` files or arrays.
+    :param left_on: same as `pandas_bj.merge`.
+    :param right_on: same as `pandas_bj.merge`. Names are keys of `right`.
+    :param how: inner, left, right or outer. right and outer need a flag per row of right in memory.
+    :param chunksize: number of rows of right read at once.
+    :param suffixes: same as `pandas_bj.merge`.
+    :return: merged dataframe.
+    '''
+    if not isinstance(left_on, list):
+        left_on = [left_on]
+    if not isinstance(right_on, list):
+        right_on = [right_on]
+    if how not in how_types - {'semi', 'anti'}:
+        raise ValueError('how must be inner, outer, left or right.')
+    if len(left_on) != len(right_on):
+        raise ValueError('Length of left and right merge keys must be same.')
+    if not isinstance(chunksize, int) or chunksize < 1:
+        raise ValueError('chunksize must be positive integer.')
+
+    columns = open_columns(right)
+    for name in key_columns(right_on):
+        if name not in columns:
+            raise KeyError(name)
+    for key in left_on:
+        if not isinstance(key, CustomColumn) and key not in left.columns:
+            raise KeyError(key)
+        if isinstance(key, CustomColumn) and not key.column_check(left.columns):
+            raise KeyError(key)
+    n_right = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+
+    def run(start: int, stop: int) -> pandas.DataFrame:
+        return pandas.DataFrame({name: numpy.asarray(columns[name][start:stop]) for name in key_columns(right_on)})
+
+    if not sorted_search.supports(left, run(0, 0), left_on, right_on):
+        raise ValueError('merge_files only supports keys that numpy engine supports.')
+
+    left_keys = sorted_search.build_keys(left, left_on)
+    # when left holds points, they are sorted once and probed by ranges of each run.
+    sorted_left = None
+    left_pos = [numpy.zeros(0, dtype=numpy.int64)]
+    right_pos = [numpy.zeros(0, dtype=numpy.int64)]
+    for start in range(0, n_right, chunksize):
+        stop = min(start + chunksize, n_right)
+        frame = run(start, stop)
+        if not sorted_search.supports(left, frame, left_on, right_on):
+            raise ValueError('merge_files only supports keys that numpy engine supports.')
+        right_keys = sorted_search.build_keys(frame, right_on)
+        eq, ranges = sorted_search.layout(left_keys, right_keys)
+        if len(ranges) > 0 and not isinstance(left_keys[ranges[0]], RangeArray):
+            if sorted_left is None:
+                sorted_left = sorted_search.SortedKeys(left_keys, eq, ranges)
+            rp, lp = sorted_left.probe(right_keys)
+        else:
+            lp, rp = sorted_search.match(left_keys, right_keys)
+        left_pos.append(lp)
+        right_pos.append(rp + start)
+    left_pos = numpy.concatenate(left_pos)
+    right_pos = numpy.concatenate(right_pos)
+    order = numpy.lexsort((right_pos, left_pos))
+    left_pos, right_pos = left_pos[order], right_pos[order]
+
+    left_idx, right_idx = take_positions(left_pos, right_pos, len(left.index), n_right, how)
+    left, names = rename(left, pandas.DataFrame(columns=list(columns.keys())), suffixes)
+    right_rows = take_columns(columns, right_idx)
+    right_rows.columns = names.columns
+    return pandas.concat([take_rows(left, left_idx), right_rows], axis=1)
@@ -0,0 +1,120 @@
+from typing import Dict, List, Tuple, Union
+
+import numpy
+
+from pandas_bj.between import RangeArray, key_values
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+Key = Union[numpy.ndarray, RangeArray]
+
+# first size of buffers of matched pairs. Buffers are doubled when full.
+buffer_size = 1024
+
+
+def available() -> bool:
+    '''
+    | Compiled kernel is available or not. False if numba is not installed.
+    '''
+    return kernel is not None
+
+
+def scan_pairs(lo: numpy.ndarray, hi: numpy.ndarray, perm: numpy.ndarray, range_on_build: numpy.ndarray,
+               build_from: numpy.ndarray, build_to: numpy.ndarray,
+               build_from_opened: numpy.ndarray, build_to_opened: numpy.ndarray,
+               probe_from: numpy.ndarray, probe_to: numpy.ndarray,
+               probe_from_opened: numpy.ndarray, probe_to_opened: numpy.ndarray,
+               size: int) -> Tuple[numpy.ndarray, numpy.ndarray, int]:
+    '''
+    | Scan candidates [lo, hi) of sorted build rows for each probe row, and check them with all filters at once.
+    | Row of filter `f` is bounds of ranges on the side given by `range_on_build[f]`,
+    | and points on the other side, stored as lower bounds. Bounds of build side are in sorted order.
+    | Matched pairs are written into buffers of `size`, doubled when full.
+    | Plain Python, compiled by numba into `kernel`.
+    :return: positional indexes of probe side and build side, and number of comparisons.
+    '''
+    n_filters = len(range_on_build)
+    probe_out = numpy.empty(size, dtype=numpy.int64)
+    build_out = numpy.empty(size, dtype=numpy.int64)
+    count = 0
+    comparisons = 0
+    for p in range(len(lo)):
+        for s in range(lo[p], hi[p]):
+            ok = True
+            for f in range(n_filters):
+                comparisons += 1
+                if range_on_build[f]:
+                    f_value, t_value = build_from[f, s], build_to[f, s]
+                    f_opened, t_opened = build_from_opened[f, s], build_to_opened[f, s]
+                    value = probe_from[f, p]
+                else:
+                    f_value, t_value = probe_from[f, p], probe_to[f, p]
+                    f_opened, t_opened = probe_from_opened[f, p], probe_to_opened[f, p]
+                    value = build_from[f, s]
+                # unbounded range contains anything, even null.
+                if f_value == -numpy.inf and t_value == numpy.inf:
+                    continue
+                if f_opened:
+                    ok = f_value < value
+                else:
+                    ok = f_value <= value
+                if ok:
+                    if t_opened:
+                        ok = value < t_value
+                    else:
+                        ok = value <= t_value
+                if not ok:
+                    break
+            if not ok:
+                continue
+            if count == len(probe_out):
+                probe_out = numpy.concatenate((probe_out, numpy.empty(len(probe_out), dtype=numpy.int64)))
+                build_out = numpy.concatenate((build_out, numpy.empty(len(build_out), dtype=numpy.int64)))
+            probe_out[count] = p
+            build_out[count] = perm[s]
+            count += 1
+    return probe_out[:count], build_out[:count], comparisons
+
+
+# compiled once and cached on disk next to this module, so that later processes load it without compiling.
+kernel = numba.njit(cache=True, nogil=True)(scan_pairs) if numba is not None else None
+
+
+def _bounds(keys: List[Key], n: int) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    '''
+    | Stack bounds and open flags of keys into 2-D arrays. Points are stored as lower bounds.
+    '''
+    shape = (len(keys), n)
+    f, t = numpy.zeros(shape), numpy.zeros(shape)
+    f_opened, t_opened = numpy.zeros(shape, dtype=numpy.bool_), numpy.zeros(shape, dtype=numpy.bool_)
+    for i, key in enumerate(keys):
+        if isinstance(key, RangeArray):
+            f[i], t[i], f_opened[i], t_opened[i] = key.range_from, key.range_to, key.from_opened, key.to_opened
+        else:
+            f[i] = key_values(key)
+    return f, t, f_opened, t_opened
+
+
+def pairs(lo: numpy.ndarray, hi: numpy.ndarray, perm: numpy.ndarray, build_keys: Dict[int, Key],
+          probe_keys: List[Key], filters: List[int]) -> Tuple[numpy.ndarray, numpy.ndarray, int]:
+    '''
+    Find matched row pairs from candidates with the compiled kernel,
+    same as `SortedKeys.pairs` but candidates are never expanded into arrays.
+
+    :param lo: first candidates of sorted build rows per probe row.
+    :param hi: last candidates of sorted build rows per probe row, exclusive.
+    :param perm: positions of sorted build rows.
+    :param build_keys: range keys of build side by position.
+    :param probe_keys: keys of probe side.
+    :param filters: positions of range keys to check.
+    :return: positional indexes of probe side and build side, and number of comparisons.
+    '''
+    range_on_build = numpy.array([isinstance(build_keys[i], RangeArray) for i in filters], dtype=numpy.bool_)
+    # bounds of build side are read in sorted order, so that scans of candidates are sequential.
+    build = _bounds([build_keys[i][perm] for i in filters], len(perm))
+    probe = _bounds([probe_keys[i] for i in filters], len(lo))
+    return kernel(lo.astype(numpy.int64), hi.astype(numpy.int64), perm.astype(numpy.int64), range_on_build,
+                  *build, *probe, buffer_size)
@@ -0,0 +1,180 @@
+from typing import Hashable, List, Optional, Tuple, Union
+
+import numpy
+import pandas
+
+from pandas_bj import sorted_search
+from pandas_bj.between_index import BetweenIndex
+from pandas_bj.between_merge import validate, rename
+from pandas_bj.custom_merge import merge_positions
+
+
+class MaterializedMerge():
+    '''
+    MaterializedMerge keeps the result of a merge up to date while rows are appended to left or right.
+
+    Appended rows are merged only with indexed parts of the other side, and new matched rows are appended
+    to the result. Each append becomes a new part indexed by `BetweenIndex`, and parts are merged like a binary
+    counter while the older part is not larger than the newer one, so appended rows are probed against
+    a logarithmic number of parts and each row is sorted again only a logarithmic number of times.
+    Rows of left and right that are not matched yet are kept as flags,
+    and added to the result of left, right and outer merges at last, so they disappear once they are matched.
+
+    ```
+    view = MaterializedMerge(df1, df2, ['id1', 'id2', Between('s', 'e')], ['id3', 'id4', 'v'], how='left')
+    new_rows = view.append_right(df3)
+    result = view.result
+    ```
+
+    Rows of `result` are same as `pandas_bj.merge` of all rows, but in order of appends:
+    matched rows first, then unmatched rows of left and unmatched rows of right.
+    '''
+
+    def __init__(self, left: pandas.DataFrame, right: pandas.DataFrame,
+                 left_on: Union[Hashable, List[Hashable]], right_on: Union[Hashable, List[Hashable]],
+                 how: str = 'inner', suffixes=('_x', '_y')):
+        '''
+        :param left: left dataframe.
+        :param right: right dataframe.
+        :param left_on: same as `pandas_bj.merge`.
+        :param right_on: same as `pandas_bj.merge`.
+        :param how: inner, left, right or outer.
+        :param suffixes: same as `pandas_bj.merge`.
+        '''
+        left_on, right_on = validate(left, right, left_on, right_on, how)
+        if how not in {'inner', 'left', 'right', 'outer'}:
+            raise ValueError('how must be inner, outer, left or right.')
+        if not sorted_search.supports(left, right, left_on, right_on):
+            raise ValueError('MaterializedMerge only supports keys that numpy engine supports.')
+        self.left_on = left_on
+        self.right_on = right_on
+        self.how = how
+        self.suffixes = suffixes
+        self.left_parts: List[BetweenIndex] = [BetweenIndex(left, left_on)]
+        self.right_parts: List[BetweenIndex] = []
+        self.left_matched: List[numpy.ndarray] = [numpy.zeros(len(left.index), dtype=bool)]
+        self.right_matched: List[numpy.ndarray] = []
+        self.matched: List[pandas.DataFrame] = []
+        self._result: Optional[pandas.DataFrame] = None
+        self.append_right(right)
+
+    def _check(self, appended: pandas.DataFrame, first: pandas.DataFrame,
+               left: pandas.DataFrame, right: pandas.DataFrame):
+        if list(appended.columns) != list(first.columns):
+            raise ValueError('Appended rows must have the same columns.')
+        if not sorted_search.supports(left, right, self.left_on, self.right_on):
+            raise ValueError('MaterializedMerge only supports keys that numpy engine supports.')
+
+    def _materialize(self, left: pandas.DataFrame, right: pandas.DataFrame,
+                     left_pos: numpy.ndarray, right_pos: numpy.ndarray, how: str = 'inner') -> pandas.DataFrame:
+        left, right = rename(left, right, self.suffixes)
+        return merge_positions(left, right, left_pos, right_pos, how)
+
+    def _probe(self, df: pandas.DataFrame, on: List[Hashable],
+               parts: List[BetweenIndex]) -> List[Tuple[numpy.ndarray, numpy.ndarray]]:
+        '''
+        | Match appended rows with each indexed part of the other side.
+        :return: positions of appended rows and rows of the part, per part.
+        '''
+        keys = sorted_search.build_keys(df, on)
+        return [part.sorted(keys).probe(keys) for part in parts]
+
+    def append_right(self, right: pandas.DataFrame) -> pandas.DataFrame:
+        '''
+        | Merge rows appended to right with all rows of left, and add matched rows to the result.
+        :param right: appended rows, with the same columns as right.
+        :return: new matched rows.
+        '''
+        if len(self.right_parts) > 0:
+            self._check(right, self.right_parts[0].right, self.left_parts[0].right, right)
+        matched = numpy.zeros(len(right.index), dtype=bool)
+        frames = []
+        for part, flags, (right_pos, left_pos) in zip(self.left_parts, self.left_matched,
+                                                      self._probe(right, self.right_on, self.left_parts)):
+            flags[left_pos] = True
+            matched[right_pos] = True
+            order = numpy.argsort(left_pos, kind='stable')
+            frames.append(self._materialize(part.right, right, left_pos[order], right_pos[order]))
+        self.right_parts.append(BetweenIndex(right, self.right_on))
+        self.right_matched.append(matched)
+        self._compact(self.right_parts, self.right_matched, self.right_on)
+        return self._add(frames)
+
+    def append_left(self, left: pandas.DataFrame) -> pandas.DataFrame:
+        '''
+        | Merge rows appended to left with all rows of right, and add matched rows to the result.
+        :param left: appended rows, with the same columns as left.
+        :return: new matched rows.
+        '''
+        self._check(left, self.left_parts[0].right, left, self.right_parts[0].right)
+        matched = numpy.zeros(len(left.index), dtype=bool)
+        frames = []
+        for part, flags, (left_pos, right_pos) in zip(self.right_parts, self.right_matched,
+                                                      self._probe(left, self.left_on, self.right_parts)):
+            flags[right_pos] = True
+            matched[left_pos] = True
+            frames.append(self._materialize(left, part.right, left_pos, right_pos))
+        self.left_parts.append(BetweenIndex(left, self.left_on))
+        self.left_matched.append(matched)
+        self._compact(self.left_parts, self.left_matched, self.left_on)
+        return self._add(frames)
+
+    @staticmethod
+    def _compact(parts: List[BetweenIndex], flags: List[numpy.ndarray], on: List[Hashable]):
+        '''
+        | Merge the last two parts while the older one is not larger than the newer one.
+        '''
+        while len(parts) > 1 and len(parts[-2].right.index) <= len(parts[-1].right.index):
+            newer, older = parts.pop(), parts.pop()
+            parts.append(BetweenIndex(pandas.concat([older.right, newer.right]), on))
+            newer, older = flags.pop(), flags.pop()
+            flags.append(numpy.concatenate([older, newer]))
+
+    def _add(self, frames: List[pandas.DataFrame]) -> pandas.DataFrame:
+        frames = [frame for frame in frames if len(frame.index) > 0]
+        # unmatched rows change even if no rows are matched.
+        if len(frames) > 0 or self.how != 'inner':
+            self._result = None
+        if len(frames) == 0:
+            return self._materialize(self.left_parts[0].right.iloc[:0], self.right_parts[0].right.iloc[:0],
+                                     numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64))
+        added = pandas.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        self.matched.append(added)
+        return added
+
+    def unmatched(self) -> pandas.DataFrame:
+        '''
+        | Rows of left and right not matched yet, with nulls for the other side, as kept in the result by `how`.
+        '''
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        frames = []
+        first_left, first_right = self.left_parts[0].right, self.right_parts[0].right
+        if self.how in {'left', 'outer'}:
+            for part, flags in zip(self.left_parts, self.left_matched):
+                frames.append(self._materialize(part.right.iloc[numpy.flatnonzero(~flags)], first_right.iloc[:0],
+                                                empty, empty, 'left'))
+        if self.how in {'right', 'outer'}:
+            for part, flags in zip(self.right_parts, self.right_matched):
+                frames.append(self._materialize(first_left.iloc[:0], part.right.iloc[numpy.flatnonzero(~flags)],
+                                                empty, empty, 'right'))
+        frames = [frame for frame in frames if len(frame.index) > 0]
+        if len(frames) == 0:
+            return self._materialize(first_left.iloc[:0], first_right.iloc[:0], empty, empty)
+        return pandas.concat(frames, ignore_index=True)
+
+    @property
+    def result(self) -> pandas.DataFrame:
+        '''
+        | Merged dataframe of all rows appended so far. It is built again only after appends.
+        | Matched rows are kept as one frame, and only extended by rows matched after the last call.
+        '''
+        if self._result is None:
+            if len(self.matched) > 1:
+                self.matched = [pandas.concat(self.matched, ignore_index=True)]
+            if self.how == 'inner' and len(self.matched) > 0:
+                self._result = self.matched[0]
+                return self._result
+            unmatched = self.unmatched()
+            frames = [frame for frame in self.matched + [unmatched] if len(frame.index) > 0]
+            self._result = pandas.concat(frames, ignore_index=True) if len(frames) > 0 else unmatched
+        return self._result
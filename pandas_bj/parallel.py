@@ -0,0 +1,182 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy
+
+from pandas_bj.between import RangeArray
+from pandas_bj.sorted_search import Key, SortedKeys, grid_keys, layout, _points
+
+Spec = Tuple[str, Dict[str, Tuple[int, str, Tuple[int, ...]]]]
+
+
+def normalize_n_jobs(n_jobs: Optional[int]) -> int:
+    if n_jobs is None:
+        return 1
+    if n_jobs == -1:
+        return os.cpu_count() or 1
+    if not isinstance(n_jobs, int) or n_jobs < 1:
+        raise ValueError('n_jobs must be positive integer or -1.')
+    return n_jobs
+
+
+class SharedArrays():
+    '''
+    SharedArrays places numpy arrays in one shared memory block,
+    so that worker processes can read them without pickling.
+    '''
+
+    def __init__(self, arrays: Dict[str, numpy.ndarray]):
+        layout_ = {}
+        offset = 0
+        for name, a in arrays.items():
+            layout_[name] = (offset, a.dtype.str, a.shape)
+            offset += (a.nbytes + 7) // 8 * 8
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, a in arrays.items():
+            off, dtype, shape = layout_[name]
+            view = numpy.ndarray(shape, dtype, buffer=self.shm.buf, offset=off)
+            view[...] = a
+            del view
+        self.spec: Spec = (self.shm.name, layout_)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def attach(spec: Spec) -> Tuple[shared_memory.SharedMemory, Dict[str, numpy.ndarray]]:
+    '''
+    | Attach shared memory block given by `SharedArrays.spec`.
+    | Arrays have to be released before closing returned shared memory.
+    '''
+    name, layout_ = spec
+    # resource tracker is shared with parent process, which unlinks the block.
+    shm = shared_memory.SharedMemory(name=name)
+    arrays = {k: numpy.ndarray(shape, dtype, buffer=shm.buf, offset=off)
+              for k, (off, dtype, shape) in layout_.items()}
+    return shm, arrays
+
+
+def _flatten(prefix: str, key: Any) -> Dict[str, numpy.ndarray]:
+    if key is None:
+        return {}
+    if isinstance(key, RangeArray):
+        return {f'{prefix}.range_from': key.range_from, f'{prefix}.range_to': key.range_to,
+                f'{prefix}.from_opened': key.from_opened, f'{prefix}.to_opened': key.to_opened}
+    return {prefix: _points(key)}
+
+
+def _unflatten(prefix: str, arrays: Dict[str, numpy.ndarray]) -> Any:
+    if f'{prefix}.range_from' in arrays:
+        return RangeArray(arrays[f'{prefix}.range_from'], arrays[f'{prefix}.range_to'],
+                          arrays[f'{prefix}.from_opened'], arrays[f'{prefix}.to_opened'])
+    return arrays.get(prefix)
+
+
+def _search(arrays: Dict[str, numpy.ndarray], ranges: List[int], n_keys: int, jit: bool,
+            start: int, stop: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    rows = arrays['probe.rows'][start:stop].copy()
+    sorted_keys = SortedKeys.from_state({
+        'ranges': ranges, 'jit': jit, 'keys': {i: _unflatten(f'build.{i}', arrays) for i in ranges},
+        'perm': arrays['build.perm'], 'offsets': arrays['build.offsets'],
+        'sorted_values': arrays.get('build.sorted_values'), 'max_width': arrays.get('build.max_width')})
+    keys = [None] * n_keys
+    for i in ranges:
+        keys[i] = _unflatten(f'probe.{i}', arrays)[rows]
+    probe_pos, build_pos = sorted_keys.search(arrays['probe.codes'][rows], keys)
+    return rows[probe_pos], build_pos
+
+
+def _search_partition(spec: Spec, ranges: List[int], n_keys: int, jit: bool,
+                      start: int, stop: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    shm, arrays = attach(spec)
+    try:
+        return _search(arrays, ranges, n_keys, jit, start, stop)
+    finally:
+        arrays.clear()
+        shm.close()
+
+
+def partitions(costs: numpy.ndarray, n_partitions: int) -> numpy.ndarray:
+    '''
+    | Split rows into contiguous partitions with balanced total costs.
+    :param costs: cost per row.
+    :param n_partitions: number of partitions.
+    :return: boundaries of partitions, length is n_partitions + 1.
+    '''
+    cum = numpy.cumsum(costs)
+    total = cum[-1] if len(cum) > 0 else 0
+    bounds = numpy.searchsorted(cum, total * numpy.arange(1, n_partitions) / n_partitions, 'right')
+    return numpy.concatenate([[0], bounds, [len(costs)]]).astype(numpy.int64)
+
+
+def match(left_keys: List[Key], right_keys: List[Key], n_jobs: int, ranges: Optional[List[int]] = None,
+          build: Optional[str] = None, grid: Optional[int] = None, bins: int = 0,
+          jit: bool = False) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    | Parallel version of `sorted_search.match`.
+    | Build side is sorted once in this process. Probe rows are ordered by bucket code
+    | and split into partitions of balanced search cost, then searched by worker processes.
+    | Keys are passed to workers through shared memory. Results are same as `sorted_search.match`.
+    :param left_keys: keys built by `build_keys`.
+    :param right_keys: keys built by `build_keys`.
+    :param n_jobs: number of worker processes.
+    :param ranges: same as `sorted_search.match`.
+    :param build: same as `sorted_search.match`.
+    :param grid: same as `sorted_search.match`. Bins are added to keys in this process.
+    :param bins: same as `sorted_search.match`.
+    :param jit: same as `sorted_search.match`. Each worker filters candidates with the compiled kernel.
+    :return: positional indexes of left and right.
+    '''
+    eq, default_ranges = layout(left_keys, right_keys)
+    ranges = default_ranges if ranges is None else ranges
+    if build is None:
+        build = 'right' if len(ranges) == 0 or isinstance(left_keys[ranges[0]], RangeArray) else 'left'
+    probe_left = build == 'right'
+    build_keys, probe_keys = (right_keys, left_keys) if probe_left else (left_keys, right_keys)
+    owner = None
+    if grid is not None and bins > 1:
+        build_keys, probe_keys, owner = grid_keys(build_keys, probe_keys, grid, bins)
+        eq = eq + [len(build_keys) - 1]
+    sorted_keys = SortedKeys(build_keys, eq, ranges, jit)
+    codes = sorted_keys.lookup(probe_keys)
+
+    # rows of unknown buckets never match.
+    valid = numpy.flatnonzero(codes >= 0)
+    rows = valid[numpy.argsort(codes[valid], kind='stable')]
+    bucket_sizes = numpy.diff(sorted_keys.offsets)
+    costs = numpy.log2(bucket_sizes[codes[rows]] + 2.0)
+    bounds = partitions(costs, n_jobs)
+
+    arrays = {'probe.rows': rows, 'probe.codes': codes,
+              'build.perm': sorted_keys.perm, 'build.offsets': sorted_keys.offsets}
+    if sorted_keys.sorted_values is not None:
+        arrays['build.sorted_values'] = sorted_keys.sorted_values
+    if sorted_keys.max_width is not None:
+        arrays['build.max_width'] = sorted_keys.max_width
+    for i in ranges:
+        arrays.update(_flatten(f'build.{i}', sorted_keys.keys[i]))
+        arrays.update(_flatten(f'probe.{i}', probe_keys[i]))
+
+    shared = SharedArrays(arrays)
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [executor.submit(_search_partition, shared.spec, ranges, len(probe_keys), jit, start, stop)
+                       for start, stop in zip(bounds[:-1], bounds[1:]) if start < stop]
+            results = [f.result() for f in futures]
+    finally:
+        shared.close()
+
+    probe_pos = numpy.concatenate([r[0] for r in results] + [numpy.zeros(0, dtype=numpy.int64)])
+    build_pos = numpy.concatenate([r[1] for r in results] + [numpy.zeros(0, dtype=numpy.int64)])
+    # a probe row belongs to one partition, so stable sort gives same order as serial search.
+    order = numpy.argsort(probe_pos, kind='stable')
+    probe_pos, build_pos = probe_pos[order], build_pos[order]
+    if owner is not None:
+        probe_pos = owner[probe_pos]
+    if probe_left:
+        return probe_pos, build_pos
+    order = numpy.argsort(build_pos, kind='stable')
+    return build_pos[order], probe_pos[order]
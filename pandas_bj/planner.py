@@ -0,0 +1,350 @@
+import math
+import sys
+from typing import Dict, Hashable, List, NamedTuple, Optional, TextIO, Tuple, Union
+
+import numpy
+import pandas
+
+from pandas_bj import sorted_search
+from pandas_bj.between import CustomColumn, RangeArray
+
+# costs relative to one comparison of `numpy.sort`, measured roughly on 1M rows.
+# a step of binary search of `segment_search` per row.
+search_cost = 10.0
+# hashing a key per row.
+hash_cost = 5.0
+# expanding or filtering a candidate row pair.
+pair_cost = 10.0
+# a comparison in Python loop.
+python_cost = 250.0
+# statistics of range keys are taken from this many sampled rows per side.
+sample_size = 2000
+# most bins of `grid_search`.
+max_bins = 4096
+
+
+class KeyStats(NamedTuple):
+    '''
+    Statistics of a key pair gathered by `plan_merge`.
+    `selectivity` is estimated fraction of row pairs matched by this key alone.
+    For range keys, `window` is estimated fraction of ranges starting in the window of the widest range
+    before a point, `width` is median width of bounded ranges and `unbounded` is fraction of unbounded ranges.
+    '''
+    position: int
+    kind: str
+    range_side: Optional[str] = None
+    distinct: Optional[Tuple[int, int]] = None
+    selectivity: float = 1.0
+    window: float = 1.0
+    width: float = math.nan
+    unbounded: float = 0.0
+
+
+def _sample(values: Union[numpy.ndarray, RangeArray]) -> Union[numpy.ndarray, RangeArray]:
+    n = len(values)
+    if n <= sample_size:
+        return values
+    return values[numpy.sort(numpy.random.RandomState(0).choice(n, sample_size, replace=False))]
+
+
+def equality_stats(position: int, left: pandas.Series, right: pandas.Series) -> KeyStats:
+    '''
+    | Statistics of an equality key from distinct counts of both sides.
+    '''
+    distinct = (int(left.nunique()), int(right.nunique()))
+    n_left, n_right = len(left), len(right)
+    if n_left == 0 or n_right == 0 or max(distinct) == 0:
+        return KeyStats(position, 'equality', distinct=distinct, selectivity=0.0)
+    valid = (n_left - int(left.isnull().sum())) / n_left * (n_right - int(right.isnull().sum())) / n_right
+    return KeyStats(position, 'equality', distinct=distinct, selectivity=valid / max(distinct))
+
+
+def range_stats(position: int, ranges: RangeArray, points: numpy.ndarray, range_side: str) -> KeyStats:
+    '''
+    | Statistics of a range key from sampled ranges and points.
+    | Selectivity is mean number of sampled points inside each sampled range.
+    | Window is mean number of sampled range starts inside `[point - widest range, point]`.
+    '''
+    if len(ranges) == 0 or len(points) == 0:
+        return KeyStats(position, 'range', range_side, selectivity=0.0, window=0.0)
+    widths = ranges.range_to - ranges.range_from
+    max_width = widths.max()
+    finite = widths[numpy.isfinite(widths)]
+    unbounded = numpy.isneginf(ranges.range_from) & numpy.isposinf(ranges.range_to)
+
+    sampled = _sample(ranges)
+    sampled_points = _sample(points)
+    values = numpy.sort(sampled_points[~numpy.isnan(sampled_points)])
+    lo = numpy.where(sampled.from_opened, numpy.searchsorted(values, sampled.range_from, 'right'),
+                     numpy.searchsorted(values, sampled.range_from, 'left'))
+    hi = numpy.where(sampled.to_opened, numpy.searchsorted(values, sampled.range_to, 'left'),
+                     numpy.searchsorted(values, sampled.range_to, 'right'))
+    counts = numpy.maximum(hi - lo, 0)
+    counts[numpy.isneginf(sampled.range_from) & numpy.isposinf(sampled.range_to)] = len(sampled_points)
+    selectivity = counts.mean() / len(sampled_points)
+
+    starts = numpy.sort(sampled.range_from)
+    upper = numpy.where(numpy.isnan(sampled_points), -numpy.inf, sampled_points)
+    in_window = numpy.searchsorted(starts, upper, 'right') - numpy.searchsorted(starts, upper - max_width, 'left')
+    window = numpy.maximum(in_window, 0).mean() / len(starts)
+
+    return KeyStats(position, 'range', range_side, selectivity=float(selectivity), window=float(window),
+                    width=float(numpy.median(finite)) if len(finite) > 0 else math.inf,
+                    unbounded=float(unbounded.mean()))
+
+
+def _log(n: float) -> float:
+    return math.log2(max(n, 1.0) + 1.0)
+
+
+class Plan():
+    '''
+    Plan of a merge chosen by `plan_merge`.
+
+    - `engine`: numpy or python.
+    - `strategy`: `hash` to match by hash partition of equality keys only,
+      `sorted_search` to sort points of `build` side and search them with ranges of the other side,
+      `range_window` to sort ranges of `build` side by lower bounds and search points in the window of the widest range,
+      `grid_search` to search like `sorted_search` within bins of points of `grid` key overlapped by each range,
+      `nested_loop` to compare rows in Python loop with `sort`.
+    - `build`: side sorted once, left or right. None for python engine.
+    - `eq`: positions of equality keys.
+    - `ranges`: positions of range keys. The first one is searched, and others filter found pairs in this order.
+    - `grid`: position of range key split into bins by `grid_search`, None for other strategies.
+    - `bins`: number of bins of `grid`.
+    - `sort`: `sort` for python engine.
+    - `rows`: estimated number of matched row pairs.
+    - `costs`: estimated costs of candidate plans, by description. Unit is one comparison of `numpy.sort`.
+    - `keys`: `KeyStats` per key.
+    '''
+
+    def __init__(self, engine: str, strategy: str, build: Optional[str], eq: List[int], ranges: List[int],
+                 sort: List[int], rows: float, costs: Dict[str, float], keys: List[KeyStats],
+                 grid: Optional[int] = None, bins: int = 0):
+        self.engine = engine
+        self.strategy = strategy
+        self.build = build
+        self.eq = eq
+        self.ranges = ranges
+        self.sort = sort
+        self.rows = rows
+        self.costs = costs
+        self.keys = keys
+        self.grid = grid
+        self.bins = bins
+
+    @property
+    def name(self) -> str:
+        return describe(self.strategy, self.build, self.ranges, self.grid, self.bins)
+
+    @property
+    def cost(self) -> float:
+        return self.costs[self.name]
+
+    def __str__(self):
+        lines = [f'engine: {self.engine}', f'strategy: {self.name}']
+        if self.engine == 'python':
+            lines.append(f'sort: {self.sort}')
+        else:
+            lines.append(f'key order: equality {self.eq}, search {self.ranges[:1]}, filters {self.ranges[1:]}')
+            if self.grid is not None:
+                lines.append(f'grid: key {self.grid}, {self.bins} bins')
+        lines.append(f'estimated rows: {self.rows:.0f}')
+        lines.append('keys:')
+        for key in self.keys:
+            if key.kind == 'equality':
+                lines.append(f'  {key.position}: equality, distinct {key.distinct}, '
+                             f'selectivity {key.selectivity:.3g}')
+            else:
+                lines.append(f'  {key.position}: range on {key.range_side}, selectivity {key.selectivity:.3g}, '
+                             f'window {key.window:.3g}, median width {key.width:.3g}, unbounded {key.unbounded:.3g}')
+        lines.append('costs:')
+        for name, cost in sorted(self.costs.items(), key=lambda item: item[1]):
+            mark = ' *' if name == self.name else ''
+            lines.append(f'  {name}: {cost:.3g}{mark}')
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f'Plan({self.name}, cost={self.cost:.3g})'
+
+
+def describe(strategy: str, build: Optional[str], ranges: List[int], grid: Optional[int] = None,
+             bins: int = 0) -> str:
+    if strategy in {'hash', 'nested_loop'}:
+        return strategy
+    if strategy == 'grid_search':
+        return f'{strategy}(build={build}, search={ranges[0]}, grid={grid}, bins={bins})'
+    return f'{strategy}(build={build}, search={ranges[0]})'
+
+
+def _pairs(n_left: int, n_right: int, eq: List[int], keys: Dict[int, KeyStats]) -> float:
+    '''
+    | Estimated number of row pairs matched by equality keys.
+    | Keys are assumed independent, but pairs are not less than matched by a key having as many values as rows.
+    '''
+    pairs = float(n_left) * n_right
+    if len(eq) == 0:
+        return pairs
+    for i in eq:
+        pairs *= keys[i].selectivity
+    least = min(keys[i].selectivity for i in eq) / max(n_left, n_right, 1)
+    return max(pairs, float(n_left) * n_right * least)
+
+
+def _numpy_plans(n_left: int, n_right: int, eq: List[int], ranges: List[int],
+                 keys: Dict[int, KeyStats]) -> List[Tuple[float, str, str, List[int], Optional[int], int]]:
+    pairs = _pairs(n_left, n_right, eq, keys)
+    partition = hash_cost * (n_left + n_right) * len(eq)
+    if len(ranges) == 0:
+        return [(partition + pair_cost * pairs, 'hash', 'right', [], None, 0)]
+
+    plans = []
+    for search in ranges:
+        # remaining keys filter pairs in order of selectivity.
+        filters = sorted((i for i in ranges if i != search), key=lambda i: keys[i].selectivity)
+        stats = keys[search]
+        n_range, n_point = (n_left, n_right) if stats.range_side == 'left' else (n_right, n_left)
+        point_side = 'right' if stats.range_side == 'left' else 'left'
+        for strategy in ['sorted_search', 'range_window']:
+            if strategy == 'sorted_search':
+                build, n_build, n_probe = point_side, n_point, n_range
+                candidates = pairs * stats.selectivity
+                checks = filters
+            else:
+                # points are searched in the window, and checked with the searched key too.
+                build, n_build, n_probe = stats.range_side, n_range, n_point
+                window = max(stats.window, stats.selectivity)
+                candidates = pairs * window
+                checks = [search] + filters
+            cost = (partition + n_build * _log(n_build) + 2 * search_cost * n_probe * _log(n_build)
+                    + pair_cost * candidates)
+            for i in checks:
+                cost += pair_cost * candidates
+                candidates *= keys[i].selectivity if i != search else stats.selectivity / max(window, 1e-12)
+            plans.append((cost, strategy, build, [search] + filters, None, 0))
+        for grid in filters:
+            if keys[grid].range_side == stats.range_side:
+                plans.append(_grid_plan(pairs, partition, n_point, n_range, point_side, search, filters, grid, keys))
+    return plans
+
+
+def _grid_plan(pairs: float, partition: float, n_build: int, n_probe: int, build: str, search: int,
+               filters: List[int], grid: int, keys: Dict[int, KeyStats]) -> Tuple[float, str, str, List[int], int, int]:
+    '''
+    | Cost of `grid_search`. Each range of probe side overlaps about `1 + selectivity * bins` bins of `grid`,
+    | and candidates are points of overlapped bins, so bins are chosen to balance searches and candidates.
+    '''
+    selectivity = keys[search].selectivity
+    grid_selectivity = keys[grid].selectivity
+    searched = n_probe * max(grid_selectivity, 1e-12) * (2 * search_cost * _log(n_build) + hash_cost)
+    # nothing is searched if probe side is empty.
+    bins = int(min(max(math.sqrt(pair_cost * pairs * selectivity / searched), 2), max_bins)) if searched > 0 else 2
+    n_probe = n_probe * (1 + grid_selectivity * bins)
+    fraction = min(grid_selectivity + 1 / bins, 1.0)
+    candidates = pairs * selectivity * fraction
+    cost = (partition + hash_cost * (n_build + n_probe) + n_build * _log(n_build)
+            + 2 * search_cost * n_probe * _log(n_build) + pair_cost * candidates)
+    for i in filters:
+        cost += pair_cost * candidates
+        candidates *= keys[i].selectivity if i != grid else grid_selectivity / fraction
+    return cost, 'grid_search', build, [search] + filters, grid, bins
+
+
+def plan_keys(left_keys: List[sorted_search.Key], right_keys: List[sorted_search.Key]) -> Plan:
+    '''
+    | Plan of numpy engine from keys built by `sorted_search.build_keys`.
+    '''
+    n_left, n_right = len(left_keys[0]), len(right_keys[0])
+    eq, ranges = sorted_search.layout(left_keys, right_keys)
+    keys = {}
+    for i in eq:
+        keys[i] = equality_stats(i, left_keys[i], right_keys[i])
+    for i in ranges:
+        if isinstance(left_keys[i], RangeArray):
+            keys[i] = range_stats(i, left_keys[i], sorted_search._points(right_keys[i]), 'left')
+        else:
+            keys[i] = range_stats(i, right_keys[i], sorted_search._points(left_keys[i]), 'right')
+    plans = _numpy_plans(n_left, n_right, eq, ranges, keys)
+    costs = {describe(strategy, build, order, grid, bins): cost for cost, strategy, build, order, grid, bins in plans}
+    cost, strategy, build, order, grid, bins = min(plans, key=lambda p: p[0])
+    rows = _pairs(n_left, n_right, eq, keys)
+    for i in ranges:
+        rows *= keys[i].selectivity
+    return Plan('numpy', strategy, build, eq, order, [], rows, costs, [keys[i] for i in sorted(keys)], grid, bins)
+
+
+def plan_merge(left: pandas.DataFrame, right: pandas.DataFrame,
+               left_on: Union[Hashable, List[Hashable]], right_on: Union[Hashable, List[Hashable]],
+               engine: Optional[str] = None) -> Plan:
+    '''
+    Choose strategy and key order of a merge by estimated costs.
+
+    Statistics are cheap to gather: row counts, distinct counts of equality keys,
+    and widths and selectivity of range keys estimated from sampled rows.
+    Equality keys partition rows by hash. With numpy engine, each range key is tried as searched key
+    with each side sorted, and other range keys filter found pairs from the most selective one.
+    When another range key has ranges on the same side, points of it may be split into bins for `grid_search`.
+    With python engine, equality keys are sorted so that rows of right are skipped by `sort`.
+
+    :param left: left dataframe.
+    :param right: right dataframe.
+    :param left_on: same as `pandas_bj.merge`.
+    :param right_on: same as `pandas_bj.merge`.
+    :param engine: numpy or python. None to use numpy when keys are supported.
+    :return: Plan.
+    '''
+    if not isinstance(left_on, list):
+        left_on = [left_on]
+    if not isinstance(right_on, list):
+        right_on = [right_on]
+    if len(left_on) != len(right_on):
+        raise ValueError('Length of left and right merge keys must be same.')
+    n_left, n_right = len(left.index), len(right.index)
+
+    supported = sorted_search.supports(left, right, left_on, right_on)
+    if engine is None:
+        engine = 'numpy' if supported else 'python'
+    if engine == 'numpy' and not supported:
+        engine = 'python'
+
+    if engine == 'numpy':
+        return plan_keys(sorted_search.build_keys(left, left_on), sorted_search.build_keys(right, right_on))
+
+    keys = {}
+    eq = [i for i, (lk, rk) in enumerate(zip(left_on, right_on))
+          if not isinstance(lk, CustomColumn) and not isinstance(rk, CustomColumn)]
+    ranges = [i for i in range(len(left_on)) if i not in eq]
+    for i in eq:
+        keys[i] = equality_stats(i, left[left_on[i]], right[right_on[i]])
+    # more distinct keys come first, so that the first differing key skips rows.
+    sort = sorted(eq, key=lambda i: -max(keys[i].distinct))
+    pairs = _pairs(n_left, n_right, eq, keys)
+    compare = python_cost * max(len(left_on), 1)
+    costs = {'nested_loop': compare * n_left * n_right}
+    if len(sort) > 0:
+        costs['nested_loop'] = (n_left * _log(n_left) + n_right * _log(n_right)
+                                + compare * (pairs + n_left + n_right))
+    return Plan(engine, 'nested_loop', None, eq, ranges, sort, pairs, costs, [keys[i] for i in sorted(keys)])
+
+
+def explain(left: pandas.DataFrame, right: pandas.DataFrame,
+            left_on: Union[Hashable, List[Hashable]], right_on: Union[Hashable, List[Hashable]],
+            engine: Optional[str] = None, file: Optional[TextIO] = None) -> Plan:
+    '''
+    Print the plan of a merge chosen by `plan_merge` and estimated costs.
+
+    ```
+    pandas_bj.explain(df1, df2, ['id1', pandas_bj.Between('s', 'e')], ['id3', 'v'])
+    ```
+
+    :param left: left dataframe.
+    :param right: right dataframe.
+    :param left_on: same as `pandas_bj.merge`.
+    :param right_on: same as `pandas_bj.merge`.
+    :param engine: same as `plan_merge`.
+    :param file: stream to print to. Default is `sys.stdout`.
+    :return: Plan.
+    '''
+    plan = plan_merge(left, right, left_on, right_on, engine)
+    print(plan, file=file if file is not None else sys.stdout)
+    return plan
@@ -0,0 +1,190 @@
+from typing import Dict, Hashable, List, Tuple, Union
+
+import numpy
+import pandas
+from pandas.api.types import is_bool_dtype, is_integer_dtype, is_numeric_dtype
+
+from pandas_bj import sorted_search
+from pandas_bj.between import RangeArray
+from pandas_bj.between_merge import validate, validate_engine, key_frames
+from pandas_bj.custom_merge import reindex
+
+agg_types = ['sum', 'count', 'mean', 'min', 'max']
+
+
+class SparseTable():
+    '''
+    SparseTable answers minimum or maximum of any range of values in constant time.
+
+    Level `j` holds results of ranges of length `2 ** j`,
+    and a range is covered by two overlapping ranges of the same level.
+    '''
+
+    def __init__(self, values: numpy.ndarray, func: numpy.ufunc):
+        self.func = func
+        self.levels = [values]
+        width = 1
+        while width * 2 <= len(values):
+            prev = self.levels[-1]
+            self.levels.append(func(prev[:-width], prev[width:]))
+            width *= 2
+
+    def query(self, lo: numpy.ndarray, hi: numpy.ndarray) -> numpy.ndarray:
+        '''
+        | Find results of ranges [lo, hi). Ranges must not be empty.
+        '''
+        result = numpy.empty(len(lo), dtype=self.levels[0].dtype)
+        # floor(log2(length)), exact for integers.
+        level = numpy.frexp((hi - lo).astype(numpy.float64))[1] - 1
+        for j in numpy.unique(level):
+            rows = numpy.flatnonzero(level == j)
+            values = self.levels[j]
+            result[rows] = self.func(values[lo[rows]], values[hi[rows] - (1 << j)])
+        return result
+
+
+def _values(series: pandas.Series) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    if (is_integer_dtype(series) or is_bool_dtype(series)) and not series.hasnans:
+        values = series.to_numpy(dtype=numpy.int64)
+        return values, numpy.ones(len(values), dtype=bool)
+    values = series.to_numpy(dtype=numpy.float64, na_value=numpy.nan)
+    return values, ~numpy.isnan(values)
+
+
+def _prefix(values: numpy.ndarray) -> numpy.ndarray:
+    return numpy.concatenate([numpy.zeros(1, dtype=values.dtype), numpy.cumsum(values)])
+
+
+def _compensated_prefix(values: numpy.ndarray, levels: int = 3) -> List[numpy.ndarray]:
+    '''
+    | Prefix sums of floats, followed by prefix sums of their rounding errors, and of errors of them,
+    | so that sum of a range is the sum of `prefix[hi] - prefix[lo]` of all levels,
+    | without losing small values next to large ones.
+    | Errors are found exactly by two-sum of each step, since `cumsum` adds values one by one.
+    '''
+    prefixes = []
+    for _ in range(levels):
+        total = _prefix(values)
+        prefixes.append(total)
+        step = total[1:] - total[:-1]
+        values = (total[:-1] - (total[1:] - step)) + (values - step)
+        if not numpy.any(values):
+            break
+    return prefixes
+
+
+def aggregate(values: numpy.ndarray, valid: numpy.ndarray, lo: numpy.ndarray, hi: numpy.ndarray,
+              funcs: List[str]) -> Dict[str, numpy.ndarray]:
+    '''
+    | Aggregate values of ranges [lo, hi). Null values given by `valid` are skipped.
+    | Sum, count and mean are given by prefix sums, exact for integers and compensated for floats,
+    | min and max by sparse table.
+    :return: aggregated values per range.
+    '''
+    count = _prefix(valid.astype(numpy.int64))
+    count = count[hi] - count[lo]
+    non_empty = numpy.flatnonzero(count > 0)
+    result = {}
+    for func in funcs:
+        if func == 'count':
+            result[func] = count
+        elif func in {'sum', 'mean'}:
+            if values.dtype == numpy.int64:
+                total = _prefix(numpy.where(valid, values, 0))
+                total = total[hi] - total[lo]
+            else:
+                total = numpy.zeros(len(lo))
+                # smaller levels first.
+                for prefix in reversed(_compensated_prefix(numpy.where(valid, values, 0))):
+                    total += prefix[hi] - prefix[lo]
+            if func == 'sum':
+                result[func] = total
+            else:
+                result[func] = numpy.full(len(lo), numpy.nan)
+                result[func][non_empty] = total[non_empty] / count[non_empty]
+        else:
+            if values.dtype == numpy.int64:
+                info = numpy.iinfo(numpy.int64)
+                fill = info.max if func == 'min' else info.min
+            else:
+                fill = numpy.inf if func == 'min' else -numpy.inf
+            table = SparseTable(numpy.where(valid, values, fill), numpy.minimum if func == 'min' else numpy.maximum)
+            result[func] = numpy.full(len(lo), numpy.nan)
+            result[func][non_empty] = table.query(lo[non_empty], hi[non_empty])
+    return result
+
+
+def matched_ranges(left: pandas.DataFrame, right: pandas.DataFrame,
+                   left_on: List[Hashable], right_on: List[Hashable],
+                   engine: str = 'numpy') -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    '''
+    | Find matched rows of right for each row of left as a range of positions.
+    | With sorted search, ranges come from bounds of the search and no row pairs are listed.
+    | Otherwise, row pairs are listed and sorted by left.
+    :return: `lo`, `hi` and `rows`. Matched rows of i-th row of left are `rows[lo[i]:hi[i]]`.
+    '''
+    n_left = len(left.index)
+    if engine == 'numpy' and sorted_search.supports(left, right, left_on, right_on):
+        left_keys = sorted_search.build_keys(left, left_on)
+        right_keys = sorted_search.build_keys(right, right_on)
+        eq, ranges = sorted_search.layout(left_keys, right_keys)
+        if len(ranges) == 0 or isinstance(left_keys[ranges[0]], RangeArray):
+            sorted_keys = sorted_search.SortedKeys(right_keys, eq, ranges)
+            codes = sorted_keys.lookup(left_keys)
+            lo, hi, filters = sorted_keys.bounds(codes, left_keys)
+            if len(filters) == 0:
+                return lo, numpy.maximum(hi, lo), sorted_keys.perm
+        left_pos, right_pos = sorted_search.match(left_keys, right_keys)
+    else:
+        left_pos, right_pos = reindex(*key_frames(left, right, left_on, right_on), [])
+        order = numpy.argsort(left_pos, kind='stable')
+        left_pos, right_pos = left_pos[order], right_pos[order]
+    lo = numpy.searchsorted(left_pos, numpy.arange(n_left), 'left')
+    hi = numpy.searchsorted(left_pos, numpy.arange(n_left), 'right')
+    return lo, hi, right_pos
+
+
+def range_aggregate(left: pandas.DataFrame, right: pandas.DataFrame,
+                    left_on: Union[Hashable, List[Hashable]], right_on: Union[Hashable, List[Hashable]],
+                    agg: Dict[Hashable, Union[str, List[str]]], engine: str = 'numpy') -> pandas.DataFrame:
+    '''
+    Aggregate columns of matched right rows for each row of left, without building the merged dataframe.
+
+    Same as `merge` followed by `groupby` of left rows, but memory usage is bounded by size of left and right.
+    Null values are skipped like `pandas`. Left rows without matched values have 0 for sum and count,
+    and null for mean, min and max.
+
+    ```
+    result = range_aggregate(df1, df2, ['id1', 'id2', Between('s', 'e')], ['id3', 'id4', 'v'],
+                             agg={'v': ['sum', 'count', 'mean']})
+    ```
+
+    :param left: left dataframe.
+    :param right: right dataframe.
+    :param left_on: same as `pandas_bj.merge`.
+    :param right_on: same as `pandas_bj.merge`.
+    :param agg: numeric columns of right to aggregate, and sum, count, mean, min or max to apply to each of them.
+    :param engine: same as `pandas_bj.merge`.
+    :return: dataframe with same index as left and columns named like `v_sum`.
+    '''
+    left_on, right_on = validate(left, right, left_on, right_on, 'inner')
+    engine, _ = validate_engine(engine)
+
+    agg = {column: [funcs] if isinstance(funcs, str) else list(funcs) for column, funcs in agg.items()}
+    for column, funcs in agg.items():
+        if column not in right.columns:
+            raise KeyError(column)
+        if not is_numeric_dtype(right[column]):
+            raise ValueError('Aggregated columns must be numeric.')
+        for func in funcs:
+            if func not in agg_types:
+                raise ValueError('agg must be sum, count, mean, min or max.')
+
+    lo, hi, rows = matched_ranges(left, right, left_on, right_on, engine)
+    result = {}
+    for column, funcs in agg.items():
+        values, valid = _values(right[column])
+        aggregated = aggregate(values[rows], valid[rows], lo, hi, funcs)
+        for func in funcs:
+            result[f'{column}_{func}'] = aggregated[func]
+    return pandas.DataFrame(result, index=left.index)
@@ -0,0 +1,775 @@
+from typing import Any, Dict, Hashable, List, Optional, Tuple, Union
+
+import numpy
+import pandas
+from pandas.api.types import is_integer_dtype, is_numeric_dtype
+
+from pandas_bj import cache, kernels, stats
+from pandas_bj.between import Between, CustomColumn, RangeArray, key_values
+
+
+Key = Union[pandas.Series, RangeArray]
+
+_micros = {'s': 1e6, 'ms': 1e3, 'us': 1.0, 'ns': 1e-3}
+
+
+def _kind(df: pandas.DataFrame, column: Hashable) -> Optional[str]:
+    '''
+    | Kind of values compared by sorted search: numeric, datetime, datetimetz or timedelta.
+    | None if sorted search can not compare values exactly, like datetimes having nanoseconds
+    | or integers not exactly representable as float64.
+    '''
+    col = df[column]
+    if is_integer_dtype(col.dtype):
+        valid = col.dropna()
+        if len(valid) > 0 and max(abs(int(valid.min())), abs(int(valid.max()))) >= 2 ** 53:
+            return None
+        return 'numeric'
+    if col.dtype.kind not in 'mM':
+        return 'numeric' if is_numeric_dtype(col.dtype) else None
+    array = col.array
+    ints = numpy.asarray(array.asi8)
+    ints = ints[ints != numpy.iinfo(numpy.int64).min]
+    unit = getattr(array, 'unit', 'ns')
+    if unit == 'ns' and numpy.any(ints % 1000 != 0):
+        return None
+    if numpy.any(numpy.abs(ints * _micros[unit]) >= 2 ** 53):
+        return None
+    if col.dtype.kind == 'm':
+        return 'timedelta'
+    return 'datetime' if getattr(col.dtype, 'tz', None) is None else 'datetimetz'
+
+
+def _same_kind(columns: List[Tuple[pandas.DataFrame, Hashable]]) -> bool:
+    kinds = {_kind(df, c) for df, c in columns if c is not None}
+    return None not in kinds and len(kinds) <= 1
+
+
+def supports(left: pandas.DataFrame, right: pandas.DataFrame,
+             left_on: List[Any], right_on: List[Any], overlap: bool = False) -> bool:
+    '''
+    Check the key pairs can be matched by sorted search.
+    Range keys have to be numeric, datetime64 or timedelta64 of the same kind on both sides,
+    and range-to-range comparison is left to the python engine unless ranges are matched by overlap.
+    '''
+    for l_on_col, r_on_col in zip(left_on, right_on):
+        l_custom = isinstance(l_on_col, CustomColumn)
+        r_custom = isinstance(r_on_col, CustomColumn)
+        if not l_custom and not r_custom:
+            continue
+        if l_custom and r_custom:
+            if not overlap or not isinstance(l_on_col, Between) or not isinstance(r_on_col, Between):
+                return False
+            if not _same_kind([(df, c) for df, between in ((left, l_on_col), (right, r_on_col))
+                               for c in (between.f, between.t)]):
+                return False
+            continue
+        between, b_df, point, p_df = (l_on_col, left, r_on_col, right) if l_custom else \
+            (r_on_col, right, l_on_col, left)
+        if not isinstance(between, Between):
+            return False
+        if not _same_kind([(p_df, point), (b_df, between.f), (b_df, between.t)]):
+            return False
+    return True
+
+
+@stats.timed('build_keys')
+def build_keys(df: pandas.DataFrame, on: List[Any]) -> List[Key]:
+    '''
+    Build key arrays for sorted search.
+    `Between` becomes `RangeArray`, and other keys are kept as they are.
+    '''
+    return [k.to_range_array(df) if isinstance(k, Between) else df[k] for k in on]
+
+
+def _points(key: Union[numpy.ndarray, pandas.Series]) -> numpy.ndarray:
+    return key_values(key)
+
+
+def _categorical(col: pandas.Series) -> bool:
+    return isinstance(col.dtype, pandas.CategoricalDtype)
+
+
+def _factorize(col: pandas.Series) -> Tuple[numpy.ndarray, pandas.Index]:
+    '''
+    | Factorize a key column into int64 codes. Codes of categorical columns are reused as they are.
+    '''
+    if _categorical(col):
+        return col.cat.codes.to_numpy(dtype=numpy.int64), pandas.Index(col.cat.categories)
+    codes, uniques = pandas.factorize(col)
+    return codes.astype(numpy.int64, copy=False), pandas.Index(uniques)
+
+
+def factorize_pair(left: pandas.Series, right: pandas.Series) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    | Encode an equality key of both sides jointly into int64 codes, so that keys are compared as integers.
+    | Null gets -1 on left and -2 on right, so that null never matches.
+    :param left: key of left.
+    :param right: key of right.
+    :return: codes of left and right.
+    '''
+    if _categorical(left) and _categorical(right) and left.cat.categories.equals(right.cat.categories):
+        left_codes = left.cat.codes.to_numpy(dtype=numpy.int64)
+        right_codes = right.cat.codes.to_numpy(dtype=numpy.int64)
+    else:
+        codes, _ = pandas.factorize(pandas.concat([left, right], ignore_index=True))
+        codes = codes.astype(numpy.int64, copy=False)
+        left_codes, right_codes = codes[:len(left)], codes[len(left):]
+    right_codes = numpy.where(right_codes < 0, -2, right_codes)
+    return left_codes, right_codes
+
+
+# combined codes are kept below this, so that they never overflow int64.
+_max_combined = 2 ** 62
+
+
+def _combine(codes: numpy.ndarray, c: numpy.ndarray, n: int) -> numpy.ndarray:
+    return numpy.where((codes >= 0) & (c >= 0), codes * n + c, -1)
+
+
+def _densify(codes: numpy.ndarray, index: Optional[pandas.Index] = None) -> Tuple[numpy.ndarray, pandas.Index]:
+    '''
+    | Map combined codes to dense codes. Codes are factorized if index is not given, or looked up into index.
+    '''
+    valid = codes >= 0
+    if index is None:
+        dense, uniques = pandas.factorize(codes[valid])
+        index = pandas.Index(uniques)
+    else:
+        dense = index.get_indexer(codes[valid])
+    result = numpy.full(len(codes), -1, dtype=numpy.int64)
+    result[valid] = dense
+    return result, index
+
+
+class Buckets():
+    '''
+    Hash-partition of rows by equality keys.
+    Each equality key of build side is factorized, or codes of categorical keys are reused,
+    and codes of all keys are combined into one int64 code by mixed radix while cardinalities allow.
+    The combined code is factorized once into a dense bucket code,
+    and rows of the other side are looked up into the hash table of build side.
+    Rows having null in any equality key or unknown keys get -1, they never match.
+    '''
+
+    def __init__(self, cols: List[pandas.Series]):
+        self.uniques = []
+        # combined codes are made dense before the key when product of cardinalities gets too large.
+        self.steps = []
+        self.combined = None
+        codes = None
+        size = 1
+        for col in cols:
+            c, uniques = _factorize(col)
+            self.uniques.append(uniques)
+            n = max(len(uniques), 1)
+            if codes is None:
+                codes, size = c, n
+                self.steps.append(None)
+                continue
+            step = None
+            if size > _max_combined // n:
+                codes, step = _densify(codes)
+                size = max(len(step), 1)
+            self.steps.append(step)
+            codes = _combine(codes, c, n)
+            size *= n
+        if len(cols) > 1:
+            codes, self.combined = _densify(codes)
+        self.codes = codes
+        self.n_buckets = len(self.combined) if self.combined is not None else len(self.uniques[0])
+
+    def _lookup_key(self, i: int, col: pandas.Series) -> numpy.ndarray:
+        uniques = self.uniques[i]
+        if _categorical(col) and col.cat.categories.equals(uniques):
+            return col.cat.codes.to_numpy(dtype=numpy.int64)
+        return uniques.get_indexer(col).astype(numpy.int64)
+
+    def lookup(self, cols: List[pandas.Series]) -> numpy.ndarray:
+        '''
+        | Find bucket codes of rows.
+        :param cols: equality keys, same order as build side.
+        :return: bucket codes.
+        '''
+        codes = None
+        for i, (col, step) in enumerate(zip(cols, self.steps)):
+            c = self._lookup_key(i, col)
+            if codes is None:
+                codes = c
+                continue
+            if step is not None:
+                codes, _ = _densify(codes, step)
+            codes = _combine(codes, c, max(len(self.uniques[i]), 1))
+        if self.combined is not None:
+            codes, _ = _densify(codes, self.combined)
+        return codes
+
+
+def partition(build_cols: List[pandas.Series], probe_cols: List[pandas.Series]) -> Tuple[numpy.ndarray,
+                                                                                         numpy.ndarray, int]:
+    '''
+    | Hash-partition rows of both sides by equality keys.
+    :param build_cols: equality keys of build side.
+    :param probe_cols: equality keys of probe side.
+    :return: bucket codes of build side, bucket codes of probe side and number of buckets.
+    '''
+    buckets = Buckets(build_cols)
+    return buckets.codes, buckets.lookup(probe_cols), buckets.n_buckets
+
+
+def segment_search(values: numpy.ndarray, lo: numpy.ndarray, hi: numpy.ndarray,
+                   targets: numpy.ndarray, side: Union[str, numpy.ndarray]) -> numpy.ndarray:
+    '''
+    | Vectorized `numpy.searchsorted` for each target restricted to sorted segment values[lo:hi].
+    :param values: array sorted inside every segment.
+    :param lo: segment starts.
+    :param hi: segment ends.
+    :param targets: value to search per segment.
+    :param side: 'left' or 'right', same as `numpy.searchsorted`. Boolean array means 'right' per target.
+    :return: insertion positions.
+    '''
+    lo = lo.copy()
+    hi = hi.copy()
+    active = numpy.flatnonzero(lo < hi)
+    comparisons = 0
+    while len(active) > 0:
+        comparisons += len(active)
+        a_lo = lo[active]
+        a_hi = hi[active]
+        mid = (a_lo + a_hi) >> 1
+        if isinstance(side, str):
+            if side == 'left':
+                go_right = values[mid] < targets[active]
+            else:
+                go_right = values[mid] <= targets[active]
+        else:
+            go_right = numpy.where(side[active], values[mid] <= targets[active], values[mid] < targets[active])
+        lo[active] = numpy.where(go_right, mid + 1, a_lo)
+        hi[active] = numpy.where(go_right, a_hi, mid)
+        active = active[lo[active] < hi[active]]
+    stats.count('comparisons', comparisons)
+    return lo
+
+
+def _expand(lo: numpy.ndarray, hi: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    | Expand [lo, hi) ranges into (owner, position) pairs.
+    '''
+    counts = numpy.maximum(hi - lo, 0)
+    total = int(counts.sum())
+    owner = numpy.repeat(numpy.arange(len(lo)), counts)
+    starts = numpy.cumsum(counts) - counts
+    position = numpy.arange(total) - numpy.repeat(starts - lo, counts)
+    return owner, position
+
+
+def _window(values: numpy.ndarray, lo: numpy.ndarray, hi: numpy.ndarray,
+            targets: numpy.ndarray, k: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    | Narrow sorted segments [lo, hi) of values to at most `k` values nearest to targets.
+    | Null values are farthest from any target.
+    '''
+    if len(values) == 0:
+        return lo, hi
+    last = len(values) - 1
+    start = segment_search(values, lo, hi, targets, 'left')
+    stop = start.copy()
+    for _ in range(k):
+        can_left = start > lo
+        can_right = stop < hi
+        if not (can_left | can_right).any():
+            break
+        with numpy.errstate(invalid='ignore'):
+            left_distance = targets - values[numpy.clip(start - 1, 0, last)]
+            right_distance = values[numpy.minimum(stop, last)] - targets
+        left_distance = numpy.where(can_left & ~numpy.isnan(left_distance), left_distance, numpy.inf)
+        right_distance = numpy.where(can_right & ~numpy.isnan(right_distance), right_distance, numpy.inf)
+        take_left = can_left & ((left_distance <= right_distance) | ~can_right)
+        start = start - take_left
+        stop = stop + (can_right & ~take_left)
+    return start, stop
+
+
+def reference(key: RangeArray) -> numpy.ndarray:
+    '''
+    | Middle of ranges, used by `nearest` match.
+    | Half-bounded ranges use the bounded end, and unbounded ranges use -inf.
+    '''
+    from_unbounded = numpy.isneginf(key.range_from)
+    to_unbounded = numpy.isposinf(key.range_to)
+    with numpy.errstate(invalid='ignore'):
+        middle = (key.range_from + key.range_to) / 2
+    return numpy.where(from_unbounded, numpy.where(to_unbounded, -numpy.inf, key.range_to),
+                       numpy.where(to_unbounded, key.range_from, middle))
+
+
+def layout(left_keys: List[Key], right_keys: List[Key]) -> Tuple[List[int], List[int]]:
+    '''
+    | Split key positions into equality keys and range keys.
+    :return: positions of equality keys and positions of range keys.
+    '''
+    eq = []
+    ranges = []
+    for i, (lk, rk) in enumerate(zip(left_keys, right_keys)):
+        if isinstance(lk, RangeArray) or isinstance(rk, RangeArray):
+            ranges.append(i)
+        else:
+            eq.append(i)
+    return eq, ranges
+
+
+class SortedKeys():
+    '''
+    SortedKeys is build side of sorted search.
+    Rows are hash-partitioned into buckets by equality keys, and sorted by the first range key inside each bucket.
+    It holds bucket offsets, permutation of rows and sorted values,
+    so that it can be probed by many other key sets.
+
+    If the first range key of build side is points, each probe range is searched with binary search.
+    If it is `RangeArray`, ranges are sorted by lower bounds,
+    and probe points are searched in the window of the widest range in the bucket, then filtered.
+    Other range keys are applied as filter for found pairs.
+    '''
+
+    @stats.timed('build')
+    def __init__(self, keys: List[Key], eq: List[int], ranges: List[int], jit: bool = False):
+        '''
+        :param keys: keys of build side built by `build_keys`.
+        :param eq: positions of equality keys.
+        :param ranges: positions of range keys. The first one is used for sorted search.
+        :param jit: filter candidates with the kernel compiled by numba. See `pandas_bj.kernels`.
+        '''
+        n = len(keys[0])
+        self.eq = eq
+        self.ranges = ranges
+        self.jit = jit
+        self.keys = {i: keys[i] if isinstance(keys[i], RangeArray) else _points(keys[i]) for i in ranges}
+
+        if len(eq) > 0:
+            self.buckets = Buckets([keys[i] for i in eq])
+            codes = self.buckets.codes
+            n_buckets = self.buckets.n_buckets
+        else:
+            self.buckets = None
+            codes = numpy.zeros(n, dtype=numpy.int64)
+            n_buckets = 1
+
+        candidates = numpy.flatnonzero(codes >= 0)
+        search = self.keys[ranges[0]] if len(ranges) > 0 else None
+        if search is None:
+            order = numpy.argsort(codes[candidates], kind='stable')
+        elif isinstance(search, RangeArray):
+            order = numpy.lexsort((search.range_from[candidates], codes[candidates]))
+        else:
+            # null points are sorted at the end of each bucket.
+            order = numpy.lexsort((search[candidates], codes[candidates]))
+        self.perm = candidates[order]
+        self.offsets = numpy.zeros(n_buckets + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(codes[candidates], minlength=n_buckets), out=self.offsets[1:])
+
+        self.sorted_values = None
+        self.max_width = None
+        # bounds for `stab_count`, sorted at the first count.
+        self.stab_bounds = None
+        self.unbounded = None
+        if isinstance(search, RangeArray):
+            self.sorted_values = search.range_from[self.perm]
+            widths = search.range_to[self.perm] - self.sorted_values
+            # last one is for unknown buckets.
+            self.max_width = numpy.full(n_buckets + 1, -numpy.inf)
+            starts = self.offsets[:-1]
+            nonempty = starts < self.offsets[1:]
+            if nonempty.any():
+                self.max_width[:-1][nonempty] = numpy.maximum.reduceat(widths, starts[nonempty])
+        elif search is not None:
+            self.sorted_values = search[self.perm]
+
+    def state(self) -> Dict[str, Any]:
+        '''
+        | Arrays needed by `search`. Hash tables of buckets are not contained.
+        '''
+        return {'ranges': self.ranges, 'keys': self.keys, 'perm': self.perm, 'offsets': self.offsets,
+                'sorted_values': self.sorted_values, 'max_width': self.max_width}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'SortedKeys':
+        '''
+        | Restore SortedKeys given by `state`. Only `search` is available on it.
+        '''
+        sorted_keys = cls.__new__(cls)
+        sorted_keys.eq = None
+        sorted_keys.buckets = None
+        sorted_keys.jit = False
+        sorted_keys.stab_bounds = None
+        for name, value in state.items():
+            setattr(sorted_keys, name, value)
+        return sorted_keys
+
+    def probe(self, keys: List[Key]) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        '''
+        | Find matched row pairs of probe side and build side.
+        :param keys: keys of probe side built by `build_keys`, same layout as build side.
+        :return: positional indexes of probe side and build side. Probe side is sorted.
+        '''
+        return self.search(self.lookup(keys), keys)
+
+    def count(self, keys: List[Key]) -> numpy.ndarray:
+        '''
+        | Count matched rows of build side for each row of probe side.
+        | Without filters, counts are given by candidate ranges and row pairs are not built.
+        | If build side holds ranges of the only range key, counts are given by `stab_count`.
+        :param keys: keys of probe side built by `build_keys`, same layout as build side.
+        :return: number of matched rows per row of probe side.
+        '''
+        codes = self.lookup(keys)
+        if len(self.ranges) == 1 and isinstance(self.keys[self.ranges[0]], RangeArray):
+            return self.stab_count(codes, _points(keys[self.ranges[0]]))
+        lo, hi, filters = self.bounds(codes, keys)
+        if len(filters) == 0:
+            return numpy.maximum(hi - lo, 0)
+        probe_pos, _ = self.pairs(lo, hi, filters, keys)
+        return numpy.bincount(probe_pos, minlength=len(codes))
+
+    def _sort_bounds(self):
+        '''
+        | Sort lower and upper bounds of non-empty ranges inside each bucket, separately for open and closed ones,
+        | and count unbounded ranges per bucket.
+        '''
+        search = self.keys[self.ranges[0]]
+        n_buckets = len(self.offsets) - 1
+        codes = numpy.repeat(numpy.arange(n_buckets), numpy.diff(self.offsets))
+        f, t = search.range_from[self.perm], search.range_to[self.perm]
+        f_opened, t_opened = search.from_opened[self.perm], search.to_opened[self.perm]
+        # empty ranges contain nothing. For the others, a range ending before a point also starts before it.
+        nonempty = (f < t) | ((f == t) & ~f_opened & ~t_opened)
+        # sorted bounds, bucket offsets, side of search and sign of count.
+        self.stab_bounds = []
+        # closed lower bound <= point, open lower bound < point, closed upper bound < point, open upper bound <= point.
+        for values, rows, side, sign in [(f, ~f_opened, 'right', 1), (f, f_opened, 'left', 1),
+                                         (t, ~t_opened, 'left', -1), (t, t_opened, 'right', -1)]:
+            rows = nonempty & rows
+            order = numpy.lexsort((values[rows], codes[rows]))
+            offsets = numpy.zeros(n_buckets + 1, dtype=numpy.int64)
+            numpy.cumsum(numpy.bincount(codes[rows], minlength=n_buckets), out=offsets[1:])
+            self.stab_bounds.append((values[rows][order], offsets, side, sign))
+        # unbounded ranges contain anything, even null and infinite points excluded by open bounds.
+        unbounded = numpy.isneginf(f) & numpy.isposinf(t)
+        self.unbounded = [numpy.bincount(codes[rows], minlength=n_buckets)
+                          for rows in [unbounded, unbounded & f_opened, unbounded & t_opened]]
+
+    @stats.timed('search')
+    def stab_count(self, codes: numpy.ndarray, points: numpy.ndarray) -> numpy.ndarray:
+        '''
+        | Count ranges of build side containing each point of probe side with known bucket codes.
+        | Ranges containing a point are ranges starting before it minus ranges ending before it,
+        | both found by binary search of bounds sorted per bucket, so row pairs are never listed.
+        :param codes: bucket codes of probe side given by `lookup`.
+        :param points: points of probe side.
+        :return: number of matched rows per row of probe side.
+        '''
+        if self.stab_bounds is None:
+            self._sort_bounds()
+        valid = codes >= 0
+        codes = numpy.where(valid, codes, 0)
+        counts = numpy.zeros(len(codes), dtype=numpy.int64)
+        for values, offsets, side, sign in self.stab_bounds:
+            lo = numpy.where(valid, offsets[codes], 0)
+            hi = numpy.where(valid, offsets[codes + 1], 0)
+            # null points are found at lo, so they are counted only as unbounded ranges.
+            counts += sign * (segment_search(values, lo, hi, points, side) - lo)
+        unbounded, from_opened, to_opened = (n[codes] for n in self.unbounded)
+        counts += numpy.where(numpy.isnan(points), unbounded,
+                              numpy.where(numpy.isposinf(points), to_opened,
+                                          numpy.where(numpy.isneginf(points), from_opened, 0)))
+        return numpy.where(valid, counts, 0)
+
+    def select(self, keys: List[Key], mode: str, k: int) -> Optional[Tuple[numpy.ndarray, numpy.ndarray]]:
+        '''
+        | Select at most `k` matched rows of build side for each row of probe side, directly from sorted positions.
+        | Available only when probe side holds ranges of the only range key, because candidates are exact then.
+        :param keys: keys of probe side built by `build_keys`, same layout as build side.
+        :param mode: first, last or nearest. See `select`.
+        :param k: max number of rows per row of probe side.
+        :return: positional indexes of probe side and build side, or None if not available.
+        '''
+        if len(self.ranges) != 1 or not isinstance(keys[self.ranges[0]], RangeArray):
+            return None
+        lo, hi, _ = self.bounds(self.lookup(keys), keys)
+        hi = numpy.maximum(hi, lo)
+        if mode == 'first':
+            hi = numpy.minimum(hi, lo + k)
+        elif mode == 'last':
+            # null points at the end are matched only by unbounded ranges, and chosen after any value.
+            stop = segment_search(self.sorted_values, lo, hi, numpy.full(len(lo), numpy.inf), 'right')
+            if ((stop < hi) & (stop - lo < k)).any():
+                return None
+            lo, hi = numpy.maximum(lo, stop - k), stop
+        else:
+            lo, hi = _window(self.sorted_values, lo, hi, reference(keys[self.ranges[0]]), k)
+        probe_pos, sorted_idx = _expand(lo, hi)
+        return probe_pos, self.perm[sorted_idx]
+
+    @stats.timed('lookup')
+    def lookup(self, keys: List[Key]) -> numpy.ndarray:
+        '''
+        | Find bucket codes of probe side.
+        :param keys: keys of probe side built by `build_keys`, same layout as build side.
+        :return: bucket codes.
+        '''
+        if self.buckets is not None:
+            return self.buckets.lookup([keys[i] for i in self.eq])
+        return numpy.zeros(len(keys[0]), dtype=numpy.int64)
+
+    @stats.timed('search')
+    def bounds(self, codes: numpy.ndarray, keys: List[Key]) -> Tuple[numpy.ndarray, numpy.ndarray, List[int]]:
+        '''
+        | Find candidate rows of build side for each row of probe side with known bucket codes.
+        | Only range keys of `keys` are used, so equality keys can be anything.
+        :param codes: bucket codes of probe side given by `lookup`.
+        :param keys: keys of probe side.
+        :return: candidates as range [lo, hi) of sorted build rows,
+                 and range keys that candidates have to be filtered with.
+        '''
+        valid = codes >= 0
+        lo = numpy.where(valid, self.offsets[codes], 0)
+        hi = numpy.where(valid, self.offsets[codes + 1], 0)
+
+        filters = self.ranges[1:]
+        if len(self.ranges) > 0:
+            search = keys[self.ranges[0]]
+            if isinstance(search, RangeArray):
+                # search only inside the bucket.
+                # open lower bound excludes equal values, closed higher bound includes them.
+                new_lo = segment_search(self.sorted_values, lo, hi, search.range_from, search.from_opened)
+                new_hi = segment_search(self.sorted_values, lo, hi, search.range_to, ~search.to_opened)
+                # unbounded range contains anything, even null.
+                unbounded = numpy.isneginf(search.range_from) & numpy.isposinf(search.range_to)
+                lo, hi = numpy.where(unbounded, lo, new_lo), numpy.where(unbounded, hi, new_hi)
+            else:
+                points = _points(search)
+                # ranges starting before `point - widest range` can not contain the point.
+                width = numpy.where(valid, self.max_width[codes], 0)
+                upper = numpy.where(numpy.isnan(points), -numpy.inf, points)
+                new_lo = segment_search(self.sorted_values, lo, hi, points - width, 'left')
+                hi = segment_search(self.sorted_values, lo, hi, upper, 'right')
+                lo = new_lo
+                filters = self.ranges
+        return lo, hi, filters
+
+    def search(self, codes: numpy.ndarray, keys: List[Key]) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        '''
+        | Find matched row pairs of probe side with known bucket codes.
+        :param codes: bucket codes of probe side given by `lookup`.
+        :param keys: keys of probe side.
+        :return: positional indexes of probe side and build side. Probe side is sorted.
+        '''
+        lo, hi, filters = self.bounds(codes, keys)
+        return self.pairs(lo, hi, filters, keys)
+
+    @stats.timed('expand')
+    def pairs(self, lo: numpy.ndarray, hi: numpy.ndarray, filters: List[int],
+              keys: List[Key]) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        '''
+        | Expand candidates given by `bounds` into row pairs, and filter them with remaining range keys.
+        :return: positional indexes of probe side and build side. Probe side is sorted.
+        '''
+        if self.jit and len(filters) > 0:
+            probe_pos, build_pos, comparisons = kernels.pairs(lo, hi, self.perm, self.keys, keys, filters)
+            stats.count('comparisons', comparisons)
+            return probe_pos, build_pos
+        probe_pos, sorted_idx = _expand(lo, hi)
+        build_pos = self.perm[sorted_idx]
+
+        for i in filters:
+            stats.count('comparisons', len(probe_pos))
+            build_key = self.keys[i]
+            if isinstance(build_key, RangeArray):
+                ok = build_key[build_pos].contains(_points(keys[i])[probe_pos])
+            else:
+                ok = keys[i][probe_pos].contains(build_key[build_pos])
+            probe_pos = probe_pos[ok]
+            build_pos = build_pos[ok]
+        return probe_pos, build_pos
+
+
+def _take(key: Key, idx: numpy.ndarray) -> Key:
+    if isinstance(key, pandas.Series):
+        return key.iloc[idx]
+    return key[idx]
+
+
+def grid_keys(build_keys: List[Key], probe_keys: List[Key], grid: int,
+              bins: int) -> Tuple[List[Key], List[Key], numpy.ndarray]:
+    '''
+    | Add bins of range key `grid` as one more equality key, for box join of points and ranges in 2 dimensions.
+    | Points of build side are split into `bins` bins of similar size by quantiles, and null points into one more bin.
+    | Each row of probe side is repeated for each bin overlapped by its range,
+    | so that build rows are searched only in the overlapped bins. Range key `grid` still filters found pairs.
+    :param build_keys: keys of build side, holding points at `grid`.
+    :param probe_keys: keys of probe side, holding ranges at `grid`.
+    :param grid: position of range key to split into bins.
+    :param bins: number of bins.
+    :return: keys of build side and probe side with bin key appended, and positions of repeated probe rows.
+    '''
+    points = _points(build_keys[grid])
+    ranges = probe_keys[grid]
+    valid = points[~numpy.isnan(points)]
+    edges = numpy.zeros(0)
+    if len(valid) > 0:
+        edges = numpy.unique(numpy.quantile(valid, numpy.arange(1, bins) / bins))
+    null_bin = len(edges) + 1
+    build_bins = numpy.where(numpy.isnan(points), null_bin, numpy.searchsorted(edges, points, 'right'))
+    first = numpy.searchsorted(edges, ranges.range_from, 'right')
+    last = numpy.searchsorted(edges, ranges.range_to, 'right')
+    # unbounded range contains null too.
+    unbounded = numpy.isneginf(ranges.range_from) & numpy.isposinf(ranges.range_to)
+    last = numpy.where(unbounded, null_bin, last)
+    owner, probe_bins = _expand(first, last + 1)
+    build_keys = list(build_keys) + [pandas.Series(build_bins)]
+    probe_keys = [_take(k, owner) for k in probe_keys] + [pandas.Series(probe_bins)]
+    return build_keys, probe_keys, owner
+
+
+def match(left_keys: List[Key], right_keys: List[Key], ranges: Optional[List[int]] = None,
+          build: Optional[str] = None, grid: Optional[int] = None, bins: int = 0,
+          jit: bool = False) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    | Find matched row pairs with sorted search.
+    | By default, the point side of the first range key is sorted once,
+    | and matched range of each row of the other side is found with binary search.
+    :param left_keys: keys built by `build_keys`.
+    :param right_keys: keys built by `build_keys`.
+    :param ranges: positions of range keys in order of search, like `Plan.ranges`.
+    :param build: side sorted once, left or right, like `Plan.build`.
+    :param grid: position of range key split into bins by `grid_keys`, like `Plan.grid`.
+    :param bins: number of bins of `grid`.
+    :param jit: same as `SortedKeys`.
+    :return: positional indexes of left and right.
+    '''
+    eq, default_ranges = layout(left_keys, right_keys)
+    ranges = default_ranges if ranges is None else ranges
+    if build is None:
+        build = 'right' if len(ranges) == 0 or isinstance(left_keys[ranges[0]], RangeArray) else 'left'
+    build_keys, probe_keys = (right_keys, left_keys) if build == 'right' else (left_keys, right_keys)
+    owner = None
+    if grid is not None and bins > 1:
+        build_keys, probe_keys, owner = grid_keys(build_keys, probe_keys, grid, bins)
+        eq = eq + [len(build_keys) - 1]
+    # sorted keys of cached keys are cached too.
+    sorted_keys = cache.attached(build_keys, ('sorted', tuple(eq), tuple(ranges), jit),
+                                 lambda: SortedKeys(build_keys, eq, ranges, jit))
+    probe_pos, build_pos = sorted_keys.probe(probe_keys)
+    if owner is not None:
+        probe_pos = owner[probe_pos]
+    if build == 'right':
+        return probe_pos, build_pos
+    order = numpy.argsort(build_pos, kind='stable')
+    return build_pos[order], probe_pos[order]
+
+
+def count_matches(left_keys: List[Key], right_keys: List[Key]) -> numpy.ndarray:
+    '''
+    | Count matched rows of right for each row of left with sorted search, without building the merged dataframe.
+    :param left_keys: keys built by `build_keys`.
+    :param right_keys: keys built by `build_keys`.
+    :return: number of matched rows per row of left.
+    '''
+    eq, ranges = layout(left_keys, right_keys)
+    # ranges of the only range key on right are counted by bounds too.
+    if len(ranges) <= 1 or isinstance(left_keys[ranges[0]], RangeArray):
+        return SortedKeys(right_keys, eq, ranges).count(left_keys)
+    _, left_pos = SortedKeys(left_keys, eq, ranges).probe(right_keys)
+    return numpy.bincount(left_pos, minlength=len(left_keys[0]))
+
+
+def _select_pairs(left_key: Key, right_key: Key, left_pos: numpy.ndarray, right_pos: numpy.ndarray,
+                  mode: str, k: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    if isinstance(left_key, RangeArray):
+        values = _points(right_key)[right_pos]
+        distance = numpy.abs(values - reference(left_key)[left_pos])
+    else:
+        values = right_key.range_from[right_pos]
+        distance = numpy.abs(_points(left_key)[left_pos] - reference(right_key)[right_pos])
+    if mode == 'first':
+        order = numpy.lexsort((right_pos, values, left_pos))
+    elif mode == 'last':
+        # ties are broken same as sorted positions, later rows are chosen. null values are chosen at last.
+        order = numpy.lexsort((-right_pos, numpy.where(numpy.isnan(values), numpy.inf, -values), left_pos))
+    else:
+        distance = numpy.where(numpy.isnan(distance), numpy.inf, distance)
+        order = numpy.lexsort((right_pos, values, distance, left_pos))
+    left_pos, right_pos, values = left_pos[order], right_pos[order], values[order]
+    rank = numpy.arange(len(left_pos)) - numpy.searchsorted(left_pos, left_pos, 'left')
+    keep = rank < k
+    left_pos, right_pos, values = left_pos[keep], right_pos[keep], values[keep]
+    order = numpy.lexsort((right_pos, values, left_pos))
+    return left_pos[order], right_pos[order]
+
+
+def select(left_keys: List[Key], right_keys: List[Key], mode: str, k: int,
+           sorted_keys: Optional[SortedKeys] = None) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    | Find at most `k` matched rows of right for each row of left, chosen by the first range key.
+    | `first` and `last` choose rows with the smallest and the largest values,
+    | or the smallest and the largest lower bounds if right holds ranges.
+    | `nearest` chooses rows nearest the middle of the range, see `reference`.
+    | If left holds ranges of the only range key, rows are chosen from sorted positions without listing all pairs.
+    :param left_keys: keys built by `build_keys`.
+    :param right_keys: keys built by `build_keys`.
+    :param mode: first, last or nearest.
+    :param k: max number of rows of right per row of left.
+    :param sorted_keys: sorted keys of right for the layout, built if not given.
+    :return: positional indexes of left and right, ordered by left and values.
+    '''
+    eq, ranges = layout(left_keys, right_keys)
+    if len(ranges) == 0:
+        raise ValueError('match except all needs a range key.')
+    if sorted_keys is None and not isinstance(left_keys[ranges[0]], RangeArray):
+        left_pos, right_pos = match(left_keys, right_keys)
+    else:
+        if sorted_keys is None:
+            sorted_keys = SortedKeys(right_keys, eq, ranges)
+        selected = sorted_keys.select(left_keys, mode, k)
+        if selected is not None:
+            return selected
+        left_pos, right_pos = sorted_keys.probe(left_keys)
+    return _select_pairs(left_keys[ranges[0]], right_keys[ranges[0]], left_pos, right_pos, mode, k)
+
+
+def overlap_match(left_keys: List[Key], right_keys: List[Key]) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    | Find matched row pairs, where key pairs of ranges on both sides match if the ranges overlap.
+    | Overlapping pairs are split by which range starts first,
+    | and each half is found as points of lower bounds in ranges of the other side by `match`:
+    | right starts in [left start, left end], or left starts in (right start, right end].
+    | Candidates are filtered by exact overlap with open flags, so cost is sort and search plus output.
+    :param left_keys: keys built by `build_keys`.
+    :param right_keys: keys built by `build_keys`.
+    :return: positional indexes of left and right.
+    '''
+    overlaps = [i for i, (lk, rk) in enumerate(zip(left_keys, right_keys))
+                if isinstance(lk, RangeArray) and isinstance(rk, RangeArray)]
+    if len(overlaps) == 0:
+        return match(left_keys, right_keys)
+    rest = [i for i in range(len(left_keys)) if i not in overlaps]
+    left_range, right_range = left_keys[overlaps[0]], right_keys[overlaps[0]]
+
+    def closed(key: RangeArray, from_opened: bool) -> RangeArray:
+        return RangeArray(key.range_from, key.range_to,
+                          numpy.full(len(key), from_opened), numpy.zeros(len(key), dtype=bool))
+
+    left_pos_1, right_pos_1 = match([left_keys[i] for i in rest] + [closed(left_range, False)],
+                                    [right_keys[i] for i in rest] + [right_range.range_from])
+    left_pos_2, right_pos_2 = match([left_keys[i] for i in rest] + [left_range.range_from],
+                                    [right_keys[i] for i in rest] + [closed(right_range, True)])
+    # unbounded ranges contain any point, so the halves are kept disjoint explicitly.
+    later = right_range.range_from[right_pos_2] < left_range.range_from[left_pos_2]
+    left_pos_2, right_pos_2 = left_pos_2[later], right_pos_2[later]
+    left_pos = numpy.concatenate([left_pos_1, left_pos_2])
+    right_pos = numpy.concatenate([right_pos_1, right_pos_2])
+    for i in overlaps:
+        ok = left_keys[i][left_pos].overlaps(right_keys[i][right_pos])
+        left_pos = left_pos[ok]
+        right_pos = right_pos[ok]
+    order = numpy.lexsort((right_pos, left_pos))
+    return left_pos[order], right_pos[order]
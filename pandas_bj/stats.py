@@ -0,0 +1,119 @@
+import functools
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional
+
+
+class MergeStats():
+    '''
+    MergeStats holds durations of phases and counters of a merge.
+
+    Phases are like `build_keys`, `sort`, `search`, `match` and `materialize`, and durations are in seconds.
+    Counters are like `comparisons`, `skipped_rows` and `matches`.
+    `peak_bytes` is peak memory allocated during the merge, only if `tracemalloc` is tracing.
+    It is the traced peak minus memory traced before the merge, so it is an upper bound
+    if the merge stays below a peak traced before it.
+    Call `tracemalloc.reset_peak` before merges to measure them exactly.
+    '''
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.total: float = 0.0
+        self.peak_bytes: Optional[int] = None
+
+    def add_phase(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_count(self, name: str, value: int):
+        self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def to_dict(self) -> Dict[str, object]:
+        '''
+        | Flat dictionary to send stats to metrics pipelines, like `{'phase.sort': 0.1, 'matches': 10, ...}`.
+        '''
+        result = {f'phase.{name}': seconds for name, seconds in self.phases.items()}
+        result.update(self.counters)
+        result['total'] = self.total
+        result['peak_bytes'] = self.peak_bytes
+        return result
+
+    def __repr__(self):
+        return f'MergeStats({self.to_dict()})'
+
+
+_current: ContextVar[Optional[MergeStats]] = ContextVar('pandas_bj_merge_stats', default=None)
+_last: Optional[MergeStats] = None
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    '''
+    | Measure duration of a phase, only while stats are collected.
+    '''
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_phase(name, time.perf_counter() - start)
+
+
+def timed(name: str) -> Callable:
+    '''
+    | Decorator to measure duration of a function as a phase.
+    '''
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, value: int):
+    '''
+    | Add value to a counter, only while stats are collected.
+    '''
+    stats = _current.get()
+    if stats is not None:
+        stats.add_count(name, value)
+
+
+@contextmanager
+def collect(callback: Optional[Callable[[MergeStats], None]] = None) -> Iterator[MergeStats]:
+    '''
+    | Collect stats of merges in this context.
+    | Collected stats are passed to callback, and kept for `last_merge_stats`.
+    '''
+    global _last
+    stats = MergeStats()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # peak of tracemalloc is not reset, since callers may be tracing their own peak.
+        base, _ = tracemalloc.get_traced_memory()
+    token = _current.set(stats)
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.total = time.perf_counter() - start
+        _current.reset(token)
+        if tracing:
+            stats.peak_bytes = tracemalloc.get_traced_memory()[1] - base
+        _last = stats
+    if callback is not None:
+        callback(stats)
+
+
+def last_merge_stats() -> Optional[MergeStats]:
+    '''
+    | Stats of the last merge called with `stats`. None if no such merge.
+    '''
+    return _last
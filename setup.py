@@ -18,4 +18,5 @@ setup(
         'Programming Language :: Python :: 3.6',
     ],
     install_requires=requires,
+    extras_require={'numba': ['numba']},
 )
@@ -5,7 +5,7 @@ import numpy
 import pandas
 from nose.tools import eq_, assert_true, assert_false, raises
 
-from pandas_bj.between import Range, Between, CustomColumn, GT, GE, LT, LE
+from pandas_bj.between import Range, Between, CustomColumn, GT, GE, LT, LE, key_values
 
 
 class TestRange(TestCase):
@@ -315,6 +315,76 @@ class TestRange(TestCase):
         eq_(str(Range(100, 200, True, True)), '(100, 200)')
         eq_(str(Range(100, 200)), repr(Range(100, 200)))
 
+
+class TestRangeArray(TestCase):
+    def test_build(self):
+        df = pandas.DataFrame({'a': [1, None, 3], 'b': [5, 6, None]})
+        ra = Between('a', 'b', True, False).to_range_array(df)
+        eq_(len(ra), 3)
+        eq_(list(ra.range_from), [1, -numpy.inf, 3])
+        eq_(list(ra.range_to), [5, 6, numpy.inf])
+        eq_(list(ra.from_opened), [True, True, True])
+        eq_(list(ra.to_opened), [False, False, False])
+        eq_(df['a'].isnull().sum(), 1)
+
+        ra = LT('b').to_range_array(df)
+        eq_(list(ra.range_from), [-numpy.inf] * 3)
+        eq_(list(ra.to_opened), [True, True, True])
+
+    def test_getitem(self):
+        df = pandas.DataFrame({'a': [1, None, 3], 'b': [5, 6, None]})
+        ra = Between('a', 'b', True, False).to_range_array(df)
+        eq_(str(ra[0]), '(1.0, 5.0]')
+        eq_(ra[1].range_from, None)
+        eq_(ra[2].range_to, None)
+        eq_(list(ra[[2, 0]].range_from), [3, 1])
+
+    def test_contains(self):
+        df = pandas.DataFrame({'a': [1, 1, None, None], 'b': [5, 5, 6, None]})
+        ra = Between('a', 'b', True, False).to_range_array(df)
+        values = numpy.array([1, 5, 0, numpy.nan])
+        eq_(list(ra.contains(values)), [ra[i] == v for i, v in enumerate(values)])
+
+    def test_overlaps(self):
+        df1 = pandas.DataFrame({'a': [1, 1, 1, 5, None, 3], 'b': [5, 5, 5, 4, 2, None]})
+        df2 = pandas.DataFrame({'a': [5, 5, 0, 4, 2, None], 'b': [8, 8, 1, 4.5, 2, 0]})
+        ra1 = Between('a', 'b').to_range_array(df1)
+        ra2 = Between('a', 'b', True, False).to_range_array(df2)
+        eq_(list(ra1.overlaps(ra2)), [False, False, True, False, False, False])
+        ra1 = Between('a', 'b').to_range_array(df1)
+        ra2 = Between('a', 'b').to_range_array(df2)
+        eq_(list(ra1.overlaps(ra2)), [True, True, True, False, True, False])
+        eq_(list(ra2.overlaps(ra1)), [True, True, True, False, True, False])
+
+    def test_key_values(self):
+        s = pandas.Series(pandas.to_datetime(['1970-01-01 00:00:01', None, '1969-12-31 23:59:59']))
+        eq_(list(key_values(s)[[0, 2]]), [1e6, -1e6])
+        assert_true(numpy.isnan(key_values(s)[1]))
+        eq_(list(key_values(s.astype('datetime64[ns]'))[[0, 2]]), [1e6, -1e6])
+        eq_(list(key_values(s.dt.tz_localize('Asia/Tokyo'))[[0, 2]]), [1e6 - 9 * 3600e6, -1e6 - 9 * 3600e6])
+        eq_(list(key_values(pandas.to_timedelta(pandas.Series(['1ms', '1s'])))), [1e3, 1e6])
+        eq_(list(key_values(numpy.array([1, 2]))), [1., 2.])
+        df = pandas.DataFrame({'a': s, 'b': s})
+        ra = Between('a', 'b').to_range_array(df)
+        eq_(list(ra.range_from), [1e6, -numpy.inf, -1e6])
+        eq_(list(ra.range_to), [1e6, numpy.inf, -1e6])
+
+    def test_sort_keys(self):
+        df = pandas.DataFrame({'a': [3, None, 1, 1, None, 3, 2], 'b': [5, 4, None, 2, 6, 4, 4]})
+        for between in [Between('a', 'b'), Between('a', 'b', True, True), GT('a'), LE('b')]:
+            ranges = between(df)
+            order = numpy.lexsort(between.sort_keys(df)[::-1])
+            eq_([str(r) for r in ranges.take(order)], [str(r) for r in sorted(ranges)])
+        flags = pandas.concat([Between('a', 'b', f_open, t_open)(df.iloc[[0]])
+                               for f_open in [False, True] for t_open in [False, True]], ignore_index=True)
+        eq_([str(r) for r in sorted(flags)], ['[3.0, 5.0)', '[3.0, 5.0]', '(3.0, 5.0)', '(3.0, 5.0]'])
+
+    @raises(KeyError)
+    def test_build_fail(self):
+        df = pandas.DataFrame({'a': [1, 2, 3], 'b': [5, 6, 7]})
+        Between('c', 'b').to_range_array(df)
+
+
 class TestBetween(TestCase):
     def test_init(self):
         b = Between('a', 'b')
@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+import pandas
+
+from pandas_bj.between import Between, GT
+from pandas_bj.between_index import BetweenIndex
+from pandas_bj.between_merge import merge as bmerge
+from test.fixtures import assert_same, points_frame, ranges_frame
+
+
+class TestBetweenIndex(TestCase):
+
+    def setUp(self):
+        self.df1 = ranges_frame()
+        self.df5 = points_frame()
+
+    def test_merge(self):
+        index = BetweenIndex(self.df5, ['id3', 'id4', 'v'])
+        for how in ['inner', 'left', 'right', 'outer']:
+            for left in [self.df1, self.df1.iloc[:7].reset_index(drop=True)]:
+                result = index.merge(left, ['id1', 'id2', Between('s', 'e', True, False)], how)
+                expected = bmerge(left, self.df5, ['id1', 'id2', Between('s', 'e', True, False)],
+                                  ['id3', 'id4', 'v'], how)
+                assert_same(result, expected, as_float=True)
+        assert len(index.sorted_keys) == 1
+
+    def test_merge_layout(self):
+        index = BetweenIndex(self.df5, ['id3', 'v'])
+        result = index.merge(self.df1, ['id1', GT('s')])
+        assert_same(result, bmerge(self.df1, self.df5, ['id1', GT('s')], ['id3', 'v']), as_float=True)
+        result = index.merge(self.df1, ['id1', 's'])
+        assert_same(result, bmerge(self.df1, self.df5, ['id1', 's'], ['id3', 'v']), as_float=True)
+        assert len(index.sorted_keys) == 2
+
+    def test_merge_range_index(self):
+        index = BetweenIndex(self.df1, ['id1', Between('s', 'e')])
+        for how in ['inner', 'left', 'right', 'outer']:
+            result = index.merge(self.df5, ['id3', 'v'], how)
+            expected = bmerge(self.df5, self.df1, ['id3', 'v'], ['id1', Between('s', 'e')], how)
+            assert_same(result, expected, as_float=True)
+
+    def test_merge_semi_anti(self):
+        index = BetweenIndex(self.df1, ['id1', Between('s', 'e')])
+        for how in ['semi', 'anti']:
+            result = index.merge(self.df5, ['id3', 'v'], how)
+            expected = bmerge(self.df5, self.df1, ['id3', 'v'], ['id1', Between('s', 'e')], how)
+            pandas.testing.assert_frame_equal(result, expected)
+        counts = index.count_matches(self.df5, ['id3', 'v'])
+        assert len(counts) == len(self.df5.index)
+        assert counts.sum() == len(bmerge(self.df5, self.df1, ['id3', 'v'], ['id1', Between('s', 'e')]).index)
+
+    def test_fail_key(self):
+        with self.assertRaises(KeyError):
+            BetweenIndex(self.df5, ['id1', 'v'])
+        index = BetweenIndex(self.df5, ['id3', 'v'])
+        with self.assertRaises(ValueError):
+            index.merge(self.df1, ['id1'])
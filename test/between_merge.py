@@ -1,4 +1,4 @@
-from unittest import TestCase
+from unittest import TestCase, mock
 
 import pandas
 
@@ -24,19 +24,17 @@ def raises(exception, msg=""):
     return _raises
 
 
+from pandas_bj import sorted_search
 from pandas_bj.between import Between, GT, GE, LT, LE
-from pandas_bj.between_merge import merge as bmerge
+from pandas_bj.between_merge import merge as bmerge, count_matches, estimate_merge_size
+from pandas_bj.custom_merge import LazyMerge
+from test.fixtures import assert_same, points_frame, ranges_frame
 
 
 class TestBetweenMerge(TestCase):
 
     def setUp(self):
-        self.df1 = pandas.DataFrame({
-            'id1': [1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3],
-            'id2': [1, 1, 1, 2, 2, 1, 1, 2, 2, 2, 1, 1, 1, 2, 2],
-            's': [1, 2, 3, 4, 5, 2, 3, 4, 5, 6, 3, 4, 5, 6, 7],
-            'e': [5, 6, 7, 8, 9, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]}
-        )
+        self.df1 = ranges_frame()
 
         self.df2 = pandas.DataFrame({
             'id3': [1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3],
@@ -51,10 +49,7 @@ class TestBetweenMerge(TestCase):
             'id1': [1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3],
             'id2': [1, 1, 1, 2, 2, 1, 1, 2, 2, 2, 1, 1, 1, 2, 2],
             's': [1, 5, 2, 6, 3, 7, 4, 8, 5, 9, 6, 10, 7, 11, 8]})
-        self.df5 = pandas.DataFrame({
-            'id3': [1, 1, 1, 1, None, 2, 2, 2, None, 2, 3, 3, 3, 3, None],
-            'id4': [1, 1, 1, 2, 2, 1, 1, 2, 2, 2, 1, 1, 1, 2, 2],
-            'v': [1, 5, 2, 6, 3, 7, 4, 8, 5, 9, 6, 10, 7, 11, 8]})
+        self.df5 = points_frame()
         self.df6 = pandas.DataFrame({
             'id1': [1, 2, 3, 4, 5, 6, 7, 8, 9, None],
             'f': [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
@@ -364,4 +359,201 @@ class TestBetweenMerge(TestCase):
     def test_left_20220603(self):
         result = bmerge(self.df6, self.df7, ['id1', Between('f', 't')], ['id1', 'id2'], how='left')
         print(result)
-        assert len(result) == 10
\ No newline at end of file
+        assert len(result) == 10
+
+    def test_left_20220603_fill(self):
+        df7 = self.df7.iloc[:2]
+        result = bmerge(self.df6, df7, ['id1', Between('f', 't')], ['id1', 'id2'], how='left', engine='python')
+        assert_true(result['v2'].isnull().sum() == 8)
+        result = bmerge(self.df6, df7, ['id1', Between('f', 't')], ['id1', 'id2'], how='left')
+        assert_true(result['v2'].isnull().sum() == 8)
+
+    def test_engine(self):
+        for how in ['inner', 'left', 'right', 'outer']:
+            result = bmerge(self.df1, self.df5, ['id1', Between('s', 'e', True, False), 'id2'], ['id3', 'v', 'id4'],
+                            how)
+            expected = bmerge(self.df1, self.df5, ['id1', Between('s', 'e', True, False), 'id2'],
+                              ['id3', 'v', 'id4'], how, engine='python')
+            assert_same(result, expected, as_float=True)
+
+    @raises(ValueError)
+    def test_inner_fail_validation3(self):
+        result = bmerge(self.df1, self.df2, Between('s', 'e', True, True), 'v', engine='abc')
+
+    def test_index(self):
+        df1 = self.df1.set_index(pandas.date_range('2020-01-01', periods=15)).iloc[::2]
+        df2 = self.df5.set_index(pandas.Index([i * 10 + 5 for i in range(15)][::-1]))
+        for engine in ['numpy', 'python']:
+            result = bmerge(df1, df2, ['id1', Between('s', 'e', True, True)], ['id3', 'v'], 'left', engine=engine,
+                            keep_index='columns')
+            expected = bmerge(df1.reset_index(drop=True), df2.reset_index(drop=True),
+                              ['id1', Between('s', 'e', True, True)], ['id3', 'v'], 'left', engine=engine)
+            pandas.testing.assert_frame_equal(result.iloc[:, 2:], expected)
+            assert_true(all(df1.loc[result['index_x'], 's'].values == result['s'].values))
+            matched = result['index_y'].notnull()
+            assert_true(all(df2.loc[result['index_y'][matched], 'v'].values == result['v'][matched].values))
+
+    def test_index_multiindex(self):
+        df2 = self.df5.set_index(['id3', 'id4'])
+        result = bmerge(self.df1, df2, Between('s', 'e', True, True), 'v', keep_index='multiindex')
+        assert_true(result.index.names == ['index_x', 'id3_y', 'id4_y'])
+        for (li, id3, id4), row in result.iterrows():
+            assert_true(row['s'] == self.df1.loc[li, 's'])
+
+    @raises(ValueError)
+    def test_inner_fail_validation4(self):
+        result = bmerge(self.df1, self.df2, Between('s', 'e', True, True), 'v', keep_index='abc')
+
+    def test_count_matches(self):
+        for engine in ['numpy', 'python']:
+            for left, right, left_on, right_on in [
+                    (self.df1, self.df5, ['id1', Between('s', 'e', True, False)], ['id3', 'v']),
+                    (self.df5, self.df1, ['id3', 'v'], ['id1', Between('s', 'e', True, False)])]:
+                result = count_matches(left, right, left_on, right_on, engine=engine)
+                merged = bmerge(left.assign(pos=range(len(left.index))), right, left_on, right_on, engine=engine)
+                expected = merged['pos'].value_counts().reindex(range(len(left.index)), fill_value=0)
+                assert_true(list(result) == list(expected))
+
+    def test_semi_anti(self):
+        counts = count_matches(self.df5, self.df1, ['id3', 'v'], ['id1', Between('s', 'e', True, False)])
+        for engine in ['numpy', 'python']:
+            result = bmerge(self.df5, self.df1, ['id3', 'v'], ['id1', Between('s', 'e', True, False)], 'semi',
+                            engine=engine)
+            pandas.testing.assert_frame_equal(result, self.df5[counts > 0].reset_index(drop=True))
+            result = bmerge(self.df5, self.df1, ['id3', 'v'], ['id1', Between('s', 'e', True, False)], 'anti',
+                            engine=engine, keep_index='columns')
+            assert_true(list(result['index_x']) == list(self.df5.index[counts == 0]))
+            assert_true(list(result.columns) == ['index_x'] + list(self.df5.columns))
+
+    def test_match(self):
+        df1 = pandas.DataFrame({'s': [0, 10, 0, 40], 'e': [10, 20, 100, 50]})
+        df2 = pandas.DataFrame({'v': [30, 2, 5, 9, 12, 1]})
+        for match, k, expected in [('first', 2, [1, 2, 12, 1, 2]), ('last', 2, [5, 9, 12, 12, 30]),
+                                   ('nearest', 1, [5, 12, 30]), ('all', 1, [1, 2, 5, 9, 12, 1, 2, 5, 9, 12, 30])]:
+            result = bmerge(df1, df2, Between('s', 'e'), 'v', match=match, k=k)
+            assert_true(list(result['v']) == expected)
+        result = bmerge(df1, df2, Between('s', 'e'), 'v', how='left', match='nearest', k=2)
+        assert_true(list(result['s']) == [0, 0, 10, 0, 0, 40])
+        assert_true(result['v'].iloc[:5].tolist() == [2, 5, 12, 12, 30])
+        assert_true(result['v'].isnull().iloc[5])
+
+    def test_match_opposite(self):
+        result = bmerge(self.df5, self.df1, ['id3', 'v'], ['id1', Between('s', 'e')], match='last')
+        merged = bmerge(self.df5.assign(pos=range(15)), self.df1, ['id3', 'v'], ['id1', Between('s', 'e')])
+        assert_true(len(result.index) == merged['pos'].nunique())
+        expected = merged.sort_values('s', kind='stable').groupby('pos').tail(1).sort_values('pos')
+        assert_true(list(result['s']) == list(expected['s']))
+
+    @raises(ValueError)
+    def test_inner_fail_validation5(self):
+        result = bmerge(self.df1, self.df2, Between('s', 'e', True, True), 'v', match='abc')
+
+    @raises(ValueError)
+    def test_inner_fail_validation6(self):
+        result = bmerge(self.df1, self.df2, Between('s', 'e', True, True), 'v', match='first', k=0)
+
+    @raises(ValueError)
+    def test_inner_fail_validation7(self):
+        result = bmerge(self.df1, self.df2, Between('s', 'e', True, True), 'v', match='first', engine='python')
+
+    def test_overlap(self):
+        df1 = pandas.DataFrame({'id': [1, 1, 1, 2], 's': [0, 5, None, 0], 'e': [5, 10, 1, 3]})
+        df2 = pandas.DataFrame({'id': [1, 1, 1, 2], 'a': [5, 11, -3, 3], 'b': [6, None, -1, 3]})
+        result = bmerge(df1, df2, ['id', Between('s', 'e')], ['id', Between('a', 'b')], overlap=True)
+        assert_true(list(zip(result['s'].fillna(-99), result['a'])) == [(0, 5), (5, 5), (-99, -3), (0, 3)])
+        result = bmerge(df1, df2, ['id', Between('s', 'e', False, True)], ['id', Between('a', 'b')], 'left',
+                        overlap=True)
+        assert_true(list(zip(result['s'].fillna(-99), result['a'].fillna(-99))) ==
+                    [(5, 5), (-99, -3), (0, -99), (0, -99)])
+        result = bmerge(df1, df2, ['id', Between('s', 'e')], ['id', Between('a', 'b')], 'anti', overlap=True)
+        assert_true(len(result.index) == 0)
+
+    @raises(ValueError)
+    def test_inner_fail_validation8(self):
+        result = bmerge(self.df1, self.df2, Between('s', 'e', True, True), Between('v', 'v'), overlap=True,
+                        engine='python')
+
+    def test_estimate_merge_size(self):
+        for engine in ['numpy', 'python']:
+            for how in ['inner', 'left', 'right', 'outer', 'semi', 'anti']:
+                size = estimate_merge_size(self.df1, self.df5, ['id1', Between('s', 'e', True, False)],
+                                           ['id3', 'v'], how, engine=engine)
+                result = bmerge(self.df1, self.df5, ['id1', Between('s', 'e', True, False)], ['id3', 'v'], how,
+                                engine=engine)
+                assert_true(size.rows == len(result.index))
+                assert_true(size.bytes == result.memory_usage(index=False).sum())
+
+    def test_max_rows(self):
+        size = estimate_merge_size(self.df1, self.df5, Between('s', 'e'), 'v', 'outer')
+        result = bmerge(self.df1, self.df5, Between('s', 'e'), 'v', 'outer', max_rows=size.rows, max_bytes=size.bytes)
+        assert_true(len(result.index) == size.rows)
+        with self.assertRaises(ValueError):
+            bmerge(self.df1, self.df5, Between('s', 'e'), 'v', 'outer', max_rows=size.rows - 1)
+        with self.assertRaises(ValueError):
+            bmerge(self.df1, self.df5, Between('s', 'e'), 'v', 'outer', max_bytes=size.bytes - 1)
+        # size of right and outer merges is known without listing row pairs.
+        with mock.patch.object(sorted_search.SortedKeys, 'probe', side_effect=AssertionError):
+            for how in ['right', 'outer']:
+                size = estimate_merge_size(self.df1, self.df5, ['id1', Between('s', 'e')], ['id3', 'v'], how)
+                with self.assertRaises(ValueError):
+                    bmerge(self.df1, self.df5, ['id1', Between('s', 'e')], ['id3', 'v'], how, max_rows=size.rows - 1)
+        with self.assertRaises(ValueError):
+            bmerge(self.df1, self.df5, Between('s', 'e'), 'v', match='first', k=2, max_rows=15)
+        with self.assertRaises(ValueError):
+            bmerge(self.df1, self.df5.assign(w=self.df5['v']), Between('s', 'e'), Between('v', 'w'), overlap=True,
+                   max_rows=10)
+
+    def test_engine_datetime(self):
+        base = pandas.Timestamp('2022-06-03')
+        left = self.df1.assign(s=base + pandas.to_timedelta(self.df1['s'], unit='h'),
+                               e=base + pandas.to_timedelta(self.df1['e'], unit='h'))
+        left.loc[[0, 6], 's'] = pandas.NaT
+        left.loc[[3, 6], 'e'] = pandas.NaT
+        right = self.df5.assign(v=base + pandas.to_timedelta(self.df5['v'], unit='h'))
+        right.loc[2, 'v'] = pandas.NaT
+        tz_left = left.assign(s=left['s'].dt.tz_localize('Asia/Tokyo'), e=left['e'].dt.tz_localize('Asia/Tokyo'))
+        tz_right = right.assign(v=right['v'].dt.tz_localize('UTC'))
+        delta_left = left.assign(s=left['s'] - base, e=left['e'] - base)
+        delta_right = right.assign(v=right['v'] - base)
+        for l_df, r_df in [(left, right), (tz_left, tz_right), (delta_left, delta_right)]:
+            for how in ['inner', 'left', 'right', 'outer']:
+                result = bmerge(l_df, r_df, ['id1', Between('s', 'e', True, False)], ['id3', 'v'], how)
+                expected = bmerge(l_df, r_df, ['id1', Between('s', 'e', True, False)], ['id3', 'v'], how,
+                                  engine='python')
+                assert_true(list(result.dtypes) == list(expected.dtypes))
+                assert_same(result, expected)
+
+    def test_engine_string(self):
+        left = self.df1.assign(id1=self.df1['id1'].map({1: 'a', 2: 'b', 3: None}))
+        right = self.df5.assign(id3=self.df5['id3'].map({1: 'a', 2: 'b', 3: 'c'}))
+        for l_df, r_df in [(left, right), (left.astype({'id1': 'category'}), right.astype({'id3': 'category'}))]:
+            for sort in [False, True]:
+                result = bmerge(l_df, r_df, ['id1', Between('s', 'e'), 'id2'], ['id3', 'v', 'id4'], 'left',
+                                engine='python', sort=sort)
+                expected = bmerge(l_df, r_df, ['id1', Between('s', 'e'), 'id2'], ['id3', 'v', 'id4'], 'left')
+                columns = list(result.columns)
+                result = result.astype(str).sort_values(columns).reset_index(drop=True)
+                expected = expected.astype(str).sort_values(columns).reset_index(drop=True)
+                pandas.testing.assert_frame_equal(result, expected)
+                assert_true(result['id3'].isin(['a', 'b']).sum() == 13)
+
+    def test_lazy(self):
+        df1 = self.df1.set_index(pandas.date_range('2020-01-01', periods=15))
+        for engine in ['numpy', 'python']:
+            for how in ['inner', 'left', 'outer', 'semi']:
+                for keep_index in [None, 'columns', 'multiindex']:
+                    args = (df1, self.df5, ['id1', Between('s', 'e')], ['id3', 'v'], how)
+                    expected = bmerge(*args, engine=engine, keep_index=keep_index)
+                    result = bmerge(*args, engine=engine, keep_index=keep_index, lazy=True)
+                    assert_true(isinstance(result, LazyMerge))
+                    assert_true(list(result.columns) == list(expected.columns))
+                    assert_true(result.shape == expected.shape)
+                    pandas.testing.assert_frame_equal(result.to_pandas(), expected)
+                    pandas.testing.assert_series_equal(result['s'], expected['s'])
+                    columns = list(expected.columns)[::-2]
+                    pandas.testing.assert_frame_equal(result[columns], expected[columns])
+                    pandas.testing.assert_frame_equal(result.to_pandas(columns=columns), expected[columns])
+        with self.assertRaises(KeyError):
+            result['w']
+        with self.assertRaises(KeyError):
+            result[['s', 'w']]
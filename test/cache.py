@@ -0,0 +1,105 @@
+import gc
+from unittest import TestCase
+
+import numpy
+import pandas
+
+from pandas_bj import cache, cache_info, disable_cache, enable_cache
+from pandas_bj.between import Between, CustomColumn
+from pandas_bj.between_merge import merge as bmerge, key_frame
+from pandas_bj.stats import last_merge_stats
+from test.fixtures import assert_same
+
+
+class Double(CustomColumn):
+    def __call__(self, df):
+        return df['v'] * 2
+
+    def column_check(self, columns):
+        return 'v' in columns
+
+
+class TestCache(TestCase):
+
+    def setUp(self):
+        r = numpy.random.RandomState(0)
+        self.df1 = pandas.DataFrame({'id': r.randint(0, 5, 100), 's': r.rand(100)})
+        self.df1['e'] = self.df1['s'] + 0.1
+        self.df2 = pandas.DataFrame({'id': r.randint(0, 5, 200), 'v': r.rand(200)})
+        self.left_on = ['id', Between('s', 'e')]
+        self.right_on = ['id', 'v']
+
+    def tearDown(self):
+        disable_cache()
+
+    def test_merge(self):
+        expected = bmerge(self.df1, self.df2, self.left_on, self.right_on, 'left')
+        assert cache_info() is None
+        enable_cache()
+        for engine in ['numpy', 'python']:
+            for _ in range(2):
+                result = bmerge(self.df1, self.df2, self.left_on, self.right_on, 'left', engine=engine)
+                assert_same(result, expected)
+        info = cache_info()
+        # keys of both sides and sorted keys, then key frames of both sides.
+        assert (info.hits, info.misses, info.entries) == (5, 5, 4)
+        assert info.nbytes > 0
+        bmerge(self.df1, self.df2, self.left_on, self.right_on, stats=True)
+        assert last_merge_stats().counters['cache_hits'] == 3
+
+    def test_fingerprint(self):
+        key = cache.fingerprint(self.df2, self.right_on)
+        assert key == cache.fingerprint(self.df2, self.right_on)
+        assert key != cache.fingerprint(self.df2.copy(), self.right_on)
+        assert key != cache.fingerprint(self.df2, ['id', Between('v', None)])
+        df = self.df2.copy()
+        key = cache.fingerprint(df, self.right_on)
+        df.loc[0, 'v'] = 2.0
+        assert key != cache.fingerprint(df, self.right_on)
+        assert cache.fingerprint(self.df2, [Double()]) is None
+
+    def test_collected(self):
+        built = enable_cache()
+        df = self.df2.copy()
+        bmerge(self.df1, df, self.left_on, self.right_on)
+        assert built.info().entries == 2
+        del df
+        gc.collect()
+        # keys of collected dataframe are evicted, not counted as evictions by budget.
+        assert built.info().entries == 1
+        assert built.info().evictions == 0
+        # a dataframe reusing the key of another dataframe does not get its value.
+        df = self.df2.copy()
+        assert built.get('key', lambda: 1, df) == 1
+        assert built.get('key', lambda: 2, df) == 1
+        other = df.copy()
+        assert built.get('key', lambda: 3, other) == 3
+        assert built.get('key', lambda: 4, other) == 3
+        assert built.info().entries == 2
+
+    def test_nbytes(self):
+        key_df = key_frame(self.df1, self.left_on)
+        shallow = int(key_df.memory_usage(index=False).sum())
+        # Range objects of key frames are counted.
+        assert cache.nbytes(key_df) > 5 * shallow
+        built = enable_cache(max_bytes=3 * shallow)
+        bmerge(self.df1, self.df2, self.left_on, self.right_on, engine='python')
+        # key frame of left holding ranges does not fit, key frame of right does.
+        assert built.info().entries == 1 and built.info().evictions == 1
+
+    def test_evict(self):
+        built = enable_cache(max_bytes=2000)
+        values = [numpy.zeros(100) for _ in range(3)]
+        for i, value in enumerate(values):
+            assert built.get(i, lambda: value) is value
+        assert list(built.entries) == [1, 2]
+        assert built.get(1, lambda: None) is values[1]
+        assert built.attach(values[1], 'a', lambda: numpy.zeros(10)).nbytes == 80
+        # least recently used entry is evicted.
+        built.get(3, lambda: numpy.zeros(100))
+        assert list(built.entries) == [1, 3]
+        assert built.info() == cache.CacheInfo(hits=1, misses=5, evictions=2, entries=2, nbytes=1680,
+                                               max_bytes=2000)
+        assert built.attach(numpy.zeros(1), 'a', lambda: 1) == 1
+        with self.assertRaises(ValueError):
+            enable_cache(-1)
@@ -0,0 +1,59 @@
+import io
+from unittest import TestCase
+
+import pandas
+
+from pandas_bj.between import Between
+from pandas_bj.between_merge import merge as bmerge
+from pandas_bj.chunked_merge import merge_iter
+from test.fixtures import assert_same, points_frame, ranges_frame
+
+
+class TestMergeIter(TestCase):
+
+    def setUp(self):
+        self.df1 = ranges_frame()
+        self.df5 = points_frame()
+        self.left_on = ['id1', 'id2', Between('s', 'e', True, False)]
+        self.right_on = ['id3', 'id4', 'v']
+
+    def test_merge_iter(self):
+        for how in ['inner', 'left', 'right', 'outer']:
+            chunks = list(merge_iter(self.df1, self.df5, self.left_on, self.right_on, how, chunksize=4))
+            assert len(chunks) == (4 if how in {'inner', 'left'} else 5)
+            expected = bmerge(self.df1, self.df5, self.left_on, self.right_on, how)
+            assert_same(pandas.concat(chunks), expected, as_float=True)
+
+    def test_merge_iter_semi_anti(self):
+        for how in ['semi', 'anti']:
+            chunks = list(merge_iter(self.df1, self.df5, self.left_on, self.right_on, how, chunksize=4))
+            assert len(chunks) == 4
+            expected = bmerge(self.df1, self.df5, self.left_on, self.right_on, how)
+            pandas.testing.assert_frame_equal(pandas.concat(chunks, ignore_index=True), expected)
+
+    def test_merge_iter_csv(self):
+        reader = pandas.read_csv(io.StringIO(self.df1.to_csv(index=False)), chunksize=6)
+        chunks = list(merge_iter(reader, self.df5, self.left_on, self.right_on, 'outer'))
+        assert len(chunks) == 4
+        expected = bmerge(self.df1, self.df5, self.left_on, self.right_on, 'outer')
+        assert_same(pandas.concat(chunks), expected, as_float=True)
+
+    def test_merge_iter_empty(self):
+        for how in ['inner', 'left', 'semi', 'anti']:
+            assert list(merge_iter([], self.df5, self.left_on, self.right_on, how)) == []
+        for how in ['right', 'outer']:
+            chunks = list(merge_iter([], self.df5, self.left_on, self.right_on, how))
+            assert len(chunks) == 1
+            expected = bmerge(self.df1.iloc[:0], self.df5, self.left_on, self.right_on, how)
+            assert_same(chunks[0], expected, as_float=True)
+
+    def test_merge_iter_empty_chunk(self):
+        left = self.df1.assign(a='x').iloc[:0]
+        for how in ['right', 'outer']:
+            chunks = list(merge_iter(left, self.df5, self.left_on, self.right_on, how, chunksize=4))
+            expected = bmerge(left, self.df5, self.left_on, self.right_on, how)
+            pandas.testing.assert_frame_equal(pandas.concat(chunks, ignore_index=True), expected)
+
+    def test_fail(self):
+        with self.assertRaises(ValueError):
+            list(merge_iter(self.df1, self.df5, self.left_on, self.right_on, 'abc'))
@@ -0,0 +1,71 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+import numpy
+
+from pandas_bj import sorted_search
+from pandas_bj.between import Between
+from pandas_bj.between_merge import merge as bmerge
+from pandas_bj.file_merge import merge_files, open_columns
+from test.fixtures import assert_same, points_frame, ranges_frame
+
+
+class TestMergeFiles(TestCase):
+
+    def setUp(self):
+        self.df1 = ranges_frame()
+        self.df5 = points_frame()
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = {}
+        for column in self.df5.columns:
+            self.paths[column] = os.path.join(self.directory.name, f'{column}.npy')
+            numpy.save(self.paths[column], self.df5[column].to_numpy())
+        self.left_on = ['id1', 'id2', Between('s', 'e', True, False)]
+        self.right_on = ['id3', 'id4', 'v']
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_merge_files(self):
+        for how in ['inner', 'left', 'right', 'outer']:
+            for chunksize in [4, 100]:
+                result = merge_files(self.df1, self.paths, self.left_on, self.right_on, how, chunksize=chunksize)
+                expected = bmerge(self.df1, self.df5, self.left_on, self.right_on, how)
+                assert list(result.columns) == list(expected.columns)
+                assert_same(result, expected, as_float=True)
+
+    def test_merge_arrays(self):
+        columns = {'id3': self.df5['id3'].to_numpy(), 'v': numpy.load(self.paths['v'], mmap_mode='r')}
+        result = merge_files(self.df1, columns, ['id1', Between('s', 'e')], ['id3', 'v'], chunksize=5)
+        expected = bmerge(self.df1, self.df5[['id3', 'v']], ['id1', Between('s', 'e')], ['id3', 'v'])
+        assert_same(result, expected, as_float=True)
+
+    def test_merge_files_ranges(self):
+        df2 = self.df1.rename(columns={'id1': 'id3', 'id2': 'id4'})
+        paths = {}
+        for column in df2.columns:
+            paths[column] = os.path.join(self.directory.name, f'{column}.npy')
+            numpy.save(paths[column], df2[column].to_numpy())
+        left_on, right_on = ['id3', 'id4', 'v'], ['id3', 'id4', Between('s', 'e', True, False)]
+        init = sorted_search.SortedKeys.__init__
+        with mock.patch.object(sorted_search.SortedKeys, '__init__', autospec=True, side_effect=init) as patched:
+            result = merge_files(self.df5, paths, left_on, right_on, 'outer', chunksize=4)
+        # points of left are sorted once for all 4 runs.
+        assert patched.call_count == 1
+        expected = bmerge(self.df5, df2, left_on, right_on, 'outer')
+        assert_same(result, expected, as_float=True)
+
+    def test_open_columns(self):
+        columns = open_columns(self.paths)
+        assert isinstance(columns['v'], numpy.memmap)
+        with self.assertRaises(ValueError):
+            open_columns({'v': columns['v'], 'w': numpy.zeros(3)})
+
+    def test_fail(self):
+        with self.assertRaises(KeyError):
+            merge_files(self.df1, self.paths, self.left_on, ['id3', 'id5', 'v'])
+        with self.assertRaises(ValueError):
+            merge_files(self.df1, self.paths, self.left_on, self.right_on, 'semi')
+        with self.assertRaises(ValueError):
+            merge_files(self.df1, self.paths, self.left_on, self.right_on, chunksize=0)
@@ -0,0 +1,40 @@
+'''
+Dataframes and assertions shared by tests.
+'''
+import pandas
+
+
+def ranges_frame() -> pandas.DataFrame:
+    '''
+    | Left dataframe of ranges [s, e] with equality keys id1 and id2.
+    '''
+    return pandas.DataFrame({
+        'id1': [1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3],
+        'id2': [1, 1, 1, 2, 2, 1, 1, 2, 2, 2, 1, 1, 1, 2, 2],
+        's': [1, 2, 3, 4, 5, 2, 3, 4, 5, 6, 3, 4, 5, 6, 7],
+        'e': [5, 6, 7, 8, 9, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]}
+    )
+
+
+def points_frame() -> pandas.DataFrame:
+    '''
+    | Right dataframe of points v with equality keys id3 and id4. Some of id3 are null.
+    '''
+    return pandas.DataFrame({
+        'id3': [1, 1, 1, 1, None, 2, 2, 2, None, 2, 3, 3, 3, 3, None],
+        'id4': [1, 1, 1, 2, 2, 1, 1, 2, 2, 2, 1, 1, 1, 2, 2],
+        'v': [1, 5, 2, 6, 3, 7, 4, 8, 5, 9, 6, 10, 7, 11, 8]})
+
+
+def assert_same(result: pandas.DataFrame, expected: pandas.DataFrame, as_float: bool = False):
+    '''
+    | Assert merged dataframes have the same columns and the same rows in any order.
+    :param as_float: compare values as float, for columns made float by nulls of outer merges.
+    '''
+    assert list(result.columns) == list(expected.columns)
+    columns = list(result.columns)
+    result = result.sort_values(columns).reset_index(drop=True)
+    expected = expected.sort_values(columns).reset_index(drop=True)
+    if as_float:
+        result, expected = result.astype(float), expected.astype(float)
+    pandas.testing.assert_frame_equal(result, expected)
@@ -0,0 +1,52 @@
+from unittest import TestCase, mock
+
+import numpy
+import pandas
+
+from pandas_bj import kernels
+from pandas_bj.between import Between, RangeArray
+from pandas_bj.between_merge import merge as bmerge
+from pandas_bj.sorted_search import build_keys, match
+from pandas_bj.stats import last_merge_stats
+
+
+class TestKernels(TestCase):
+
+    def setUp(self):
+        r = numpy.random.RandomState(0)
+        self.df1 = pandas.DataFrame({'id': r.randint(0, 3, 200), 's': r.rand(200), 'a': r.rand(200)})
+        self.df1['e'] = self.df1['s'] + 0.2
+        self.df1['b'] = self.df1['a'] + 0.3
+        self.df1.loc[::7, 'b'] = None
+        self.df1.loc[::11, ['a', 'b']] = None
+        self.df2 = pandas.DataFrame({'id': r.randint(0, 3, 300), 'v': r.rand(300), 'w': r.rand(300)})
+        self.df2.loc[::5, 'w'] = None
+        self.left_on = ['id', Between('s', 'e', True, False), Between('a', 'b')]
+        self.right_on = ['id', 'v', 'w']
+
+    def test_pairs(self):
+        left_keys = build_keys(self.df1, self.left_on)
+        right_keys = build_keys(self.df2, self.right_on)
+        # bounds are opened or closed per row.
+        ranges = left_keys[2]
+        left_keys[2] = RangeArray(ranges.range_from, ranges.range_to,
+                                  numpy.arange(200) % 2 == 0, numpy.arange(200) % 3 == 0)
+        expected = match(left_keys, right_keys)
+        with mock.patch.object(kernels, 'kernel', kernels.scan_pairs), mock.patch.object(kernels, 'buffer_size', 4):
+            for build in ['right', 'left']:
+                left_pos, right_pos = match(left_keys, right_keys, [1, 2], build, jit=True)
+                assert sorted(zip(left_pos, right_pos)) == sorted(zip(*expected))
+
+    def test_merge(self):
+        expected = bmerge(self.df1, self.df2, self.left_on, self.right_on, 'left')
+        for kernel in [kernels.kernel, kernels.scan_pairs]:
+            with mock.patch.object(kernels, 'kernel', kernel):
+                result = bmerge(self.df1, self.df2, self.left_on, self.right_on, 'left', engine='numba', stats=True)
+                pandas.testing.assert_frame_equal(result, expected)
+                assert last_merge_stats().counters['comparisons'] > 0
+
+    def test_available(self):
+        with mock.patch.object(kernels, 'kernel', None):
+            assert not kernels.available()
+        with mock.patch.object(kernels, 'kernel', kernels.scan_pairs):
+            assert kernels.available()
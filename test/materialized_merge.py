@@ -0,0 +1,81 @@
+from unittest import TestCase
+
+import numpy
+import pandas
+
+from pandas_bj import MaterializedMerge
+from pandas_bj.between import Between
+from pandas_bj.between_merge import merge as bmerge
+from test.fixtures import assert_same
+
+
+class TestMaterializedMerge(TestCase):
+
+    def setUp(self):
+        self.r = numpy.random.RandomState(0)
+        self.left_on = ['id', Between('s', 'e')]
+        self.right_on = ['id', 'v']
+
+    def left(self, n):
+        df = pandas.DataFrame({'id': self.r.randint(0, 4, n), 's': self.r.rand(n)})
+        df['e'] = df['s'] + 0.1
+        return df
+
+    def right(self, n):
+        return pandas.DataFrame({'id': self.r.randint(0, 4, n), 'v': self.r.rand(n), 'w': self.r.randint(0, 9, n)})
+
+    def test_append(self):
+        for how in ['inner', 'left', 'right', 'outer']:
+            lefts, rights = [self.left(30)], [self.right(10)]
+            view = MaterializedMerge(lefts[0], rights[0], self.left_on, self.right_on, how)
+            for step in range(4):
+                if step % 2 == 0:
+                    rights.append(self.right(5))
+                    added = view.append_right(rights[-1])
+                    expected = bmerge(pandas.concat(lefts), rights[-1], self.left_on, self.right_on)
+                else:
+                    lefts.append(self.left(7))
+                    added = view.append_left(lefts[-1])
+                    expected = bmerge(lefts[-1], pandas.concat(rights), self.left_on, self.right_on)
+                assert_same(added, expected)
+                expected = bmerge(pandas.concat(lefts), pandas.concat(rights), self.left_on, self.right_on, how)
+                assert_same(view.result, expected)
+
+    def test_compact(self):
+        lefts, rights = [self.left(8)], [self.right(8)]
+        view = MaterializedMerge(lefts[0], rights[0], self.left_on, self.right_on, 'outer')
+        for step in range(20):
+            rights.append(self.right(3))
+            view.append_right(rights[-1])
+            # parts are merged like a binary counter.
+            assert len(view.right_parts) <= numpy.log2(len(rights)) + 1
+            assert [len(flags) for flags in view.right_matched] == [len(part.right.index) for part in view.right_parts]
+            if step % 5 == 0:
+                lefts.append(self.left(2))
+                view.append_left(lefts[-1])
+                assert len(view.result.index) > 0
+                assert len(view.matched) == 1
+        assert len(view.right_parts) < 5 and len(view.left_parts) < 3
+        expected = bmerge(pandas.concat(lefts), pandas.concat(rights), self.left_on, self.right_on, 'outer')
+        assert_same(view.result, expected)
+
+    def test_unmatched(self):
+        left = pandas.DataFrame({'id': [1, 2], 's': [0.0, 0.0], 'e': [1.0, 1.0]})
+        view = MaterializedMerge(left, pandas.DataFrame({'id': [3], 'v': [0.5]}), self.left_on, self.right_on,
+                                 'outer')
+        assert len(view.result.index) == 3
+        added = view.append_right(pandas.DataFrame({'id': [1], 'v': [0.5]}))
+        assert len(added.index) == 1
+        # the row of left is not unmatched anymore.
+        assert len(view.result.index) == 3
+        assert view.result['id_x'].tolist()[:2] == [1, 2]
+        assert view.result['id_y'].tolist()[0] == 1
+        assert len(view.append_left(pandas.DataFrame({'id': [4], 's': [0.0], 'e': [1.0]})).index) == 0
+        assert len(view.result.index) == 4
+
+    def test_fail(self):
+        with self.assertRaises(ValueError):
+            MaterializedMerge(self.left(3), self.right(3), self.left_on, self.right_on, 'semi')
+        view = MaterializedMerge(self.left(3), self.right(3), self.left_on, self.right_on)
+        with self.assertRaises(ValueError):
+            view.append_right(self.right(3).drop(columns='w'))
@@ -0,0 +1,64 @@
+from unittest import TestCase
+
+import numpy
+import pandas
+
+from pandas_bj.between import Between
+from pandas_bj.between_merge import merge as bmerge
+from pandas_bj import parallel, sorted_search
+
+
+class TestParallel(TestCase):
+    def setUp(self):
+        r = numpy.random.RandomState(0)
+        self.df1 = pandas.DataFrame({'id1': r.randint(0, 5, 200), 's': r.rand(200), 'e': r.rand(200) + 0.5})
+        self.df2 = pandas.DataFrame({'id1': r.randint(0, 5, 300), 'v': r.rand(300) * 1.5})
+
+    def test_partitions(self):
+        bounds = parallel.partitions(numpy.ones(10), 3)
+        assert list(bounds) == [0, 3, 6, 10]
+        bounds = parallel.partitions(numpy.ones(0), 3)
+        assert list(bounds) == [0, 0, 0, 0]
+
+    def test_match(self):
+        for left_on, right_on in [(['id1', Between('s', 'e')], ['id1', 'v']),
+                                  ([Between('s', 'e', True, True)], ['v']),
+                                  (['id1', 's'], ['id1', Between('v', None)])]:
+            left_keys = sorted_search.build_keys(self.df1, left_on)
+            right_keys = sorted_search.build_keys(self.df2, right_on)
+            expected = sorted_search.match(left_keys, right_keys)
+            result = parallel.match(left_keys, right_keys, 2)
+            numpy.testing.assert_array_equal(result[0], expected[0])
+            numpy.testing.assert_array_equal(result[1], expected[1])
+
+    def test_merge(self):
+        result = bmerge(self.df1, self.df2, ['id1', Between('s', 'e')], ['id1', 'v'], 'outer', n_jobs=2)
+        expected = bmerge(self.df1, self.df2, ['id1', Between('s', 'e')], ['id1', 'v'], 'outer')
+        pandas.testing.assert_frame_equal(result, expected)
+
+    def test_match_plan(self):
+        r = numpy.random.RandomState(1)
+        df3 = pandas.DataFrame({'s': r.rand(300), 'e': r.rand(300) + 0.5, 'a': r.rand(300), 'b': r.rand(300) + 0.5})
+        left_keys = sorted_search.build_keys(df3, [Between('s', 'e'), Between('a', 'b')])
+        right_keys = sorted_search.build_keys(self.df2.assign(w=r.rand(300)), ['v', 'w'])
+        for ranges, build, grid, bins in [([1, 0], 'right', None, 0), ([0, 1], 'left', None, 0),
+                                          ([0, 1], 'right', 1, 4)]:
+            expected = sorted_search.match(left_keys, right_keys, ranges, build, grid, bins)
+            result = parallel.match(left_keys, right_keys, 2, ranges, build, grid, bins)
+            numpy.testing.assert_array_equal(result[0], expected[0])
+            numpy.testing.assert_array_equal(result[1], expected[1])
+
+    def test_merge_plan(self):
+        left_on, right_on = ['id1', Between('s', 'e'), Between('s', None)], ['id1', 'v', 'v']
+        for engine in ['numpy', 'numba']:
+            result = bmerge(self.df1, self.df2, left_on, right_on, 'left', sort='auto', engine=engine, n_jobs=2)
+            expected = bmerge(self.df1, self.df2, left_on, right_on, 'left', sort='auto', engine=engine)
+            pandas.testing.assert_frame_equal(result, expected)
+        with self.assertRaises(ValueError):
+            bmerge(self.df1, self.df2, left_on, right_on, engine='python', n_jobs=2)
+
+    def test_n_jobs(self):
+        assert parallel.normalize_n_jobs(None) == 1
+        assert parallel.normalize_n_jobs(-1) >= 1
+        with self.assertRaises(ValueError):
+            parallel.normalize_n_jobs(0)
@@ -1,72 +1,264 @@
+'''
+Benchmark suite of `pandas_bj.merge`.
+
+Run benchmarks and write results to a JSON file:
+
+```
+python -m test.performance run results.json
+python -m test.performance run results.json --x-n 1000 10000 --y-n 100000 --how inner left --sort false auto
+```
+
+Compare two result files and flag slowdowns and memory regressions:
+
+```
+python -m test.performance compare base.json results.json --threshold 1.2 --memory-threshold 1.2
+```
+'''
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
 from random import Random
+from typing import Any, Dict, List, NamedTuple, Optional, Union
 from unittest import TestCase
 
+import numpy
 import pandas
+
 import pandas_bj
-from nose.tools import nottest
-import time
+
+
+def prepare_data_x(n, id1_range, id2_range, value_range, range_limit):
+    r = Random(0)
+
+    x_records = {'id1': [], 'id2': [], 's': [], 'e': []}
+
+    for i in range(n):
+        id1 = int(r.random() * id1_range)
+        id2 = int(r.random() * id2_range)
+        s_r = r.random()
+        e_r = s_r + (1.0 - s_r) * r.random() * range_limit
+        s = s_r * value_range
+        e = e_r * value_range
+        x_records['id1'].append(id1)
+        x_records['id2'].append(id2)
+        x_records['s'].append(s)
+        x_records['e'].append(e)
+    return pandas.DataFrame(x_records)
+
+
+def prepare_data_y(n, id1_range, id2_range, value_range):
+    r = Random(0)
+
+    y_records = {'id1': [], 'id2': [], 'v': []}
+
+    for i in range(n):
+        id1 = int(r.random() * id1_range)
+        id2 = int(r.random() * id2_range)
+        v = r.random() * value_range
+        y_records['id1'].append(id1)
+        y_records['id2'].append(id2)
+        y_records['v'].append(v)
+    return pandas.DataFrame(y_records)
+
+
+class Case(NamedTuple):
+    x_n: int
+    y_n: int
+    id1_range: int = 100
+    id2_range: int = 50
+    range_limit: float = 1.0
+    how: str = 'inner'
+    sort: Union[bool, str] = False
+    engine: str = 'numpy'
+    value_range: int = 1000
+
+    @property
+    def name(self) -> str:
+        return ','.join(f'{k}={v}' for k, v in self._asdict().items())
+
+
+# numpy engine sorts keys only with sort='auto', so sort=True is same as False for it.
+default_grid = {
+    'x_n': [1000, 10000],
+    'y_n': [10000, 100000],
+    'id1_range': [10, 100],
+    'id2_range': [5, 50],
+    'range_limit': [0.1, 1.0],
+    'how': ['inner', 'left'],
+    'sort': [False, 'auto'],
+    'engine': ['numpy'],
+}
+
+
+def cases(grid: Dict[str, List[Any]]) -> List[Case]:
+    '''
+    | All combinations of parameters in grid.
+    '''
+    names = list(grid.keys())
+    return [Case(**dict(zip(names, values))) for values in itertools.product(*[grid[n] for n in names])]
+
+
+def merge(case: Case, x: pandas.DataFrame, y: pandas.DataFrame) -> pandas.DataFrame:
+    return pandas_bj.merge(x, y, ['id1', 'id2', pandas_bj.Between('s', 'e')], ['id1', 'id2', 'v'],
+                           how=case.how, sort=case.sort, engine=case.engine)
+
+
+def measure(case: Case, repeat: int = 1) -> Dict[str, Any]:
+    '''
+    | Run merge of a case and measure it.
+    | Wall time is the best of `repeat` runs, and peak memory is traced in one more run
+    | so that tracing does not slow down timed runs.
+    :return: parameters of the case, `seconds`, `peak_bytes` and `rows`.
+    '''
+    x = prepare_data_x(case.x_n, case.id1_range, case.id2_range, case.value_range, case.range_limit)
+    y = prepare_data_y(case.y_n, case.id1_range, case.id2_range, case.value_range)
+
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = merge(case, x, y)
+        seconds.append(time.perf_counter() - start)
+        rows = len(result.index)
+        del result
+
+    tracemalloc.start()
+    try:
+        merge(case, x, y)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return dict(case._asdict(), name=case.name, seconds=min(seconds), peak_bytes=peak, rows=rows)
+
+
+def run(grid: Dict[str, List[Any]], output: str, repeat: int = 1) -> List[Dict[str, Any]]:
+    '''
+    | Run all cases of grid and write results to a JSON file.
+    '''
+    results = []
+    for case in cases(grid):
+        result = measure(case, repeat)
+        print(f'{case.name}: TIME: {result["seconds"]:.4f}, PEAK: {result["peak_bytes"]}, ROWS: {result["rows"]}')
+        results.append(result)
+    meta = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'numpy': numpy.__version__, 'pandas': pandas.__version__, 'machine': platform.machine()}
+    with open(output, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+    return results
+
+
+def compare(base: str, new: str, threshold: float = 1.2, min_seconds: float = 0.01,
+            memory_threshold: float = 1.2, min_bytes: int = 1024 ** 2) -> List[Dict[str, Any]]:
+    '''
+    | Compare two result files by name of cases, and flag slowdowns and memory regressions.
+    :param base: base result file.
+    :param new: new result file.
+    :param threshold: case is slowdown if time of new is more than `threshold` times time of base.
+    :param min_seconds: differences shorter than this are ignored as noise.
+    :param memory_threshold: case is memory regression if peak memory of new is more than
+                             `memory_threshold` times peak memory of base.
+    :param min_bytes: differences of peak memory smaller than this are ignored as noise.
+    :return: slowdowns and memory regressions, with `slow` and `grown` flags.
+    '''
+    with open(base) as f:
+        base_results = {r['name']: r for r in json.load(f)['results']}
+    with open(new) as f:
+        new_results = {r['name']: r for r in json.load(f)['results']}
+
+    slowdowns = []
+    for name, n in new_results.items():
+        b = base_results.get(name)
+        if b is None:
+            continue
+        ratio = n['seconds'] / b['seconds'] if b['seconds'] > 0 else float('inf')
+        memory_ratio = n['peak_bytes'] / b['peak_bytes'] if b['peak_bytes'] > 0 else float('inf')
+        slow = ratio > threshold and n['seconds'] - b['seconds'] > min_seconds
+        grown = memory_ratio > memory_threshold and n['peak_bytes'] - b['peak_bytes'] > min_bytes
+        mark = ', '.join(m for m, flagged in [('SLOWDOWN', slow), ('MEMORY', grown)] if flagged) or 'ok'
+        print(f'{name}: TIME: {b["seconds"]:.4f} -> {n["seconds"]:.4f} ({ratio:.2f}x), '
+              f'PEAK: {b["peak_bytes"]} -> {n["peak_bytes"]} ({memory_ratio:.2f}x), {mark}')
+        if n['rows'] != b['rows']:
+            print(f'{name}: ROWS: {b["rows"]} -> {n["rows"]}')
+        if slow or grown:
+            slowdowns.append(dict(n, base_seconds=b['seconds'], ratio=ratio, base_peak_bytes=b['peak_bytes'],
+                                  memory_ratio=memory_ratio, slow=slow, grown=grown))
+    return slowdowns
+
+
+def _sort(value: str) -> Union[bool, str]:
+    if value.lower() not in {'true', 'false', 'auto'}:
+        raise argparse.ArgumentTypeError('sort must be true, false or auto.')
+    return 'auto' if value.lower() == 'auto' else value.lower() == 'true'
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark suite of pandas_bj.merge.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run benchmarks and write results to a JSON file.')
+    run_parser.add_argument('output')
+    run_parser.add_argument('--repeat', type=int, default=1)
+    for name, values in default_grid.items():
+        kind = {'sort': _sort, 'range_limit': float, 'how': str, 'engine': str}.get(name, int)
+        run_parser.add_argument(f'--{name.replace("_", "-")}', dest=name, type=kind, nargs='+', default=values)
+
+    compare_parser = commands.add_parser('compare',
+                                         help='compare two result files and flag slowdowns and memory regressions.')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=1.2)
+    compare_parser.add_argument('--min-seconds', type=float, default=0.01)
+    compare_parser.add_argument('--memory-threshold', type=float, default=1.2)
+    compare_parser.add_argument('--min-bytes', type=int, default=1024 ** 2)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run({name: getattr(args, name) for name in default_grid}, args.output, args.repeat)
+        return 0
+    slowdowns = compare(args.base, args.new, args.threshold, args.min_seconds, args.memory_threshold, args.min_bytes)
+    return 1 if len(slowdowns) > 0 else 0
 
 
 class PerformanceTest(TestCase):
+    '''
+    Check the benchmark suite itself with small cases.
+    '''
+
+    def test_run_compare(self):
+        grid = dict(x_n=[10], y_n=[100], how=['inner', 'left'], sort=[False, 'auto'], engine=['numpy', 'python'])
+        with tempfile.TemporaryDirectory() as d:
+            output = os.path.join(d, 'results.json')
+            results = run(grid, output)
+            assert len(results) == 8
+            assert all(r['rows'] > 0 and r['seconds'] > 0 and r['peak_bytes'] > 0 for r in results)
+            with open(output) as f:
+                saved = json.load(f)
+            assert len(saved['results']) == 8
+
+            for r in saved['results']:
+                r['seconds'] /= 10
+            base = os.path.join(d, 'base.json')
+            with open(base, 'w') as f:
+                json.dump(saved, f)
+            assert len(compare(base, output, min_seconds=0)) == 8
+            assert len(compare(output, base, min_seconds=0)) == 0
+            assert main(['compare', output, output]) == 0
+
+            for r in saved['results']:
+                r['seconds'] *= 10
+                r['peak_bytes'] //= 10
+            with open(base, 'w') as f:
+                json.dump(saved, f)
+            regressions = compare(base, output, min_bytes=0)
+            assert len(regressions) == 8 and all(r['grown'] and not r['slow'] for r in regressions)
+            assert main(['compare', base, output, '--min-bytes', '0']) == 1
+
 
-    @nottest
-    def prepare_data_x(self, n, id1_range, id2_range, value_range, range_limit):
-        r = Random(0)
-
-        x_records = {'id1': [], 'id2': [], 's': [], 'e': []}
-
-        for i in range(n):
-            id1 = int(r.random() * id1_range)
-            id2 = int(r.random() * id2_range)
-            s_r = r.random()
-            e_r = s_r + (1.0 - s_r) * r.random() * range_limit
-            s = s_r * value_range
-            e = e_r * value_range
-            x_records['id1'].append(id1)
-            x_records['id2'].append(id2)
-            x_records['s'].append(s)
-            x_records['e'].append(e)
-        return pandas.DataFrame(x_records)
-
-    @nottest
-    def prepare_data_y(self, n, id1_range, id2_range, value_range):
-        r = Random(0)
-
-        y_records = {'id1': [], 'id2': [], 'v': []}
-
-        for i in range(n):
-            id1 = int(r.random() * id1_range)
-            id2 = int(r.random() * id2_range)
-            v = r.random() * value_range
-            y_records['id1'].append(id1)
-            y_records['id2'].append(id2)
-            y_records['v'].append(v)
-        return pandas.DataFrame(y_records)
-
-    @nottest
-    def performance_test(self, x_n, y_n, sort=True, id1_range=100, id2_range=50, value_range=1000, range_limit=1.0):
-        x = self.prepare_data_x(x_n, id1_range, id2_range, value_range, range_limit)
-        y = self.prepare_data_y(y_n, id1_range, id2_range, value_range)
-
-        start = time.time()
-        result = pandas_bj.merge(x, y, ['id1', 'id2', pandas_bj.Between('s', 'e')], ['id1', 'id2', 'v'], sort=sort)
-        end = time.time()
-
-        mean_merged_count = result.groupby(['id1_x', 'id2_x', 's', 'e'])['v'].count().mean()
-
-        print(f'X: {x_n}, Y: {y_n}, SORT: {sort}, TIME: {end-start}, AVG COUNT: {mean_merged_count}')
-        return end - start
-
-    def test_inner_join1(self):
-        self.performance_test(100, 1000, False)
-        self.performance_test(100, 1000, True)
-
-    def test_inner_join2(self):
-        self.performance_test(1000, 10000, False)
-        self.performance_test(1000, 10000, True)
-
-    def test_inner_join3(self):
-        self.performance_test(10000, 100000, True)
-
-    def test_inner_join4(self):
-        self.performance_test(10000, 1000000, True)
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main())
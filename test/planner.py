@@ -0,0 +1,95 @@
+import io
+from unittest import TestCase
+
+import numpy
+import pandas
+
+from pandas_bj import explain
+from pandas_bj.between import Between
+from pandas_bj.between_merge import merge as bmerge
+from pandas_bj.planner import plan_merge
+from test.fixtures import assert_same
+
+
+class TestPlanner(TestCase):
+
+    def setUp(self):
+        r = numpy.random.RandomState(0)
+        self.df1 = pandas.DataFrame({'id': r.randint(0, 10, 200), 's': r.rand(200) * 0.1, 'a': r.rand(200)})
+        self.df1['e'] = self.df1['s'] + 0.9
+        self.df1['b'] = self.df1['a'] + 0.01
+        self.df2 = pandas.DataFrame({'id': r.randint(0, 10, 1000), 'v': r.rand(1000), 'w': r.rand(1000)})
+        self.left_on = ['id', Between('s', 'e'), Between('a', 'b')]
+        self.right_on = ['id', 'v', 'w']
+
+    def test_key_order(self):
+        plan = plan_merge(self.df1, self.df2, self.left_on, self.right_on)
+        assert plan.engine == 'numpy'
+        assert plan.eq == [0]
+        assert plan.ranges == [2, 1]
+        assert plan.keys[0].distinct == (10, 10)
+        assert plan.keys[2].selectivity < plan.keys[1].selectivity
+        assert plan.cost == min(plan.costs.values())
+        assert len(plan.costs) == 6
+
+    def test_strategy(self):
+        ranges = pandas.DataFrame({'s': numpy.arange(10000) / 10000})
+        ranges['e'] = ranges['s'] + 0.00001
+        points = pandas.DataFrame({'v': numpy.linspace(0, 1, 10)})
+        plan = plan_merge(ranges, points, Between('s', 'e'), 'v')
+        assert (plan.strategy, plan.build) == ('range_window', 'left')
+        plan = plan_merge(ranges.iloc[:10], pandas.DataFrame({'v': numpy.linspace(0, 1, 10000)}),
+                          Between('s', 'e'), 'v')
+        assert (plan.strategy, plan.build) == ('sorted_search', 'right')
+        plan = plan_merge(self.df1, self.df2, 'id', 'id')
+        assert plan.strategy == 'hash'
+
+    def test_grid(self):
+        r = numpy.random.RandomState(0)
+        boxes = pandas.DataFrame({'x': r.rand(2000), 'y': r.rand(2000)})
+        boxes['x2'] = boxes['x'] + 0.05
+        boxes['y2'] = boxes['y'] + 0.05
+        points = pandas.DataFrame({'v': r.rand(20000), 'w': r.rand(20000)})
+        left_on, right_on = [Between('x', 'x2'), Between('y', 'y2')], ['v', 'w']
+        plan = plan_merge(boxes, points, left_on, right_on)
+        assert (plan.strategy, plan.build) == ('grid_search', 'right')
+        assert plan.grid == plan.ranges[1] and plan.bins > 1
+        result = bmerge(boxes, points, left_on, right_on)
+        inside = ((boxes['x'].to_numpy()[:, None] <= points['v'].to_numpy())
+                  & (points['v'].to_numpy() <= boxes['x2'].to_numpy()[:, None])
+                  & (boxes['y'].to_numpy()[:, None] <= points['w'].to_numpy())
+                  & (points['w'].to_numpy() <= boxes['y2'].to_numpy()[:, None]))
+        left_pos, right_pos = numpy.nonzero(inside)
+        assert sorted(zip(result['x'], result['v'])) == sorted(zip(boxes['x'].to_numpy()[left_pos],
+                                                                   points['v'].to_numpy()[right_pos]))
+        assert abs(len(result.index) - plan.rows) < 0.2 * len(result.index)
+
+    def test_empty(self):
+        for left, right in [(self.df1.iloc[:0], self.df2), (self.df1, self.df2.iloc[:0])]:
+            plan = plan_merge(left, right, self.left_on, self.right_on)
+            assert plan.rows == 0
+            for how in ['inner', 'left', 'right', 'outer']:
+                result = bmerge(left, right, self.left_on, self.right_on, how)
+                expected = bmerge(left, right, self.left_on, self.right_on, how, engine='python')
+                assert len(result.index) == len(expected.index)
+
+    def test_python(self):
+        plan = plan_merge(self.df1, self.df2.astype({'v': str}), self.left_on, self.right_on)
+        assert plan.engine == 'python'
+        assert plan.strategy == 'nested_loop'
+        assert plan.sort == [0]
+        assert plan.ranges == [1, 2]
+
+    def test_explain(self):
+        out = io.StringIO()
+        plan = explain(self.df1, self.df2, self.left_on, self.right_on, file=out)
+        text = out.getvalue()
+        assert text.startswith('engine: numpy\nstrategy: ' + plan.name)
+        assert 'costs:' in text and f'{plan.name}: ' in text
+
+    def test_merge_auto(self):
+        for engine in ['numpy', 'python']:
+            for how in ['inner', 'left', 'outer']:
+                result = bmerge(self.df1, self.df2, self.left_on, self.right_on, how, sort='auto', engine=engine)
+                expected = bmerge(self.df1, self.df2, self.left_on, self.right_on, how, engine='python')
+                assert_same(result, expected)
@@ -0,0 +1,74 @@
+from unittest import TestCase
+
+import numpy
+import pandas
+
+from pandas_bj.between import Between
+from pandas_bj.between_merge import merge as bmerge
+from pandas_bj.range_aggregate import range_aggregate, SparseTable
+from test.fixtures import points_frame, ranges_frame
+
+
+class TestSparseTable(TestCase):
+    def test_query(self):
+        values = numpy.array([5, 3, 8, 1, 9, 2, 7])
+        lo = numpy.array([0, 0, 2, 4, 6, 1])
+        hi = numpy.array([7, 1, 4, 6, 7, 6])
+        assert list(SparseTable(values, numpy.minimum).query(lo, hi)) == [1, 5, 1, 2, 7, 1]
+        assert list(SparseTable(values, numpy.maximum).query(lo, hi)) == [9, 5, 8, 9, 7, 9]
+
+
+class TestRangeAggregate(TestCase):
+
+    def setUp(self):
+        self.df1 = ranges_frame().set_axis([i * 2 for i in range(15)])
+        self.df5 = points_frame().assign(w=[1.5, None, 2.5, 0, 1, 2, 3, None, 4, 5, 6, 7, 8, 9, 10])
+        self.agg = {'v': ['sum', 'count', 'mean', 'min', 'max'], 'w': ['sum', 'count', 'mean', 'min', 'max']}
+
+    def expected(self, left, right, left_on, right_on):
+        merged = bmerge(left.reset_index(drop=True).assign(pos=range(len(left.index))), right, left_on, right_on)
+        expected = merged.groupby('pos').agg(self.agg).reindex(range(len(left.index)))
+        expected.columns = [f'{column}_{func}' for column, func in expected.columns]
+        for column in expected.columns:
+            if column.endswith('_sum') or column.endswith('_count'):
+                expected[column] = expected[column].fillna(0)
+        expected.index = left.index
+        return expected
+
+    def assert_aggregate(self, left, right, left_on, right_on):
+        expected = self.expected(left, right, left_on, right_on)
+        for engine in ['numpy', 'python']:
+            result = range_aggregate(left, right, left_on, right_on, self.agg, engine=engine)
+            pandas.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+    def test_aggregate(self):
+        self.assert_aggregate(self.df1, self.df5, ['id1', 'id2', Between('s', 'e', True, False)], ['id3', 'id4', 'v'])
+
+    def test_aggregate_filter(self):
+        self.assert_aggregate(self.df1, self.df5, ['id1', Between('s', 'e'), Between('s', 'e', True, True)],
+                              ['id3', 'v', 'w'])
+
+    def test_aggregate_range_right(self):
+        self.agg = {'s': ['sum', 'count', 'mean', 'min', 'max'], 'e': ['sum', 'count', 'mean', 'min', 'max']}
+        self.assert_aggregate(self.df5, self.df1, ['id3', 'v'], ['id1', Between('s', 'e')])
+
+    def test_dtype(self):
+        result = range_aggregate(self.df1, self.df5, Between('s', 'e'), 'v', {'v': 'sum', 'w': 'count'})
+        assert list(result.columns) == ['v_sum', 'w_count']
+        assert result['v_sum'].dtype == numpy.int64
+        assert result['w_count'].dtype == numpy.int64
+
+    def test_precision(self):
+        left = pandas.DataFrame({'s': [0.5, 1.5], 'e': [5.5, 5.5]})
+        right = pandas.DataFrame({'v': [1, 2, 3, 4, 5], 'x': [1e17, 1, 1, 1, 1]})
+        result = range_aggregate(left, right, Between('s', 'e'), 'v', {'x': ['sum', 'mean']})
+        assert list(result['x_sum']) == [1e17 + 4, 4]
+        assert list(result['x_mean']) == [(1e17 + 4) / 5, 1]
+
+    def test_fail(self):
+        with self.assertRaises(KeyError):
+            range_aggregate(self.df1, self.df5, Between('s', 'e'), 'v', {'x': 'sum'})
+        with self.assertRaises(ValueError):
+            range_aggregate(self.df1, self.df5, Between('s', 'e'), 'v', {'v': 'median'})
+        with self.assertRaises(ValueError):
+            range_aggregate(self.df1, self.df5.astype({'w': str}), Between('s', 'e'), 'v', {'w': 'sum'})
@@ -0,0 +1,178 @@
+from unittest import TestCase, mock
+
+import numpy
+import pandas
+
+from pandas_bj import sorted_search
+from pandas_bj.between import Between, RangeArray
+from pandas_bj.between_merge import merge as bmerge
+from pandas_bj.sorted_search import segment_search, build_keys, match, supports, partition, count_matches, \
+    select, factorize_pair
+
+
+class TestSegmentSearch(TestCase):
+    def test_search(self):
+        values = numpy.array([1., 3., 5., 2., 2., 4.])
+        lo = numpy.array([0, 0, 3, 3])
+        hi = numpy.array([3, 3, 6, 6])
+        targets = numpy.array([3., 3., 2., numpy.inf])
+        result = segment_search(values, lo, hi, targets, 'left')
+        assert list(result) == [1, 1, 3, 6]
+        result = segment_search(values, lo, hi, targets, 'right')
+        assert list(result) == [2, 2, 5, 6]
+
+    def test_empty_segment(self):
+        values = numpy.array([1., 2.])
+        result = segment_search(values, numpy.array([1]), numpy.array([1]), numpy.array([5.]), 'left')
+        assert list(result) == [1]
+
+
+class TestPartition(TestCase):
+    def test_partition(self):
+        build = [pandas.Series([1, 1, 2, None, 2]), pandas.Series(['a', 'b', 'a', 'a', 'a'])]
+        probe = [pandas.Series([2, 1, 3, None]), pandas.Series(['a', 'b', 'a', 'a'])]
+        build_codes, probe_codes, n_buckets = partition(build, probe)
+        assert n_buckets == 3
+        assert build_codes[3] == -1
+        assert build_codes[2] == build_codes[4]
+        assert len(set(build_codes[[0, 1, 2]])) == 3
+        assert list(probe_codes) == [build_codes[2], build_codes[1], -1, -1]
+
+    def test_partition_empty(self):
+        build_codes, probe_codes, n_buckets = partition([pandas.Series([], dtype=int)], [pandas.Series([1, 2])])
+        assert n_buckets == 0
+        assert list(probe_codes) == [-1, -1]
+
+    def test_partition_categorical(self):
+        build = [pandas.Series(['a', 'b', None, 'a'], dtype='category'), pandas.Series([1, 2, 1, 1])]
+        probe = [pandas.Series(['b', 'a', None, 'a'], dtype=build[0].dtype), pandas.Series([2, 1, 1, 2])]
+        build_codes, probe_codes, n_buckets = partition(build, probe)
+        assert n_buckets == 2
+        assert list(build_codes) == [0, 1, -1, 0]
+        assert list(probe_codes) == [1, 0, -1, -1]
+        _, other_codes, _ = partition(build, [probe[0].astype(str), probe[1]])
+        assert list(other_codes) == [1, 0, -1, -1]
+
+    def test_partition_large(self):
+        build = [pandas.Series(numpy.arange(6) % n) for n in [2, 3, 6]]
+        probe = [pandas.Series([1, 0, 1]), pandas.Series([2, 0, 1]), pandas.Series([5, 0, 5])]
+        with mock.patch.object(sorted_search, '_max_combined', 4):
+            build_codes, probe_codes, n_buckets = partition(build, probe)
+        assert n_buckets == 6
+        assert list(build_codes) == list(range(6))
+        assert list(probe_codes) == [5, 0, -1]
+
+    def test_factorize_pair(self):
+        left_codes, right_codes = factorize_pair(pandas.Series(['a', None, 'b']), pandas.Series(['b', 'c', None]))
+        assert list(left_codes) == [0, -1, 1]
+        assert list(right_codes) == [1, 2, -2]
+        left = pandas.Series(['a', 'b'], dtype='category')
+        left_codes, right_codes = factorize_pair(left, pandas.Series(['b', None], dtype=left.dtype))
+        assert list(left_codes) == [0, 1]
+        assert list(right_codes) == [1, -2]
+
+
+class TestMatch(TestCase):
+    def setUp(self):
+        self.df1 = pandas.DataFrame({'id': [1, 1, 2, None], 's': [1, None, 2, 0], 'e': [3, 4, None, 9]})
+        self.df2 = pandas.DataFrame({'id': [1, 1, 2, 2, 1], 'v': [1, 3, 2, None, 5]})
+
+    def test_match(self):
+        left_pos, right_pos = match(build_keys(self.df1, ['id', Between('s', 'e', True, False)]),
+                                    build_keys(self.df2, ['id', 'v']))
+        assert list(zip(left_pos, right_pos)) == [(0, 1), (1, 0), (1, 1)]
+
+    def test_match_opposite(self):
+        right_pos, left_pos = match(build_keys(self.df2, ['id', 'v']),
+                                    build_keys(self.df1, ['id', Between('s', 'e')]))
+        assert sorted(zip(left_pos, right_pos)) == [(0, 0), (0, 1), (1, 0), (1, 1), (2, 2)]
+
+    def test_match_grid(self):
+        r = numpy.random.RandomState(0)
+        df1 = pandas.DataFrame({'id': r.randint(0, 3, 300), 's': r.rand(300), 'a': r.rand(300)})
+        df1['e'] = df1['s'] + 0.2
+        df1['b'] = df1['a'] + 0.1
+        df1.loc[::7, 'b'] = None
+        df1.loc[::11, ['a', 'b']] = None
+        df2 = pandas.DataFrame({'id': r.randint(0, 3, 500), 'v': r.rand(500), 'w': r.rand(500)})
+        df2.loc[::5, 'w'] = None
+        left_keys = build_keys(df1, ['id', Between('s', 'e'), Between('a', 'b')])
+        right_keys = build_keys(df2, ['id', 'v', 'w'])
+        expected = sorted(zip(*match(left_keys, right_keys)))
+        for ranges, grid in [([1, 2], 2), ([2, 1], 1)]:
+            for bins in [2, 10]:
+                left_pos, right_pos = match(left_keys, right_keys, ranges, 'right', grid, bins)
+                assert (numpy.diff(left_pos) >= 0).all()
+                assert sorted(zip(left_pos, right_pos)) == expected
+        right_pos, left_pos = match(right_keys, left_keys, [1, 2], 'left', 2, 10)
+        assert (numpy.diff(right_pos) >= 0).all()
+        assert sorted(zip(left_pos, right_pos)) == expected
+
+    def test_count_matches(self):
+        counts = count_matches(build_keys(self.df1, ['id', Between('s', 'e', True, False)]),
+                               build_keys(self.df2, ['id', 'v']))
+        assert list(counts) == [1, 2, 0, 0]
+        counts = count_matches(build_keys(self.df2, ['id', 'v']),
+                               build_keys(self.df1, ['id', Between('s', 'e')]))
+        assert list(counts) == [2, 2, 1, 0, 0]
+
+    def test_count_matches_points(self):
+        r = numpy.random.RandomState(0)
+        df1 = pandas.DataFrame({'id': r.randint(0, 4, 300), 'v': r.randint(0, 20, 300).astype(float)})
+        df1.loc[::9, 'v'] = None
+        df1.loc[::13, 'v'] = numpy.inf
+        df1.loc[::17, 'v'] = -numpy.inf
+        df2 = pandas.DataFrame({'id': r.randint(1, 5, 200), 's': r.randint(0, 20, 200).astype(float)})
+        df2['e'] = df2['s'] + r.randint(-2, 6, 200)
+        df2.loc[::7, 's'] = None
+        df2.loc[::5, 'e'] = None
+        left_keys = build_keys(df1, ['id', 'v'])
+        right_keys = build_keys(df2, ['id', Between('s', 'e')])
+        # bounds are opened or closed per row.
+        ranges = right_keys[1]
+        right_keys[1] = RangeArray(ranges.range_from, ranges.range_to, numpy.arange(200) % 2 == 0,
+                                   numpy.arange(200) % 3 == 0)
+        left_pos, _ = match(left_keys, right_keys)
+        with mock.patch.object(sorted_search.SortedKeys, 'probe', side_effect=AssertionError):
+            counts = count_matches(left_keys, right_keys)
+        assert list(counts) == list(numpy.bincount(left_pos, minlength=300))
+
+    def test_select(self):
+        left_keys = build_keys(self.df1, ['id', Between('s', 'e')])
+        right_keys = build_keys(self.df2, ['id', 'v'])
+        for mode, expected in [('first', [(0, 0), (0, 1), (1, 0), (1, 1), (2, 2)]),
+                               ('last', [(0, 0), (0, 1), (1, 0), (1, 1), (2, 2)])]:
+            left_pos, right_pos = select(left_keys, right_keys, mode, 2)
+            assert list(zip(left_pos, right_pos)) == expected
+        left_pos, right_pos = select(left_keys, right_keys, 'nearest', 1)
+        assert list(zip(left_pos, right_pos)) == [(0, 0), (1, 1), (2, 2)]
+
+    def test_supports(self):
+        assert supports(self.df1, self.df2, [Between('s', 'e')], ['v'])
+        assert not supports(self.df1, self.df1, [Between('s', 'e')], [Between('s', 'e')])
+        assert supports(self.df1, self.df1, [Between('s', 'e')], [Between('s', 'e')], overlap=True)
+        assert not supports(self.df1, self.df2.astype({'v': str}), [Between('s', 'e')], ['v'])
+
+    def test_supports_large_int(self):
+        df1 = pandas.DataFrame({'s': [2 ** 53, 2 ** 53 + 2], 'e': [2 ** 53 + 1, 2 ** 53 + 3]})
+        df2 = pandas.DataFrame({'v': [2 ** 53 + 1, 2 ** 53 + 2]})
+        assert not supports(df1, df2, [Between('s', 'e', False, True)], ['v'])
+        assert not supports(self.df1, df2.astype('uint64'), [Between('s', 'e')], ['v'])
+        assert supports(self.df1, df2 - 2 ** 53, [Between('s', 'e')], ['v'])
+        # neighbouring keys above 2 ** 53 are merged exactly by python engine.
+        result = bmerge(df1, df2, Between('s', 'e', False, True), 'v')
+        assert list(zip(result['s'], result['v'])) == [(2 ** 53 + 2, 2 ** 53 + 2)]
+
+    def test_supports_datetime(self):
+        base = pandas.Timestamp('2022-06-03')
+        df1 = self.df1.assign(s=base + pandas.to_timedelta(self.df1['s'], unit='h'),
+                              e=base + pandas.to_timedelta(self.df1['e'], unit='h'))
+        df2 = self.df2.assign(v=base + pandas.to_timedelta(self.df2['v'], unit='h'))
+        assert supports(df1, df2, [Between('s', 'e')], ['v'])
+        assert supports(df1.assign(s=pandas.NaT), df2, [Between('s', 'e')], ['v'])
+        assert supports(df1.assign(s=df1['s'] - base, e=df1['e'] - base), df2.assign(v=df2['v'] - base),
+                        [Between('s', 'e')], ['v'])
+        assert not supports(df1, self.df2, [Between('s', 'e')], ['v'])
+        assert not supports(df1, df2.assign(v=df2['v'].dt.tz_localize('UTC')), [Between('s', 'e')], ['v'])
+        nanos = df2.assign(v=df2['v'].astype('datetime64[ns]') + pandas.Timedelta(1, 'ns'))
+        assert not supports(df1, nanos, [Between('s', 'e')], ['v'])
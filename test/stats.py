@@ -0,0 +1,65 @@
+import tracemalloc
+from unittest import TestCase
+
+from pandas_bj import stats
+from pandas_bj.between import Between
+from pandas_bj.between_merge import merge as bmerge
+from pandas_bj.stats import last_merge_stats
+from test.fixtures import points_frame, ranges_frame
+
+
+class TestStats(TestCase):
+
+    def setUp(self):
+        self.df1 = ranges_frame()
+        self.df5 = points_frame()
+
+    def test_numpy(self):
+        collected = []
+        result = bmerge(self.df1, self.df5, ['id1', Between('s', 'e')], ['id3', 'v'], 'left', stats=collected.append)
+        assert len(collected) == 1
+        merge_stats = collected[0]
+        assert merge_stats is last_merge_stats()
+        assert set(merge_stats.phases) == {'build_keys', 'build', 'lookup', 'search', 'expand', 'materialize'}
+        assert merge_stats.counters['matches'] == len(result.index) - result['v'].isnull().sum()
+        assert merge_stats.counters['output_rows'] == len(result.index)
+        assert merge_stats.counters['comparisons'] > 0
+        assert merge_stats.total >= sum(merge_stats.phases.values())
+
+    def test_python(self):
+        bmerge(self.df1, self.df5, ['id1', Between('s', 'e')], ['id3', 'v'], engine='python', sort=[1], stats=True)
+        merge_stats = last_merge_stats()
+        assert set(merge_stats.phases) == {'build_keys', 'sort', 'match', 'materialize'}
+        assert merge_stats.counters['comparisons'] + merge_stats.counters['skipped_rows'] == 15 * 15
+        assert merge_stats.counters['skipped_rows'] > 0
+        assert merge_stats.to_dict()['phase.match'] == merge_stats.phases['match']
+
+    def test_disabled(self):
+        bmerge(self.df1, self.df5, ['id1', Between('s', 'e')], ['id3', 'v'], stats=True)
+        merge_stats = last_merge_stats()
+        bmerge(self.df1, self.df5, ['id1', Between('s', 'e')], ['id3', 'v'])
+        assert last_merge_stats() is merge_stats
+        assert merge_stats.peak_bytes is None
+
+    def test_peak_bytes(self):
+        tracemalloc.start()
+        try:
+            bmerge(self.df1, self.df5, ['id1', Between('s', 'e')], ['id3', 'v'], stats=True)
+            assert last_merge_stats().peak_bytes > 0
+            # peak traced by caller is kept.
+            data = bytearray(10 ** 7)
+            del data
+            bmerge(self.df1, self.df5, ['id1', Between('s', 'e')], ['id3', 'v'], stats=True)
+            assert tracemalloc.get_traced_memory()[1] >= 10 ** 7
+        finally:
+            tracemalloc.stop()
+
+    def test_phase(self):
+        with stats.collect() as merge_stats:
+            with stats.phase('a'):
+                pass
+            with stats.phase('a'):
+                stats.count('b', 2)
+            stats.count('b', 3)
+        assert list(merge_stats.phases) == ['a']
+        assert merge_stats.counters == {'b': 5}